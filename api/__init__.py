@@ -0,0 +1 @@
+"""Headless HTTP API around the core engine (``python -m api.server``)."""
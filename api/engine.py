@@ -0,0 +1,174 @@
+"""engine.py
+The shared, long-lived state behind the HTTP API: one parser (with its
+worker pool), one loaded embedding model / index, one pooled Ollama client
+and the caches, used by every request.
+
+Index reads and writes are serialized by ``lock``; ingestion only holds it
+while the index is mutated, so parsing and embedding a large upload does not
+stall concurrent questions.
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.doc_cache import DocumentCache
+from core.document_parser import DocumentParser
+from core.embeddings_retrieval import EmbedderRetriever
+from core.ingestion import NamedUpload, ingest_files
+from core.metrics import observe, span
+from core.ollama_client import OllamaClient
+from core.prompting import plan_prompt
+from core.query_cache import AnswerCache
+from core.startup import StartupReport
+from core.kpis import KPIStore
+from core.table_store import TableStore
+from core.workspace import load_kpis, load_workspace, workspace_exists
+
+
+@dataclass
+class PreparedAnswer:
+    """Everything needed to produce one answer.
+
+    ``answer`` is already set when it came from the table store or the
+    answer cache; otherwise ``prompt`` has to be sent to the LLM.
+    """
+    question: str
+    path: str  # "kpi_store", "table_store", "answer_cache" or "llm"
+    answer: Optional[str] = None
+    prompt: Optional[str] = None
+    temperature: float = 0.0
+    results: List[Tuple[float, Dict]] = field(default_factory=list)
+    cache_key: Optional[Tuple] = None
+    query_embedding: Optional[np.ndarray] = None
+
+
+def result_to_dict(score: float, chunk: Dict) -> Dict:
+    return {"score": score, "id": chunk.get("id"), "file": chunk.get("file_id"),
+            "source": chunk.get("source", {}), "text": chunk.get("text", "")}
+
+
+class Engine:
+    def __init__(
+        self,
+        parser: Optional[DocumentParser] = None,
+        retriever: Optional[EmbedderRetriever] = None,
+        ollama: Optional[OllamaClient] = None,
+        cache: Optional[DocumentCache] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        max_chunk_size: int = 800,
+        index_dir: Optional[str] = None,
+        warm_up: bool = True,
+    ):
+        self.startup = StartupReport()
+        self.parser = parser or DocumentParser()
+        self.retriever = retriever or EmbedderRetriever()
+        self.ollama = ollama or OllamaClient()
+        self.cache = cache or DocumentCache()
+        self.answer_cache = answer_cache or AnswerCache.from_env()
+        self.max_chunk_size = max_chunk_size
+        self.lock = threading.RLock()
+        self.tables_by_file: Dict[str, List[pd.DataFrame]] = {}
+        self.table_store = TableStore()
+        self.kpi_store = KPIStore()
+
+        index_dir = index_dir if index_dir is not None else os.getenv("INDEX_DIR")
+        if workspace_exists(index_dir):
+            with self.startup.phase("workspace load"):
+                tables, _ = load_workspace(index_dir, self.retriever)
+                for table in tables:
+                    self.tables_by_file.setdefault(table.attrs.get("source", {}).get("file", ""), []).append(table)
+                self._rebuild_table_store()
+                self.kpi_store = load_kpis(index_dir, tables)
+        if warm_up:
+            self.startup.background("embedding model", self.retriever.warm_up)
+            self.startup.background("ollama model", self.ollama.warm_up)
+
+    def close(self):
+        self.parser.close()
+        self.ollama.close()
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {
+                "documents": len(self.retriever.file_ids),
+                "chunks": len(self.retriever.chunks),
+                "index_kind": self.retriever.index_kind,
+                "index_version": self.retriever.index_version,
+                "model": self.ollama.model_name,
+                "startup": self.startup.summary(),
+            }
+
+    def documents(self) -> Dict[str, Optional[str]]:
+        with self.lock:
+            return {file_id: self.retriever.file_versions.get(file_id) for file_id in self.retriever.file_ids}
+
+    def _rebuild_table_store(self):
+        tables = [t for file_tables in self.tables_by_file.values() for t in file_tables]
+        self.table_store = TableStore.from_tables(tables)
+
+    def ingest(self, files: Sequence[Tuple[bytes, str]]) -> Dict:
+        """Add or replace ``(file_bytes, filename)`` documents; other indexed documents are kept."""
+        with span("ingest"):
+            tables, sources = ingest_files(
+                [NamedUpload(data, name) for data, name in files], self.parser, self.retriever,
+                cache=self.cache, max_chunk_size=self.max_chunk_size, remove_missing=False, index_lock=self.lock,
+                kpi_store=self.kpi_store,
+            )
+        by_file: Dict[str, List[pd.DataFrame]] = {name: [] for _, name in files}
+        for table in tables:
+            by_file.setdefault(table.attrs.get("source", {}).get("file", ""), []).append(table)
+        with self.lock:
+            self.tables_by_file.update(by_file)
+            self._rebuild_table_store()
+            chunks = {name: self.retriever.file_chunk_count(name) for _, name in files}
+        return {"files": [name for _, name in files], "pages": len(sources), "tables": len(tables), "chunks": chunks}
+
+    def remove(self, file_id: str) -> bool:
+        with self.lock:
+            if file_id not in self.retriever.file_ids:
+                return False
+            self.retriever.remove_file(file_id)
+            self.tables_by_file.pop(file_id, None)
+            self._rebuild_table_store()
+            self.kpi_store.remove_file(file_id)
+            return True
+
+    def retrieve(self, query: str, top_k: int = 5, mode: Optional[str] = None,
+                 statement_types: Optional[Sequence[str]] = None,
+                 files: Optional[Sequence[str]] = None) -> List[Tuple[float, Dict]]:
+        with self.lock:
+            return self.retriever.retrieve(query, top_k=top_k, mode=mode, statement_types=statement_types,
+                                           files=files)
+
+    def prepare_answer(self, question: str, top_k: int = 5, temperature: float = 0.0,
+                       history: Sequence[Tuple[str, str]] = ()) -> PreparedAnswer:
+        """Answer from the KPI store, the tables or the answer cache when possible, else build the LLM prompt."""
+        kpi_answer = self.kpi_store.answer(question)
+        if kpi_answer:
+            return PreparedAnswer(question, "kpi_store", answer=kpi_answer)
+        table_answer = self.table_store.answer(question)
+        if table_answer:
+            return PreparedAnswer(question, "table_store", answer=table_answer)
+
+        with self.lock:
+            results = self.retriever.retrieve(question, top_k=top_k)
+            index_version = self.retriever.index_version
+            q_emb = self.retriever.embed_query(question)
+        cache_key = self.answer_cache.make_key(question, index_version, self.ollama.model_name,
+                                               temperature, [item.get("id") for _, item in results])
+        cached = self.answer_cache.get(cache_key, query_embedding=q_emb)
+        if cached is not None:
+            return PreparedAnswer(question, "answer_cache", answer=cached, results=results)
+
+        plan = plan_prompt(question, results, history)
+        observe("prompt_tokens", plan.tokens)
+        return PreparedAnswer(question, "llm", prompt=plan.prompt, temperature=temperature, results=results,
+                              cache_key=cache_key, query_embedding=q_emb)
+
+    def remember_answer(self, prepared: PreparedAnswer, answer: str):
+        if prepared.path == "llm" and prepared.cache_key is not None and answer:
+            self.answer_cache.put(prepared.cache_key, answer, query_embedding=prepared.query_embedding)
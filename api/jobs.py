@@ -0,0 +1,102 @@
+"""jobs.py
+Background ingestion queue for the HTTP API.
+
+Uploads are accepted immediately and queued; a fixed number of asyncio
+workers hand each job to a thread (parsing and embedding are blocking), so
+the event loop keeps serving questions and status polls meanwhile. The queue
+is bounded so a burst of uploads is refused early rather than piling up file
+bytes in memory, and only the most recent finished jobs are remembered.
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    files: List[str]
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "files": self.files,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    def __init__(self, handler: Callable[[List[Tuple[bytes, str]]], Dict], workers: int = 1,
+                 max_pending: int = 16, max_history: int = 256):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, files: List[Tuple[bytes, str]]) -> Job:
+        job = Job(id=uuid.uuid4().hex, files=[name for _, name in files])
+        try:
+            self._queue.put_nowait((job, files))
+        except asyncio.QueueFull:
+            raise QueueFull(f"Ingestion queue is full ({self._queue.maxsize} jobs pending).")
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _prune(self):
+        finished = [jid for jid, job in self.jobs.items() if job.status in ("done", "failed")]
+        for jid in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[jid]
+
+    async def _worker(self):
+        while True:
+            job, files = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await asyncio.to_thread(self.handler, files)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
@@ -0,0 +1,200 @@
+"""server.py
+Asyncio HTTP service exposing ingestion, retrieval and question answering
+over one shared engine (one embedding model and index for every client).
+
+    python -m api.server --host 0.0.0.0 --port 8000
+
+Endpoints:
+- ``POST /ingest``           multipart ``files``; returns 202 with a job to poll
+- ``GET  /jobs/{id}``        ingestion job status
+- ``GET  /documents``        indexed files; ``DELETE /documents/{file}`` removes one
+- ``POST /retrieve``         ranked chunks for a query
+- ``POST /ask``              answer; with ``"stream": true`` newline-delimited JSON
+                             events (``sources``, ``token``..., ``done``)
+- ``GET  /health``, ``GET /metrics`` (Prometheus text)
+
+Blocking work (parsing, embedding, FAISS, Ollama) runs in worker threads so
+the event loop stays free; Ollama concurrency is bounded by the client's own
+``OLLAMA_MAX_IN_FLIGHT``.
+"""
+import argparse
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from core.embeddings_retrieval import RETRIEVAL_MODES
+from core.metrics import InMemoryMetrics, get_metrics
+from core.prompting import token_counter
+from core.statements import STATEMENT_TYPES
+
+from .engine import Engine, PreparedAnswer, result_to_dict
+from .jobs import JobQueue, QueueFull
+
+ALLOWED_SUFFIXES = (".pdf", ".xls", ".xlsx")
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=50)
+    mode: Optional[str] = None
+    statement_types: Optional[List[str]] = Field(
+        None, description=f"search only chunks of these statements {STATEMENT_TYPES}; default: detected from the query")
+    files: Optional[List[str]] = Field(None, description="search only these documents")
+
+
+class AskRequest(BaseModel):
+    question: str
+    top_k: int = Field(5, ge=1, le=50)
+    temperature: float = Field(0.0, ge=0.0, le=2.0)
+    history: List[Tuple[str, str]] = Field(
+        default_factory=list,
+        description='earlier turns, [("user"|"assistant", text), ...]; older ones are summarized to fit the prompt budget')
+    stream: bool = False
+
+
+def _engine(request: Request) -> Engine:
+    return request.app.state.engine
+
+
+def _stream_events(engine: Engine, prepared: PreparedAnswer) -> Iterator[bytes]:
+    """NDJSON events for one answer. Runs in a worker thread; closing it (client gone) stops Ollama."""
+    def event(kind: str, **data) -> bytes:
+        return (json.dumps({"type": kind, **data}) + "\n").encode()
+
+    yield event("sources", path=prepared.path, sources=[result_to_dict(s, c) for s, c in prepared.results])
+    if prepared.answer is not None:
+        yield event("token", text=prepared.answer)
+        yield event("done", stats=None)
+        return
+    stream = engine.ollama.stream(prepared.prompt, temperature=prepared.temperature)
+    parts = []
+    try:
+        for token in stream:
+            parts.append(token)
+            yield event("token", text=token)
+    finally:
+        stream.close()
+    token_counter.calibrate(prepared.prompt, stream.stats.prompt_tokens)
+    answer = "".join(parts).strip()
+    if not stream.stats.error and not stream.stats.cancelled:
+        engine.remember_answer(prepared, answer)
+    yield event("done", stats=vars(stream.stats))
+
+
+def create_app(engine_factory: Callable[[], Engine] = Engine) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Loading the embedding model is slow and blocking; keep it off the loop.
+        app.state.engine = await asyncio.to_thread(engine_factory)
+        app.state.jobs = JobQueue(
+            app.state.engine.ingest,
+            workers=int(os.getenv("API_INGEST_WORKERS", "1")),
+            max_pending=int(os.getenv("API_MAX_PENDING_JOBS", "16")),
+        )
+        await app.state.jobs.start()
+        try:
+            yield
+        finally:
+            await app.state.jobs.stop()
+            app.state.engine.close()
+
+    app = FastAPI(title="Financial Document Q&A API", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health(request: Request):
+        status = await asyncio.to_thread(_engine(request).status)
+        return {"status": "ok", "pending_jobs": request.app.state.jobs.pending, **status}
+
+    @app.post("/ingest", status_code=202)
+    async def ingest(request: Request, files: List[UploadFile] = File(...)):
+        payload = []
+        for f in files:
+            name = os.path.basename(f.filename or "")
+            if not name.lower().endswith(ALLOWED_SUFFIXES):
+                raise HTTPException(415, f"Unsupported file type: {name!r}. Upload PDF or Excel files.")
+            payload.append((await f.read(), name))
+        try:
+            job = request.app.state.jobs.submit(payload)
+        except QueueFull as e:
+            raise HTTPException(503, str(e))
+        return job.to_dict()
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(request: Request, job_id: str):
+        job = request.app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(404, f"Unknown job {job_id}.")
+        return job.to_dict()
+
+    @app.get("/documents")
+    async def documents(request: Request):
+        return await asyncio.to_thread(_engine(request).documents)
+
+    @app.delete("/documents/{file_id}")
+    async def remove_document(request: Request, file_id: str):
+        if not await asyncio.to_thread(_engine(request).remove, file_id):
+            raise HTTPException(404, f"Document {file_id!r} is not indexed.")
+        return {"removed": file_id}
+
+    @app.post("/retrieve")
+    async def retrieve(request: Request, body: RetrieveRequest):
+        if body.mode is not None and body.mode not in RETRIEVAL_MODES:
+            raise HTTPException(422, f"mode must be one of {RETRIEVAL_MODES}.")
+        if body.statement_types and not set(body.statement_types) <= set(STATEMENT_TYPES):
+            raise HTTPException(422, f"statement_types must be among {STATEMENT_TYPES}.")
+        try:
+            results = await asyncio.to_thread(_engine(request).retrieve, body.query, body.top_k, body.mode,
+                                              body.statement_types, body.files)
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+        return {"results": [result_to_dict(score, chunk) for score, chunk in results]}
+
+    @app.post("/ask")
+    async def ask(request: Request, body: AskRequest):
+        engine = _engine(request)
+        try:
+            prepared = await asyncio.to_thread(engine.prepare_answer, body.question, body.top_k,
+                                               body.temperature, body.history)
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+        if body.stream:
+            return StreamingResponse(_stream_events(engine, prepared), media_type="application/x-ndjson")
+
+        answer = prepared.answer
+        if answer is None:
+            answer = await asyncio.to_thread(engine.ollama.generate, prepared.prompt,
+                                             temperature=prepared.temperature)
+            if not answer.startswith("Error calling Ollama:"):
+                engine.remember_answer(prepared, answer)
+        return {"answer": answer, "path": prepared.path,
+                "sources": [result_to_dict(s, c) for s, c in prepared.results]}
+
+    @app.get("/metrics")
+    async def metrics():
+        sink = get_metrics()
+        if not isinstance(sink, InMemoryMetrics):
+            return JSONResponse(sink.snapshot())
+        return PlainTextResponse(sink.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Financial Document Q&A HTTP API.")
+    ap.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    args = ap.parse_args()
+    # One process on purpose: every client shares the single loaded model and index.
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
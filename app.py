@@ -1,61 +1,108 @@
-
 """app.py
 Entry point for the Financial Document Q&A Streamlit application.
 Run with: streamlit run app.py
 """
-from ui.components import render_sidebar, render_chat_and_results
+import time
+_import_start = time.perf_counter()
+
+import uuid
+from ui.components import render_sidebar, render_chat_and_results, render_diagnostics
 from core.document_parser import DocumentParser
-from core.embeddings_retrieval import EmbedderRetriever
 from core.ollama_client import OllamaClient
+from core.doc_cache import DocumentCache
+from core.ingestion import ingest_files
+from core.index_registry import IndexRegistry
+from core.query_cache import AnswerCache
+from core.metrics import span
+from core.startup import StartupReport
 
 import streamlit as st
 
 st.set_page_config(page_title="Financial Doc Q&A Assistant", layout="wide")
 
 # Initialize singletons / resources
+@st.cache_resource
+def get_startup_report():
+    report = StartupReport()
+    report.record('imports', time.perf_counter() - _import_start)
+    return report
+
+startup = get_startup_report()
+
 @st.cache_resource
 def get_doc_parser():
     return DocumentParser()
 
 @st.cache_resource
-def get_embedder_retriever(embed_model_name=None):
-    return EmbedderRetriever(embed_model_name=embed_model_name)
+def get_index_registry(embed_model_name=None):
+    # One index per session / named workspace, all sharing one embedding model. The model loads
+    # in the background so the page renders right away.
+    registry = IndexRegistry(embed_model_name=embed_model_name)
+    startup.background('embedding model', registry.warm_up)
+    return registry
 
 @st.cache_resource
 def get_ollama_client(base_url=None, model_name=None):
-    return OllamaClient(base_url=base_url, model_name=model_name)
+    client = OllamaClient(base_url=base_url, model_name=model_name)
+    startup.background('ollama model', client.warm_up)
+    return client
+
+@st.cache_resource
+def get_document_cache():
+    return DocumentCache()
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache.from_env()
 
 doc_parser = get_doc_parser()
-embedder_retriever = get_embedder_retriever()
+index_registry = get_index_registry()
 ollama_client = get_ollama_client()
+document_cache = get_document_cache()
+answer_cache = get_answer_cache()
 
 # UI: Sidebar (uploads + settings)
 settings = render_sidebar()
+st.sidebar.caption(startup.summary())
+
+# A named workspace is shared by everyone who enters the name; otherwise the index is private to this session.
+if 'session_workspace' not in st.session_state:
+    st.session_state['session_workspace'] = f'session-{uuid.uuid4().hex}'
+workspace_key = settings.get('workspace') or st.session_state['session_workspace']
+
+# Processing writes to the index, which gives a session still on the shared INDEX_DIR seed its own copy.
+with index_registry.checkout(workspace_key, write=bool(settings.get('process_docs_btn'))) as workspace:
+    embedder_retriever = workspace.retriever
+
+    # If documents uploaded and processed, handle processing and chat
+    if settings.get('process_docs_btn'):
+        uploaded_files = settings.get('uploaded_files', [])
+        if not uploaded_files:
+            st.warning('Please upload at least one PDF or Excel file.')
+        else:
+            try:
+                # Parsing + chunking + embeddings (reused from the on-disk cache when unchanged) + index build
+                with st.spinner('Parsing documents and creating embeddings...'), span('ingest'):
+                    tables, file_sources = ingest_files(
+                        uploaded_files, doc_parser, embedder_retriever, cache=document_cache,
+                        index_lock=workspace.lock, kpi_store=workspace.kpi_store
+                    )
+                workspace.set_corpus(tables, file_sources)
+                st.success('Documents processed. You can now ask questions in the chat.')
+            except Exception as e:
+                st.error(f'Processing failed: {e}')
+
+    st.session_state['tables'] = workspace.tables
+    st.session_state['file_sources'] = workspace.sources
+    st.session_state['table_store'] = workspace.table_store
+    st.session_state['kpi_store'] = workspace.kpi_store
+
+    # Render chat and results area
+    render_chat_and_results(
+        embedder_retriever=embedder_retriever,
+        ollama_client=ollama_client,
+        answer_cache=answer_cache
+    )
 
-# If documents uploaded and processed, handle processing and chat
-if settings.get('process_docs_btn'):
-    uploaded_files = settings.get('uploaded_files', [])
-    if not uploaded_files:
-        st.warning('Please upload at least one PDF or Excel file.')
-    else:
-        try:
-            with st.spinner('Parsing documents...'):
-                texts, tables, file_sources = doc_parser.parse_files_with_sources(uploaded_files)
-            st.session_state['docs_text'] = texts
-            st.session_state['tables'] = tables
-            st.session_state['file_sources'] = file_sources
-
-            # Chunking + embeddings + index build
-            with st.spinner('Creating embeddings and index...'):
-                chunks = embedder_retriever.chunk_texts(texts, sources=file_sources)
-                embedder_retriever.build_index_from_texts(chunks)
-
-            st.success('Documents processed. You can now ask questions in the chat.')
-        except Exception as e:
-            st.error(f'Processing failed: {e}')
-
-# Render chat and results area
-render_chat_and_results(
-    embedder_retriever=embedder_retriever,
-    ollama_client=ollama_client
-)
+if settings.get('show_diagnostics'):
+    render_diagnostics(startup_report=startup, registry=index_registry)
@@ -0,0 +1,265 @@
+"""run.py
+End-to-end benchmark: parse -> chunk -> embed -> index -> retrieve -> generate.
+
+Synthetic PDFs and Excel workbooks are generated in memory, generation runs
+against the local stub Ollama server (streaming, with injected latency), and
+each stage reports throughput, p50/p95 latency and peak RSS. With
+``--baseline`` the run fails (exit code 1) when a stage regresses by more
+than ``--max-regression`` against a previous ``--output`` file.
+
+    python -m benchmarks.run --pdf-pages 100 --pdfs 2 --ledger-rows 20000 --output bench.json
+    python -m benchmarks.run --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_ollama import StubOllamaServer  # noqa: E402
+from benchmarks.synthetic import make_pdf, make_workbook  # noqa: E402
+
+QUESTIONS = [
+    'What was the net income in FY 2023?',
+    'How did revenue from operations change between 2022 and 2023?',
+    'What were total assets at the end of the year?',
+    'What was the net cash from operating activities?',
+    'How much was paid as dividends?',
+    'What are the main risks discussed by management?',
+    'What was the finance cost in FY 2022?',
+    'Summarize the cash flow from investing activities.',
+]
+
+
+@dataclass
+class StageResult:
+    name: str
+    items: int
+    unit: str
+    seconds: float
+    throughput: float  # items per second
+    p50_ms: float
+    p95_ms: float
+    peak_rss_mb: float
+    extra: Dict[str, float] = field(default_factory=dict)
+
+
+def _rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        # Not Linux: fall back to the process-lifetime maximum.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 1024
+
+
+class RSSSampler:
+    """Track the peak resident set size while a stage runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_mb())
+
+
+def _result(name: str, unit: str, latencies: List[float], seconds: float, peak: float,
+            items: Optional[int] = None, **extra) -> StageResult:
+    lat_ms = np.asarray(latencies or [0.0]) * 1000
+    n = len(latencies) if items is None else items
+    return StageResult(name, n, unit, seconds, n / seconds if seconds > 0 else 0.0,
+                       float(np.percentile(lat_ms, 50)), float(np.percentile(lat_ms, 95)), peak, extra)
+
+
+def run(args) -> Dict[str, StageResult]:
+    from core.document_parser import DocumentParser
+    from core.embeddings_retrieval import EmbedderRetriever
+    from core.index_backends import IndexConfig
+    from core.ollama_client import OllamaClient
+    from core.processing_utils import stream_chunks
+
+    files = [(make_pdf(args.pdf_pages, seed=i), f'report_{i}.pdf') for i in range(args.pdfs)]
+    files += [(make_workbook(args.ledger_rows, seed=100 + i), f'workbook_{i}.xlsx') for i in range(args.workbooks)]
+    results: Dict[str, StageResult] = {}
+
+    # parse: latency per page/sheet as it is yielded
+    parser = DocumentParser(max_workers=args.parser_workers)
+    pages, lat = [], []
+    with RSSSampler() as rss:
+        t0 = time.perf_counter()
+        for page_iter in parser.iter_many(files):
+            t = time.perf_counter()
+            for page in page_iter:
+                now = time.perf_counter()
+                lat.append(now - t)
+                t = now
+                pages.append(page)
+        results['parse'] = _result('parse', 'pages', lat, time.perf_counter() - t0, rss.peak)
+    parser.close()
+
+    # chunk: latency per page
+    chunks, lat = [], []
+    with RSSSampler() as rss:
+        t0 = time.perf_counter()
+        for page in pages:
+            t = time.perf_counter()
+            chunks.extend(stream_chunks([page], max_chunk_size=args.chunk_size))
+            lat.append(time.perf_counter() - t)
+        results['chunk'] = _result('chunk', 'pages', lat, time.perf_counter() - t0, rss.peak, chunks=len(chunks))
+
+    retriever = EmbedderRetriever(embed_model_name=args.embed_model, index_config=IndexConfig(kind=args.index_kind))
+
+    # embed: latency per batch, throughput in chunks/s
+    embs, lat = [], []
+    with RSSSampler() as rss:
+        t0 = time.perf_counter()
+        t = t0
+        for _, batch_embs in retriever.embed_stream(chunks, batch_size=args.batch_size):
+            now = time.perf_counter()
+            lat.append(now - t)
+            t = now
+            embs.append(batch_embs)
+        results['embed'] = _result('embed', 'chunks', lat, time.perf_counter() - t0, rss.peak, items=len(chunks))
+    embs = np.vstack(embs)
+
+    # index: one add per file
+    by_file: Dict[str, List[int]] = {}
+    for i, c in enumerate(chunks):
+        by_file.setdefault(c['source'].get('file', ''), []).append(i)
+    lat = []
+    with RSSSampler() as rss:
+        t0 = time.perf_counter()
+        for file_id, rows in by_file.items():
+            t = time.perf_counter()
+            retriever.add_chunks(file_id, [chunks[i] for i in rows], embs[rows])
+            lat.append(time.perf_counter() - t)
+        retriever.optimize_index()
+        results['index'] = _result('index', 'chunks', lat, time.perf_counter() - t0, rss.peak,
+                                   items=len(chunks), kind_is_flat=float(retriever.index_kind == 'flat'))
+
+    # retrieve: latency per query (query-embedding cache cleared so encoding is measured)
+    lat = []
+    with RSSSampler() as rss:
+        t0 = time.perf_counter()
+        for i in range(args.queries):
+            retriever.query_cache.clear()
+            t = time.perf_counter()
+            retriever.retrieve(QUESTIONS[i % len(QUESTIONS)], top_k=args.top_k)
+            lat.append(time.perf_counter() - t)
+        results['retrieve'] = _result('retrieve', 'queries', lat, time.perf_counter() - t0, rss.peak)
+
+    # generate: streamed answers against the stub (TTFT), then a batch through generate_many
+    with StubOllamaServer(ttft=args.stub_ttft, token_delay=args.stub_token_delay) as stub:
+        client = OllamaClient(base_url=stub.url, model_name='stub', max_in_flight=args.max_in_flight)
+        lat, ttft = [], []
+        with RSSSampler() as rss:
+            t0 = time.perf_counter()
+            for i in range(args.generations):
+                t = time.perf_counter()
+                stream = client.stream(QUESTIONS[i % len(QUESTIONS)])
+                for _ in stream:
+                    pass
+                lat.append(time.perf_counter() - t)
+                ttft.append(stream.stats.time_to_first_token or 0.0)
+            ttft_ms = np.asarray(ttft) * 1000
+            results['generate'] = _result('generate', 'answers', lat, time.perf_counter() - t0, rss.peak,
+                                          ttft_p50_ms=float(np.percentile(ttft_ms, 50)),
+                                          ttft_p95_ms=float(np.percentile(ttft_ms, 95)))
+        with RSSSampler() as rss:
+            prompts = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.batch_questions)]
+            t0 = time.perf_counter()
+            client.generate_many(prompts)
+            elapsed = time.perf_counter() - t0
+            results['generate_many'] = _result('generate_many', 'answers', [elapsed / len(prompts)] * len(prompts),
+                                               elapsed, rss.peak)
+        client.close()
+
+    return results
+
+
+def compare(results: Dict[str, StageResult], baseline: Dict[str, Dict], max_regression: float) -> List[str]:
+    """Stages whose throughput fell or p95 latency rose by more than ``max_regression``."""
+    failures = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['throughput'] > 0 and res.throughput < base['throughput'] * (1 - max_regression):
+            failures.append(f"{name}: throughput {res.throughput:.1f} < baseline {base['throughput']:.1f} {res.unit}/s")
+        if base['p95_ms'] > 0 and res.p95_ms > base['p95_ms'] * (1 + max_regression):
+            failures.append(f"{name}: p95 {res.p95_ms:.2f} ms > baseline {base['p95_ms']:.2f} ms")
+    return failures
+
+
+def print_report(results: Dict[str, StageResult]):
+    print(f"{'stage':<14}{'items':>8}  {'unit':<8}{'seconds':>9}{'items/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'peak RSS MB':>13}")
+    for r in results.values():
+        print(f'{r.name:<14}{r.items:>8}  {r.unit:<8}{r.seconds:>9.2f}{r.throughput:>11.1f}'
+              f'{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}{r.peak_rss_mb:>13.1f}')
+        for k, v in r.extra.items():
+            print(f'{"":<14}  {k} = {v:.2f}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='End-to-end Financial Doc Q&A benchmark.')
+    ap.add_argument('--pdfs', type=int, default=2)
+    ap.add_argument('--pdf-pages', type=int, default=60)
+    ap.add_argument('--workbooks', type=int, default=1)
+    ap.add_argument('--ledger-rows', type=int, default=5000)
+    ap.add_argument('--parser-workers', type=int, default=None)
+    ap.add_argument('--chunk-size', type=int, default=800)
+    ap.add_argument('--batch-size', type=int, default=256)
+    ap.add_argument('--embed-model', default=os.getenv('EMBED_MODEL_NAME'))
+    ap.add_argument('--index-kind', default='auto')
+    ap.add_argument('--queries', type=int, default=100)
+    ap.add_argument('--top-k', type=int, default=5)
+    ap.add_argument('--generations', type=int, default=10)
+    ap.add_argument('--batch-questions', type=int, default=50)
+    ap.add_argument('--max-in-flight', type=int, default=4)
+    ap.add_argument('--stub-ttft', type=float, default=0.05)
+    ap.add_argument('--stub-token-delay', type=float, default=0.005)
+    ap.add_argument('--output', help='write results as JSON')
+    ap.add_argument('--baseline', help='JSON from a previous --output run to compare against')
+    ap.add_argument('--max-regression', type=float, default=0.2, help='allowed fractional regression per stage')
+    args = ap.parse_args()
+
+    results = run(args)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({k: asdict(v) for k, v in results.items()}, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            failures = compare(results, json.load(fh), args.max_regression)
+        if failures:
+            print('\nREGRESSIONS:\n  ' + '\n  '.join(failures))
+            sys.exit(1)
+        print('\nNo regressions beyond threshold.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""stub_ollama.py
+A local stand-in for Ollama's ``/api/generate`` used by the benchmarks.
+
+Answers with a canned completion, either as one JSON object
+(``"stream": false``) or as newline-delimited JSON chunks ending in a
+``done`` record with ``eval_count`` / ``eval_duration``, like the real
+server. Latency is injected per request (time to first token) and per
+token, so client-side streaming, pooling and batching can be measured
+without a model.
+
+Run standalone:  python -m benchmarks.stub_ollama --port 11500 --ttft 0.2 --token-delay 0.02
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_ANSWER = ('According to the statement of profit and loss, net income for FY 2023 was 20,033.1 '
+                  'compared with 16,047.8 in FY 2022, an increase of 24.8 percent (page 1).')
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Pooled clients drop idle keep-alive connections on close; that's not an error.
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, ttft: float = 0.05,
+                 token_delay: float = 0.005, answer: str = DEFAULT_ANSWER):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = answer.split(' ')
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._server = _QuietHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/generate'
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != '/api/generate':
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with stub._lock:
+                    stub.requests_served += 1
+                start = time.perf_counter()
+                time.sleep(stub.ttft)
+                if payload.get('stream', True):
+                    self._stream(payload, start)
+                else:
+                    time.sleep(stub.token_delay * len(stub.tokens))
+                    body = json.dumps(self._final(payload, ' '.join(stub.tokens), start)).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def _final(self, payload, response, start):
+                return {'model': payload.get('model', ''), 'response': response, 'done': True,
+                        'eval_count': len(stub.tokens),
+                        'eval_duration': int((time.perf_counter() - start) * 1e9)}
+
+            def _stream(self, payload, start):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for i, tok in enumerate(stub.tokens):
+                        text = tok if i == 0 else ' ' + tok
+                        self._chunk(json.dumps({'model': payload.get('model', ''), 'response': text, 'done': False}))
+                        time.sleep(stub.token_delay)
+                    self._chunk(json.dumps(self._final(payload, '', start)))
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client cancelled the stream
+
+            def _chunk(self, line: str):
+                data = (line + '\n').encode()
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> 'StubOllamaServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Stub Ollama /api/generate server for benchmarks.')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=11500)
+    ap.add_argument('--ttft', type=float, default=0.2, help='seconds before the first token')
+    ap.add_argument('--token-delay', type=float, default=0.02, help='seconds between tokens')
+    args = ap.parse_args()
+    server = StubOllamaServer(args.host, args.port, ttft=args.ttft, token_delay=args.token_delay)
+    print(f'Stub Ollama listening on {server.url}')
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""synthetic.py
+Generate synthetic financial documents for benchmarking: multi-page PDFs with
+narrative text and ruled statement tables (so pdfplumber finds both), and
+multi-sheet Excel workbooks. Only the standard library and openpyxl are
+needed; the PDF is written by hand.
+"""
+import io
+import random
+from typing import List, Optional, Tuple
+
+LINE_ITEMS = {
+    'Statement of Profit and Loss': [
+        'Revenue from operations', 'Other income', 'Total income', 'Cost of materials consumed',
+        'Employee benefits expense', 'Finance costs', 'Depreciation and amortisation', 'Other expenses',
+        'Total expenses', 'Profit before tax', 'Tax expense', 'Net income',
+    ],
+    'Balance Sheet': [
+        'Property, plant and equipment', 'Intangible assets', 'Inventories', 'Trade receivables',
+        'Cash and cash equivalents', 'Total assets', 'Equity share capital', 'Other equity',
+        'Borrowings', 'Trade payables', 'Total liabilities', 'Total equity and liabilities',
+    ],
+    'Statement of Cash Flows': [
+        'Net cash from operating activities', 'Purchase of fixed assets', 'Net cash used in investing activities',
+        'Proceeds from borrowings', 'Dividends paid', 'Net cash used in financing activities',
+        'Net increase in cash', 'Cash at beginning of year', 'Cash at end of year',
+    ],
+}
+
+WORDS = ('the company reported results segment growth margin operating revenue quarter fiscal year board '
+         'directors approved dividend capital expenditure liquidity risk market demand pricing cost inflation '
+         'subsidiary consolidated audit opinion material estimate impairment lease tax deferred provision').split()
+
+
+def _fmt_amount(value: float) -> str:
+    s = f'{abs(value):,.1f}'
+    return f'({s})' if value < 0 else s
+
+
+def _statement_rows(title: str, years: List[int], rng: random.Random) -> List[List[str]]:
+    rows = [['Particulars'] + [f'FY {y}' for y in years]]
+    for item in LINE_ITEMS[title]:
+        base = rng.uniform(500, 50000)
+        values = [base * (1 + rng.uniform(-0.1, 0.25)) ** i for i in range(len(years))]
+        if 'used in' in item or 'paid' in item or 'Purchase' in item:
+            values = [-v for v in values]
+        rows.append([item] + [_fmt_amount(v) for v in values])
+    return rows
+
+
+def _paragraph(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    for i in range(0, n_words, 12):
+        words[i] = f'{rng.uniform(1, 9999):,.1f}'
+    return ' '.join(words)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_stream(title: str, lines: List[str], table: Optional[List[List[str]]]) -> bytes:
+    ops = ['BT /F1 14 Tf 50 800 Td (' + _pdf_escape(title) + ') Tj ET']
+    y = 780
+    for line in lines:
+        ops.append(f'BT /F1 9 Tf 50 {y} Td (' + _pdf_escape(line) + ') Tj ET')
+        y -= 12
+    if table:
+        col_w = [200] + [90] * (len(table[0]) - 1)
+        row_h = 16
+        x0, top = 50, y - 10
+        width = sum(col_w)
+        height = row_h * len(table)
+        # Ruling lines so pdfplumber's lattice table finder picks the table up.
+        ops.append('0.5 w')
+        for r in range(len(table) + 1):
+            yy = top - r * row_h
+            ops.append(f'{x0} {yy} m {x0 + width} {yy} l S')
+        xx = x0
+        for w in col_w + [0]:
+            ops.append(f'{xx} {top} m {xx} {top - height} l S')
+            xx += w
+        for r, row in enumerate(table):
+            xx = x0
+            for c, cell in enumerate(row):
+                ops.append(f'BT /F1 8 Tf {xx + 3} {top - (r + 1) * row_h + 5} Td (' + _pdf_escape(cell) + ') Tj ET')
+                xx += col_w[c]
+    return '\n'.join(ops).encode('latin-1', errors='replace')
+
+
+def make_pdf(n_pages: int = 20, years: Tuple[int, ...] = (2021, 2022, 2023), seed: int = 0) -> bytes:
+    """A PDF of ``n_pages`` pages; every third page carries a ruled financial statement."""
+    rng = random.Random(seed)
+    titles = list(LINE_ITEMS)
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog_id = add(b'')  # placeholder, filled once the page tree id is known
+    pages_id = add(b'')
+    font_id = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    page_ids = []
+    for p in range(n_pages):
+        if p % 3 == 0:
+            title = titles[(p // 3) % len(titles)]
+            table = _statement_rows(title, list(years), rng)
+            lines = [_paragraph(rng, 14) for _ in range(4)]
+        else:
+            title, table = f'Management discussion and analysis - section {p}', None
+            lines = [_paragraph(rng, 14) for _ in range(55)]
+        stream = _page_stream(title, lines, table)
+        content_id = add(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        page_ids.append(add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 %d 0 R >> >> '
+            b'/Contents %d 0 R >>' % (pages_id, font_id, content_id)
+        ))
+    objects[catalog_id - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id
+    kids = ' '.join(f'{pid} 0 R' for pid in page_ids).encode()
+    objects[pages_id - 1] = b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % n_pages
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % i + obj + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for off in offsets:
+        out.write(b'%010d 00000 n \n' % off)
+    out.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog_id, xref))
+    return out.getvalue()
+
+
+def make_workbook(n_ledger_rows: int = 10000, years: Tuple[int, ...] = (2021, 2022, 2023), seed: int = 0) -> bytes:
+    """An .xlsx with one sheet per financial statement plus a general-ledger sheet of ``n_ledger_rows`` rows."""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for title in LINE_ITEMS:
+        ws = wb.create_sheet(title[:31])
+        for row in _statement_rows(title, list(years), rng):
+            ws.append(row)
+    ws = wb.create_sheet('General Ledger')
+    ws.append(['Date', 'Account', 'Description', 'Debit', 'Credit'])
+    accounts = [item for items in LINE_ITEMS.values() for item in items]
+    for i in range(n_ledger_rows):
+        amount = round(rng.uniform(10, 100000), 2)
+        debit = rng.random() < 0.5
+        ws.append([f'{years[-1]}-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}', rng.choice(accounts),
+                   _paragraph(rng, 6), amount if debit else None, None if debit else amount])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
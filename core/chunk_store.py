@@ -0,0 +1,315 @@
+"""chunk_store.py
+Columnar, memory-mappable storage for indexed chunks.
+
+A list of chunk dicts costs a Python object per chunk, per text and per
+``source`` dict (repeating the same file names and type lists). ``ChunkStore``
+keeps instead:
+- every chunk text in one UTF-8 buffer, addressed by ``offset`` / ``length``
+  columns (texts are stored back to back in row order);
+- fixed-width numpy columns for the chunk id, file, page, sheet, row range,
+  character offsets and a statement-type bit mask, with file / sheet / type
+  names interned into small string tables;
+- anything else (rare source keys, extra chunk keys) as interned JSON.
+
+Rows are ordered by chunk id (ids are assigned increasingly), so lookups
+are a binary search. Removed rows are tombstoned and compacted once they
+make up a quarter of the store. ``save`` writes one ``.npy`` per column plus
+the raw text buffer; ``load`` maps them read-only (zero-copy) and the store
+copies them into memory only when it is next modified.
+
+Chunks are handed out as freshly built dicts (``store[cid]``), the same shape
+``EmbedderRetriever`` always returned.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+# column name -> dtype; -1 marks "absent" in the int columns
+COLUMNS = {
+    "id": "int64",
+    "file_id": "int32",
+    "file": "int32",
+    "page": "int32",
+    "sheet": "int32",
+    "row_start": "int32",
+    "row_end": "int32",
+    "types": "uint32",
+    "flags": "uint8",
+    "char_start": "int32",
+    "char_end": "int32",
+    "extra": "int32",
+    "offset": "int64",
+    "length": "int32",
+    "alive": "bool",
+}
+HAS_TYPES, OCR = 1, 2
+_ROWS_RE = re.compile(r"^(\d+)-(\d+)$")
+MAX_DEAD_RATIO = 0.25
+
+
+class _Interner:
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = list(values)
+        self.codes: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ChunkStore:
+    def __init__(self):
+        self._cols: Dict[str, np.ndarray] = {name: np.empty(0, dtype=dt) for name, dt in COLUMNS.items()}
+        self._text = np.empty(0, dtype="uint8")
+        self._n = 0  # rows used (alive or dead)
+        self._text_used = 0
+        self._dead = 0
+        self._writable = True
+        self.names = _Interner()  # file and file_id values
+        self.sheets = _Interner()
+        self.types = _Interner()
+        self.extras = _Interner()
+
+    # ------------------------------------------------------------------ sizes / lookup
+    def __len__(self) -> int:
+        return self._n - self._dead
+
+    def _col(self, name: str) -> np.ndarray:
+        return self._cols[name][:self._n]
+
+    def _row(self, cid: int) -> int:
+        ids = self._col("id")
+        row = int(np.searchsorted(ids, cid))
+        if row < self._n and ids[row] == cid and self._cols["alive"][row]:
+            return row
+        return -1
+
+    def __contains__(self, cid) -> bool:
+        return self._row(int(cid)) >= 0
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """Vectorized ``in``: a bool mask over ``ids``."""
+        ids = np.asarray(ids, dtype="int64")
+        rows = np.minimum(np.searchsorted(self._col("id"), ids), max(self._n - 1, 0))
+        if not self._n:
+            return np.zeros(len(ids), dtype=bool)
+        return (self._cols["id"][rows] == ids) & self._cols["alive"][rows]
+
+    def __getitem__(self, cid: int) -> Dict:
+        row = self._row(int(cid))
+        if row < 0:
+            raise KeyError(cid)
+        return self._chunk(row)
+
+    def get(self, cid: int, default=None):
+        row = self._row(int(cid))
+        return self._chunk(row) if row >= 0 else default
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in np.flatnonzero(self._col("alive")):
+            yield self._chunk(int(row))
+
+    def ids(self) -> np.ndarray:
+        return self._col("id")[self._col("alive")]
+
+    def text(self, row: int) -> str:
+        start = int(self._cols["offset"][row])
+        return self._text[start:start + int(self._cols["length"][row])].tobytes().decode("utf-8")
+
+    def iter_texts(self) -> Iterator[Tuple[int, str]]:
+        """``(id, text)`` of every live chunk, without building chunk dicts."""
+        ids = self._cols["id"]
+        for row in np.flatnonzero(self._col("alive")):
+            yield int(ids[row]), self.text(int(row))
+
+    def ids_of_file(self, file_id: str) -> np.ndarray:
+        code = self.names.codes.get(file_id)
+        if code is None:
+            return np.empty(0, dtype="int64")
+        return self._col("id")[(self._col("file_id") == code) & self._col("alive")]
+
+    def file_counts(self) -> Dict[str, int]:
+        codes, counts = np.unique(self._col("file_id")[self._col("alive")], return_counts=True)
+        return {self.names.values[c]: int(n) for c, n in zip(codes, counts)}
+
+    def ids_of_types(self, types: Iterable[str]) -> np.ndarray:
+        mask = 0
+        for t in types:
+            if t in self.types.codes:
+                mask |= 1 << self.types.codes[t]
+        return self._col("id")[((self._col("types") & mask) != 0) & self._col("alive")]
+
+    def nbytes(self) -> int:
+        return sum(int(c.nbytes) for c in self._cols.values()) + int(self._text.nbytes)
+
+    # ------------------------------------------------------------------ chunk <-> row
+    def _chunk(self, row: int) -> Dict:
+        c = {name: col[row] for name, col in self._cols.items()}
+        source: Dict = {}
+        if c["file"] >= 0:
+            source["file"] = self.names.values[c["file"]]
+        if c["page"] >= 0:
+            source["page"] = int(c["page"])
+        if c["sheet"] >= 0:
+            source["sheet"] = self.sheets.values[c["sheet"]]
+        if c["row_start"] >= 0:
+            source["rows"] = f"{c['row_start']}-{c['row_end']}"
+        if c["flags"] & HAS_TYPES:
+            source["types"] = sorted(t for i, t in enumerate(self.types.values) if c["types"] >> i & 1)
+        if c["flags"] & OCR:
+            source["ocr"] = True
+        chunk = {"id": int(c["id"]), "file_id": self.names.values[c["file_id"]], "text": self.text(row),
+                 "source": source}
+        if c["char_start"] >= 0:
+            chunk["char_start"], chunk["char_end"] = int(c["char_start"]), int(c["char_end"])
+        if c["extra"] >= 0:
+            extra = json.loads(self.extras.values[c["extra"]])
+            source.update(extra.pop("source", {}))
+            chunk.update(extra)
+        return chunk
+
+    def _encode(self, chunk: Dict) -> Tuple:
+        source = dict(chunk.get("source") or {})
+        extra = {k: v for k, v in chunk.items() if k not in ("id", "file_id", "text", "source", "char_start",
+                                                               "char_end")}
+        file = self.names.code(source.pop("file")) if isinstance(source.get("file"), str) else -1
+        page = source.pop("page") if type(source.get("page")) is int and source["page"] >= 0 else -1
+        sheet = self.sheets.code(source.pop("sheet")) if isinstance(source.get("sheet"), str) else -1
+        row_start = row_end = -1
+        m = _ROWS_RE.match(source["rows"]) if isinstance(source.get("rows"), str) else None
+        if m:
+            row_start, row_end = int(m.group(1)), int(m.group(2))
+            source.pop("rows")
+        flags, types = 0, 0
+        types_list = source.get("types")
+        if isinstance(types_list, list) and all(isinstance(t, str) for t in types_list):
+            codes = [self.types.code(t) for t in types_list]
+            if max(codes, default=0) < 32:
+                flags |= HAS_TYPES
+                types = sum(1 << c for c in set(codes))
+                # The mask decodes sorted and unique (as detect_statement_types tags); keep other lists verbatim.
+                if types_list == sorted(set(types_list)):
+                    source.pop("types")
+        if source.get("ocr") is True:
+            flags |= OCR
+            source.pop("ocr")
+        char_start, char_end = chunk.get("char_start"), chunk.get("char_end")
+        if not (type(char_start) is int and type(char_end) is int and char_start >= 0):
+            if char_start is not None or char_end is not None:
+                extra.update(char_start=char_start, char_end=char_end)
+            char_start = char_end = -1
+        if source:
+            extra["source"] = source
+        extra_code = self.extras.code(json.dumps(extra, sort_keys=True)) if extra else -1
+        return (self.names.code(chunk["file_id"]), file, page, sheet, row_start, row_end, types, flags,
+                char_start, char_end, extra_code)
+
+    # ------------------------------------------------------------------ mutation
+    def _reserve(self, rows: int, text_bytes: int):
+        """Make the columns writable in-memory arrays with room for ``rows`` / ``text_bytes`` more."""
+        need = self._n + rows
+        if not self._writable or need > len(self._cols["id"]):
+            capacity = max(need, 2 * len(self._cols["id"]), 1024)
+            for name, col in self._cols.items():
+                grown = np.empty(capacity, dtype=col.dtype)
+                grown[:self._n] = col[:self._n]
+                self._cols[name] = grown
+        need = self._text_used + text_bytes
+        if not self._writable or need > len(self._text):
+            grown = np.empty(max(need, 2 * len(self._text), 1 << 16), dtype="uint8")
+            grown[:self._text_used] = self._text[:self._text_used]
+            self._text = grown
+        self._writable = True
+
+    def extend(self, chunks: Sequence[Dict]):
+        """Append chunks (each with ``id``, ``file_id``, ``text`` and ``source``); ids must keep increasing."""
+        if not chunks:
+            return
+        ids = np.fromiter((c["id"] for c in chunks), dtype="int64", count=len(chunks))
+        if (self._n and ids[0] <= self._cols["id"][self._n - 1]) or np.any(np.diff(ids) <= 0):
+            raise ValueError("Chunk ids must be added in increasing order.")
+        encoded = [c["text"].encode("utf-8") for c in chunks]
+        lengths = np.fromiter((len(b) for b in encoded), dtype="int64", count=len(encoded))
+        self._reserve(len(chunks), int(lengths.sum()))
+
+        rows = slice(self._n, self._n + len(chunks))
+        meta = np.array([self._encode(c) for c in chunks], dtype="int64").reshape(len(chunks), -1)
+        for j, name in enumerate(("file_id", "file", "page", "sheet", "row_start", "row_end", "types", "flags",
+                                  "char_start", "char_end", "extra")):
+            self._cols[name][rows] = meta[:, j]
+        self._cols["id"][rows] = ids
+        self._cols["offset"][rows] = self._text_used + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self._cols["length"][rows] = lengths
+        self._cols["alive"][rows] = True
+        blob = b"".join(encoded)
+        self._text[self._text_used:self._text_used + len(blob)] = np.frombuffer(blob, dtype="uint8")
+        self._text_used += len(blob)
+        self._n += len(chunks)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Tombstone the given ids; returns how many were live."""
+        ids = np.asarray(list(ids), dtype="int64")
+        if not len(ids) or not len(self):
+            return 0
+        rows = np.searchsorted(self._col("id"), ids)
+        rows = rows[rows < self._n]
+        rows = rows[np.isin(self._cols["id"][rows], ids) & self._cols["alive"][rows]]
+        if not len(rows):
+            return 0
+        self._reserve(0, 0)
+        self._cols["alive"][rows] = False
+        self._dead += len(rows)
+        if self._dead > MAX_DEAD_RATIO * self._n:
+            self.compact()
+        return len(rows)
+
+    def compact(self):
+        """Drop tombstoned rows and their text."""
+        alive = self._col("alive").copy()
+        keep_bytes = np.repeat(alive, self._col("length"))
+        text = self._text[:self._text_used][keep_bytes]
+        cols = {name: self._col(name)[alive] for name in self._cols}
+        cols["offset"] = np.concatenate(([0], np.cumsum(cols["length"], dtype="int64")[:-1])).astype("int64")
+        self._cols, self._text = cols, text
+        self._n, self._text_used, self._dead = len(cols["id"]), len(text), 0
+
+    def clear(self):
+        self.__init__()
+
+    # ------------------------------------------------------------------ persistence
+    def save(self, path: str):
+        """Write the live rows to the directory ``path``: one ``.npy`` per column, ``text.bin`` and ``meta.json``."""
+        if self._dead:
+            self.compact()
+        root = Path(path)
+        root.mkdir(parents=True, exist_ok=True)
+        for name in self._cols:
+            np.save(root / f"{name}.npy", np.ascontiguousarray(self._col(name)))
+        with open(root / "text.bin", "wb") as fh:
+            fh.write(self._text[:self._text_used].tobytes())
+        with open(root / "meta.json", "w", encoding="utf-8") as fh:
+            json.dump({"names": self.names.values, "sheets": self.sheets.values, "types": self.types.values,
+                       "extras": self.extras.values}, fh)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        """Map a store written by ``save`` read-only; it is copied into memory on the first change."""
+        root = Path(path)
+        store = cls()
+        with open(root / "meta.json", "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        store.names, store.sheets = _Interner(meta["names"]), _Interner(meta["sheets"])
+        store.types, store.extras = _Interner(meta["types"]), _Interner(meta["extras"])
+        store._cols = {name: np.load(root / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+        size = os.path.getsize(root / "text.bin")
+        store._text = np.memmap(root / "text.bin", dtype="uint8", mode="r") if size else np.empty(0, dtype="uint8")
+        store._n, store._text_used = len(store._cols["id"]), size
+        store._writable = False
+        return store
@@ -0,0 +1,153 @@
+"""cli.py
+Offline ingestion: pre-build a workspace from a directory of filings so the
+app / API can open it instantly (set ``INDEX_DIR`` to the workspace path).
+
+    python -m core.cli ingest ./filings --index-dir .index
+    python -m core.cli info --index-dir .index
+    python -m core.cli embed-check --index-dir .index --backend onnx_int8
+
+Re-running ``ingest`` on the same workspace is incremental: unchanged files
+keep their chunks, changed files are re-embedded and files no longer in the
+directory are dropped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+SUPPORTED_SUFFIXES = (".pdf", ".xls", ".xlsx")
+
+
+def _find_files(root: str, recursive: bool) -> List[Path]:
+    pattern = "**/*" if recursive else "*"
+    return sorted(p for p in Path(root).glob(pattern) if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES)
+
+
+def cmd_ingest(args) -> int:
+    from .doc_cache import DocumentCache
+    from .document_parser import DocumentParser
+    from .embedding_backends import EmbedConfig
+    from .embeddings_retrieval import EmbedderRetriever
+    from .index_backends import IndexConfig
+    from .ingestion import NamedUpload, ingest_files
+    from .kpis import KPIStore
+    from .workspace import load_kpis, load_workspace, save_workspace, workspace_exists
+
+    paths = _find_files(args.directory, args.recursive)
+    if not paths:
+        print(f"No PDF or Excel files found in {args.directory}.", file=sys.stderr)
+        return 1
+    names = [str(p.relative_to(args.directory)) for p in paths]
+
+    t0 = time.perf_counter()
+    config = IndexConfig.from_env()
+    if args.index_kind:
+        config.kind = args.index_kind
+    embed_config = EmbedConfig.from_env()
+    if args.embed_backend:
+        embed_config.backend = args.embed_backend
+    if args.embed_processes:
+        embed_config.processes = args.embed_processes
+    retriever = EmbedderRetriever(embed_model_name=args.embed_model, index_config=config, embed_config=embed_config)
+    kpis = KPIStore()
+    if workspace_exists(args.index_dir) and not args.rebuild:
+        old_tables, _ = load_workspace(args.index_dir, retriever)
+        kpis = load_kpis(args.index_dir, old_tables)
+        print(f"Opened existing workspace with {len(retriever.file_ids)} files.")
+
+    parser = DocumentParser(max_workers=args.workers)
+    cache = None if args.no_cache else DocumentCache()
+    try:
+        uploads = [NamedUpload(p.read_bytes(), name) for p, name in zip(paths, names)]
+        tables, sources = ingest_files(uploads, parser, retriever, cache=cache,
+                                       max_chunk_size=args.chunk_size, remove_missing=True, kpi_store=kpis)
+    finally:
+        parser.close()
+    save_workspace(args.index_dir, retriever, tables, sources, kpis=kpis)
+    print(f"Ingested {len(names)} files ({len(sources)} pages/sheets, {len(retriever.chunks)} chunks, "
+          f"{len(tables)} tables) into {args.index_dir} [{retriever.index_kind}] in {time.perf_counter() - t0:.1f}s.")
+    return 0
+
+
+def cmd_info(args) -> int:
+    meta_path = Path(args.index_dir) / "index" / "meta.json"
+    if not meta_path.exists():
+        print(f"No workspace at {args.index_dir}.", file=sys.stderr)
+        return 1
+    with open(meta_path, "r", encoding="utf-8") as fh:
+        meta = json.load(fh)
+    counts = meta["chunks_per_file"]
+    print(json.dumps({
+        "embed_model_name": meta["embed_model_name"],
+        "index_kind": meta["index_kind"],
+        "files": len(meta["file_versions"]),
+        "chunks": sum(counts.values()),
+        "chunks_per_file": counts,
+    }, indent=2))
+    return 0
+
+
+def cmd_embed_check(args) -> int:
+    import random
+
+    from .chunk_store import ChunkStore
+    from .embedding_backends import EmbedConfig, accuracy_report
+
+    chunks_path = Path(args.index_dir) / "index" / "chunks"
+    meta_path = Path(args.index_dir) / "index" / "meta.json"
+    if not chunks_path.exists():
+        print(f"No workspace at {args.index_dir}.", file=sys.stderr)
+        return 1
+    with open(meta_path, "r", encoding="utf-8") as fh:
+        model_name = json.load(fh)["embed_model_name"]
+    texts = [text for _, text in ChunkStore.load(str(chunks_path)).iter_texts()]
+    texts = random.Random(0).sample(texts, min(args.sample, len(texts)))
+    config = EmbedConfig.from_env()
+    config.backend = args.backend
+    report = accuracy_report(model_name, texts, config, k=args.k)
+    print(json.dumps(report, indent=2))
+    if report["min_cosine"] < args.min_cosine:
+        print(f"min cosine {report['min_cosine']:.4f} is below {args.min_cosine}.", file=sys.stderr)
+        return 2
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.cli", description="Financial Doc Q&A offline tools.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="parse, embed and index a directory of filings into a workspace")
+    ing.add_argument("directory")
+    ing.add_argument("--index-dir", default=os.getenv("INDEX_DIR", ".index"))
+    ing.add_argument("--recursive", action="store_true")
+    ing.add_argument("--rebuild", action="store_true", help="ignore an existing workspace and start over")
+    ing.add_argument("--chunk-size", type=int, default=800)
+    ing.add_argument("--embed-model", default=None)
+    ing.add_argument("--index-kind", default=None, help="override INDEX_KIND")
+    ing.add_argument("--embed-backend", default=None, help="override EMBED_BACKEND (torch, onnx, onnx_int8)")
+    ing.add_argument("--embed-processes", type=int, default=None, help="override EMBED_PROCESSES")
+    ing.add_argument("--workers", type=int, default=None, help="parser processes (default PARSER_WORKERS / cpu count)")
+    ing.add_argument("--no-cache", action="store_true", help="don't read or write the document cache")
+    ing.set_defaults(func=cmd_ingest)
+
+    info = sub.add_parser("info", help="summarize a workspace")
+    info.add_argument("--index-dir", default=os.getenv("INDEX_DIR", ".index"))
+    info.set_defaults(func=cmd_info)
+
+    check = sub.add_parser("embed-check", help="compare an embedding backend with the PyTorch baseline on a workspace")
+    check.add_argument("--index-dir", default=os.getenv("INDEX_DIR", ".index"))
+    check.add_argument("--backend", default="onnx_int8")
+    check.add_argument("--sample", type=int, default=1000, help="chunks to encode")
+    check.add_argument("-k", type=int, default=10)
+    check.add_argument("--min-cosine", type=float, default=0.98, help="exit with status 2 below this")
+    check.set_defaults(func=cmd_embed_check)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
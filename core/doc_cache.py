@@ -0,0 +1,116 @@
+"""doc_cache.py
+Content-addressed on-disk cache for parsed documents and their embeddings.
+
+Each entry is keyed by a SHA-256 over the file bytes, file name and the
+parser / chunker / embedding-model versions, so re-uploading an identical
+filing skips parsing, chunking and encoding and goes straight to index load.
+
+Layout of one entry (``<cache_dir>/<key[:2]>/<key>/``):
+- ``meta.json``      page/sheet sources, chunks, KPI values and versions
+- ``tables.pkl``     extracted tables (list of DataFrames)
+- ``embeddings.npy`` normalized float32 chunk embeddings, loaded memory-mapped
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .document_parser import PARSER_VERSION
+from .processing_utils import CHUNKER_VERSION
+
+CACHE_FORMAT_VERSION = "3"
+
+
+@dataclass
+class CachedDocument:
+    tables: List[pd.DataFrame]
+    sources: List[Dict]
+    chunks: List[Dict]
+    embeddings: np.ndarray
+    kpis: List[Dict] = field(default_factory=list)  # see kpis.extract_kpis
+    versions: Dict[str, str] = field(default_factory=dict)
+
+
+class DocumentCache:
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("DOC_CACHE_DIR", ".doc_cache"))
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, embed_model_name: str, max_chunk_size: int) -> Dict[str, str]:
+        return {
+            "format": CACHE_FORMAT_VERSION,
+            "parser": PARSER_VERSION,
+            "chunker": CHUNKER_VERSION,
+            "chunk_size": str(max_chunk_size),
+            "embed_model": embed_model_name,
+        }
+
+    def make_key(self, file_bytes: bytes, filename: str, embed_model_name: str, max_chunk_size: int = 800) -> str:
+        """Hash file content plus every version that affects the cached output."""
+        h = hashlib.sha256()
+        h.update(file_bytes)
+        h.update(b"\0" + filename.encode("utf-8"))
+        h.update(json.dumps(self.versions(embed_model_name, max_chunk_size), sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def load(self, key: str) -> Optional[CachedDocument]:
+        """Return the cached entry for ``key`` or None on a miss / unreadable entry."""
+        entry = self._entry_dir(key)
+        try:
+            with open(entry / "meta.json", "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            tables = pd.read_pickle(entry / "tables.pkl")
+            embeddings = np.load(entry / "embeddings.npy", mmap_mode="r")
+        except (OSError, ValueError, EOFError):
+            self.misses += 1
+            metrics.incr("doc_cache_total", result="miss")
+            return None
+
+        self.hits += 1
+        metrics.incr("doc_cache_total", result="hit")
+        return CachedDocument(
+            tables=tables,
+            sources=meta["sources"],
+            chunks=meta["chunks"],
+            embeddings=embeddings,
+            kpis=meta["kpis"],
+            versions=meta.get("versions", {}),
+        )
+
+    def save(self, key: str, doc: CachedDocument):
+        """Write an entry atomically: build it in a temp dir, then rename into place."""
+        entry = self._entry_dir(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=entry.parent))
+        try:
+            with open(tmp / "meta.json", "w", encoding="utf-8") as fh:
+                json.dump(
+                    {"sources": doc.sources, "chunks": doc.chunks, "kpis": doc.kpis, "versions": doc.versions},
+                    fh,
+                    default=str,
+                )
+            pd.to_pickle(doc.tables, tmp / "tables.pkl")
+            np.save(tmp / "embeddings.npy", np.ascontiguousarray(doc.embeddings, dtype="float32"))
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.hits = 0
+        self.misses = 0
@@ -3,113 +3,545 @@
 Parse PDF and Excel documents, extract text and structured numerical data (tables).
 Includes heuristics for recognizing common financial statements and optional OCR fallback.
 """
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Iterator, Optional
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+import hashlib
 import io
+import os
+import re
+import tempfile
+import time
 import pandas as pd
-import pdfplumber
 import streamlit as st
 
-# Optional OCR dependencies (only used if available)
-try:
-    from pdf2image import convert_from_bytes
+from . import metrics
+from .processing_utils import flatten_cell, rows_to_text
+from .statements import STATEMENT_KEYWORDS, detect_statement_types  # noqa: F401 (re-exported)
+
+
+def _pdfplumber():
+    # Imported on first use so the app (and the API) start without paying for it.
+    import pdfplumber
+    return pdfplumber
+
+
+@lru_cache(maxsize=1)
+def ocr_backend():
+    """``(convert_from_bytes, pytesseract)`` if the optional OCR dependencies are installed, else None."""
+    try:
+        from pdf2image import convert_from_bytes
+        import pytesseract
+    except Exception:
+        return None
+    return convert_from_bytes, pytesseract
+
+# Bump whenever parsing output changes so cached parse results are invalidated.
+PARSER_VERSION = '6'
+
+# Pages are OCR'd when their text layer has fewer than OCR_MIN_TEXT_CHARS characters or more than
+# OCR_GARBLED_RATIO of it is unmapped glyphs ("(cid:123)", U+FFFD, control characters).
+OCR_DPI = int(os.getenv('OCR_DPI', '200'))
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+OCR_MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '20'))
+OCR_GARBLED_RATIO = float(os.getenv('OCR_GARBLED_RATIO', '0.3'))
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '.ocr_cache')
+_GARBLED_RE = re.compile(r'\(cid:\d+\)|[\ufffd\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Don't spin up worker processes for short documents; pool overhead dominates.
+MIN_PAGES_FOR_PARALLEL = 8
+PAGES_PER_TASK = 4
+
+# Worksheet rows per parsed record; a sheet's full table is kept only up to EXCEL_TABLE_MAX_ROWS rows.
+EXCEL_ROWS_PER_RECORD = int(os.getenv('EXCEL_ROWS_PER_RECORD', '1000'))
+EXCEL_TABLE_MAX_ROWS = int(os.getenv('EXCEL_TABLE_MAX_ROWS', '100000'))
+# auto | openpyxl | calamine (auto uses python-calamine when installed)
+EXCEL_ENGINE = os.getenv('EXCEL_ENGINE', 'auto')
+
+
+def _extract_page(page) -> Tuple[str, List[List]]:
+    """Return a page's text and its raw (list-of-rows) tables."""
+    text = page.extract_text() or ''
+    try:
+        raw_tables = page.extract_tables() or []
+    except Exception:
+        raw_tables = []
+    return text, raw_tables
+
+
+def _close_page(page):
+    """Release pdfplumber's per-page object cache so long documents don't accumulate it."""
+    try:
+        page.close()
+    except Exception:
+        pass
+
+
+def _extract_pdf_page_range(path: str, start: int, end: int) -> List[Tuple[int, str, List[List], float]]:
+    """Worker entry point: extract pages [start, end) of the PDF at ``path``.
+
+    Runs in a child process, so it only returns plain picklable data (page
+    index, text, raw tables, extraction seconds) and never touches Streamlit.
+    """
+    out = []
+    with _pdfplumber().open(path) as pdf:
+        for i in range(start, end):
+            t0 = time.perf_counter()
+            page = pdf.pages[i]
+            text, raw_tables = _extract_page(page)
+            _close_page(page)
+            out.append((i, text, raw_tables, time.perf_counter() - t0))
+    return out
+
+
+def needs_ocr(text: str) -> bool:
+    """True when a page's text layer is missing or mostly unmapped glyphs (scanned or broken-font pages)."""
+    stripped = text.strip()
+    if len(stripped) < OCR_MIN_TEXT_CHARS:
+        return True
+    garbled = sum(len(m) for m in _GARBLED_RE.findall(stripped))
+    return garbled > OCR_GARBLED_RATIO * len(stripped)
+
+
+def _ocr_pdf_page(path: str, index: int, dpi: int = OCR_DPI, lang: str = OCR_LANG,
+                  cache_dir: Optional[str] = OCR_CACHE_DIR) -> Tuple[int, str, float, bool]:
+    """Worker entry point: rasterize page ``index`` (0-based) of the PDF at ``path`` and OCR it.
+
+    The recognized text is cached under a hash of the rendered image (and
+    the OCR language), so identical pages (re-uploads, repeated scanned
+    exhibits) skip tesseract. Returns ``(index, text, seconds, cache_hit)``.
+    """
+    from pdf2image import convert_from_path
     import pytesseract
-    OCR_AVAILABLE = True
-except Exception:
-    OCR_AVAILABLE = False
+    t0 = time.perf_counter()
+    images = convert_from_path(path, dpi=dpi, first_page=index + 1, last_page=index + 1)
+    if not images:
+        return index, '', time.perf_counter() - t0, False
+    image = images[0]
+    entry = None
+    if cache_dir:
+        digest = hashlib.sha256(f'{image.mode}:{image.size}:{lang}:'.encode() + image.tobytes()).hexdigest()
+        entry = Path(cache_dir) / digest[:2] / f'{digest}.txt'
+        if entry.exists():
+            return index, entry.read_text(encoding='utf-8'), time.perf_counter() - t0, True
+    text = pytesseract.image_to_string(image, lang=lang)
+    if entry is not None:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, entry)
+    return index, text, time.perf_counter() - t0, False
+
+
+def _discard(futures: List[Future], paths: List[str]):
+    """Cancel a PDF's queued worker tasks and delete its temp files."""
+    for fut in futures:
+        fut.cancel()
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _SubmittedPages:
+    """Page iterator over a PDF already fanned out to the worker pool.
+
+    ``close()`` releases the submitted tasks and temp file even if iteration
+    never started; a generator's ``finally`` only runs once it has.
+    """
+
+    def __init__(self, pages: Iterator[Dict], submitted: Tuple[str, List[Future]]):
+        self._pages = pages
+        self._submitted: Optional[Tuple[str, List[Future]]] = submitted
+
+    def __iter__(self) -> '_SubmittedPages':
+        return self
+
+    def __next__(self) -> Dict:
+        self._submitted = None  # once started, the generator cleans up after itself
+        return next(self._pages)
+
+    def close(self):
+        self._pages.close()
+        if self._submitted is not None:
+            path, futures = self._submitted
+            _discard(futures, [path])
+            self._submitted = None
+
+
+def _calamine():
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        return None
+    return CalamineWorkbook
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == '' or (isinstance(value, float) and value != value)
+
+
+def _iter_sheet_rows(file_bytes: bytes, filename: str, engine: str = EXCEL_ENGINE) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    """``(sheet name, row iterator)`` per worksheet, reading rows lazily instead of loading whole sheets."""
+    workbook_cls = _calamine() if engine in ('auto', 'calamine') else None
+    if workbook_cls is not None:
+        workbook = workbook_cls.from_filelike(io.BytesIO(file_bytes))
+        for name in workbook.sheet_names:
+            yield name, workbook.get_sheet_by_name(name).iter_rows()
+        return
+    if filename.lower().endswith('.xls'):
+        # openpyxl can't read the legacy format; these files are small enough to load per sheet.
+        xls = pd.ExcelFile(io.BytesIO(file_bytes))
+        for name in xls.sheet_names:
+            yield name, pd.read_excel(xls, sheet_name=name, header=None).itertuples(index=False, name=None)
+        return
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        for ws in workbook.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        workbook.close()
 
-STATEMENT_KEYWORDS = {
-    'income_statement': ['income statement', 'statement of profit', 'profit and loss', 'revenue', 'net income'],
-    'balance_sheet': ['balance sheet', 'assets', 'liabilities', 'equity', 'total assets'],
-    'cash_flow': ['cash flow', 'statement of cash flows', 'operating activities', 'investing activities']
-}
 
 class DocumentParser:
-    def __init__(self):
-        pass
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            max_workers = int(os.getenv('PARSER_WORKERS', '0')) or (os.cpu_count() or 1)
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def parallel(self) -> bool:
+        return self.max_workers > 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
 
     def _detect_statement_type(self, text: str) -> List[str]:
-        found = set()
-        t = text.lower()
-        for k, kws in STATEMENT_KEYWORDS.items():
-            for kw in kws:
-                if kw in t:
-                    found.add(k)
-        return list(found)
+        return detect_statement_types(text)
 
-    def _extract_tables_from_pdf_page(self, page):
+    def _raw_tables_to_dfs(self, raw_tables: List[List]) -> List[pd.DataFrame]:
         tables = []
+        for t in raw_tables:
+            if len(t) > 1:
+                try:
+                    tables.append(pd.DataFrame(t[1:], columns=t[0]))
+                except Exception:
+                    pass
+        return tables
+
+    def _extract_tables_from_pdf_page(self, page):
         try:
-            raw_tables = page.extract_tables() or []
-            for t in raw_tables:
-                if len(t) > 1:
-                    df = pd.DataFrame(t[1:], columns=t[0])
-                    tables.append(df)
+            return self._raw_tables_to_dfs(page.extract_tables() or [])
         except Exception:
-            pass
-        return tables
+            return []
 
-    def parse_pdf_bytes(self, file_bytes: bytes, filename: str = '') -> Tuple[str, List[pd.DataFrame], List[Dict]]:
-        text_chunks = []
+    def _page_record(self, filename: str, index: int, page_text: str, raw_tables: List[List],
+                     ocr: bool = False) -> Dict:
+        """One parsed page: ``{'text', 'source', 'tables'}`` with the page's own provenance."""
+        tag = 'PAGE_OCR' if ocr else 'PAGE'
+        metrics.incr('pages_parsed_total', mode='ocr' if ocr else 'native')
+        full_page_text = f'[FILE: {filename}] [{tag}: {index+1}]\n' + page_text
+        source = {'file': filename, 'page': index+1, 'types': self._detect_statement_type(full_page_text)}
+        if ocr:
+            source['ocr'] = True
         tables = []
-        sources = []
+        for tbl in self._raw_tables_to_dfs(raw_tables):
+            tbl.attrs['source'] = source
+            tables.append(tbl)
+        return {'text': full_page_text, 'source': source, 'tables': tables}
+
+    def _submit_ocr(self, path: str, index: int):
+        """OCR one page on the worker pool (or inline when the parser is serial)."""
+        if self.parallel:
+            return self._get_pool().submit(_ocr_pdf_page, path, index)
+        future: Future = Future()
+        try:
+            future.set_result(_ocr_pdf_page(path, index))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _ocr_record(self, filename: str, index: int, native_text: str, raw_tables: List[List],
+                    future: Future) -> Dict:
+        """The page record for an OCR'd page, keeping the native text if OCR fails or finds nothing."""
         try:
-            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text() or ''
-                    header = f'[FILE: {filename}] [PAGE: {i+1}]\\n'
-                    full_page_text = header + page_text
-                    statement_types = self._detect_statement_type(full_page_text)
-                    text_chunks.append({'text': full_page_text, 'source': {'file': filename, 'page': i+1, 'types': statement_types}})
-                    sources.append({'file': filename, 'page': i+1, 'types': statement_types})
-                    page_tables = self._extract_tables_from_pdf_page(page)
-                    for tbl in page_tables:
-                        tables.append(tbl)
+            _, text, seconds, cache_hit = future.result()
         except Exception as e:
-            st.warning(f'pdfplumber parsing error: {e}. OCR fallback will be attempted if available.')
-            if OCR_AVAILABLE:
+            st.warning(f'OCR failed for {filename} page {index+1}: {e}')
+            return self._page_record(filename, index, native_text, raw_tables)
+        metrics.observe('parse_page_seconds', seconds, mode='ocr')
+        metrics.incr('ocr_cache_total', result='hit' if cache_hit else 'miss')
+        if not text.strip():
+            return self._page_record(filename, index, native_text, raw_tables)
+        return self._page_record(filename, index, text, raw_tables, ocr=True)
+
+    def _with_ocr(self, pages: Iterator[Tuple[int, str, List[List]]], filename: str, pdf_path) -> Iterator[Dict]:
+        """Turn ``(index, text, raw_tables)`` into page records in order, OCR'ing the pages that need it.
+
+        OCR jobs run ahead on the worker pool (up to a few per worker), so a
+        run of scanned pages is recognized in parallel. ``pdf_path()``
+        returns a path to the PDF on disk for the workers.
+        """
+        pending = deque()
+        ocr = ocr_backend() is not None
+        window = self.max_workers * 2
+
+        def ready(item) -> bool:
+            return item[0] == 'page' or item[-1].done()
+
+        def emit(item) -> Dict:
+            if item[0] == 'page':
+                return self._page_record(filename, *item[1:])
+            return self._ocr_record(filename, *item[1:])
+
+        for index, text, raw_tables in pages:
+            if ocr and needs_ocr(text):
+                pending.append(('ocr', index, text, raw_tables, self._submit_ocr(pdf_path(), index)))
+            else:
+                pending.append(('page', index, text, raw_tables))
+            while pending and (ready(pending[0]) or len(pending) > window):
+                yield emit(pending.popleft())
+        while pending:
+            yield emit(pending.popleft())
+
+    def _submit_pdf(self, file_bytes: bytes) -> Optional[Tuple[str, List[Future]]]:
+        """Fan a PDF's pages out to the worker pool.
+
+        Returns ``(temp_path, futures)`` or None when the document is too
+        short (or the parser is serial) and should be parsed inline. Workers
+        read the PDF from a temp file rather than receiving the bytes per task.
+        """
+        if not self.parallel:
+            return None
+        try:
+            with _pdfplumber().open(io.BytesIO(file_bytes)) as pdf:
+                n_pages = len(pdf.pages)
+        except Exception:
+            return None
+        if n_pages < MIN_PAGES_FOR_PARALLEL:
+            return None
+
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(file_bytes)
+        pool = self._get_pool()
+        step = max(PAGES_PER_TASK, -(-n_pages // (self.max_workers * 4)))
+        futures = [pool.submit(_extract_pdf_page_range, path, start, min(start + step, n_pages))
+                   for start in range(0, n_pages, step)]
+        return path, futures
+
+    def iter_pdf_pages(self, file_bytes: bytes, filename: str = '',
+                       submitted: Optional[Tuple[str, List[Future]]] = None) -> Iterator[Dict]:
+        """Yield page records in page order, holding only one page (or one worker batch) at a time.
+
+        Pages come from the worker pool when ``submitted`` (or the parser's
+        parallel mode) applies. Pages with no usable text layer
+        (``needs_ocr``) are OCR'd individually, in parallel on the worker pool,
+        when OCR is available; if pdfplumber fails part-way, the remaining
+        pages are OCR'd.
+        """
+        if submitted is None:
+            submitted = self._submit_pdf(file_bytes)
+        temp_paths = [submitted[0]] if submitted is not None else []
+
+        def pdf_path() -> str:
+            if not temp_paths:
+                fd, path = tempfile.mkstemp(suffix='.pdf')
+                with os.fdopen(fd, 'wb') as fh:
+                    fh.write(file_bytes)
+                temp_paths.append(path)
+            return temp_paths[0]
+
+        def native_pages() -> Iterator[Tuple[int, str, List[List]]]:
+            next_page = 0
+            try:
+                if submitted is not None:
+                    for fut in submitted[1]:
+                        for i, page_text, raw_tables, seconds in fut.result():
+                            metrics.observe('parse_page_seconds', seconds, mode='native')
+                            yield i, page_text, raw_tables
+                            next_page = i + 1
+                else:
+                    with _pdfplumber().open(io.BytesIO(file_bytes)) as pdf:
+                        for i, page in enumerate(pdf.pages):
+                            with metrics.span('parse_page', mode='native'):
+                                page_text, raw_tables = _extract_page(page)
+                                _close_page(page)
+                            yield i, page_text, raw_tables
+                            next_page = i + 1
+            except Exception as e:
+                if ocr_backend() is None:
+                    st.warning(f'pdfplumber parsing error: {e}. Install pdf2image and pytesseract for OCR fallback.')
+                    return
+                st.warning(f'pdfplumber parsing error: {e}. The remaining pages will be OCR\'d.')
                 try:
-                    images = convert_from_bytes(file_bytes)
-                    for idx, img in enumerate(images):
-                        txt = pytesseract.image_to_string(img)
-                        header = f'[FILE: {filename}] [PAGE_OCR: {idx+1}]\\n'
-                        full = header + txt
-                        statement_types = self._detect_statement_type(full)
-                        text_chunks.append({'text': full, 'source': {'file': filename, 'page': idx+1, 'types': statement_types}})
-                        sources.append({'file': filename, 'page': idx+1, 'types': statement_types})
+                    from pdf2image import pdfinfo_from_path
+                    n_pages = int(pdfinfo_from_path(pdf_path())['Pages'])
                 except Exception as e2:
                     st.error(f'OCR fallback failed: {e2}')
-        return '\\n\\n'.join([c['text'] for c in text_chunks]), tables, sources
+                    return
+                # No text layer: every remaining page goes to OCR.
+                for i in range(next_page, n_pages):
+                    yield i, '', []
 
-    def parse_excel_bytes(self, file_bytes: bytes, filename: str = '') -> Tuple[str, List[pd.DataFrame], List[Dict]]:
-        texts = []
-        tables = []
-        sources = []
         try:
-            xls = pd.ExcelFile(io.BytesIO(file_bytes))
-            for sheet in xls.sheet_names:
-                df = pd.read_excel(xls, sheet_name=sheet, engine='openpyxl')
-                tables.append(df)
-                header = f'[FILE: {filename}] [SHEET: {sheet}]\\n'
-                texts.append(header + df.to_csv(index=False))
-                stypes = self._detect_statement_type(df.to_csv(index=False))
-                sources.append({'file': filename, 'sheet': sheet, 'types': stypes})
+            yield from self._with_ocr(native_pages(), filename, pdf_path)
+        finally:
+            _discard(submitted[1] if submitted is not None else [], temp_paths)
+
+    def _rows_record(self, filename: str, sheet: str, header: List[str], rows: List[tuple],
+                     row_numbers: List[int]) -> Tuple[Dict, pd.DataFrame]:
+        """One record for a group of worksheet rows, plus the rows as a DataFrame."""
+        frame = pd.DataFrame(rows)
+        names = header + [f'Unnamed: {i}' for i in range(len(header), frame.shape[1])]
+        frame = frame.reindex(columns=range(len(names)))
+        frame.columns = names
+        span = f'{row_numbers[0]}-{row_numbers[-1]}' if row_numbers else ''
+        header_line = ' | '.join(flatten_cell(str(n)) for n in names)
+        lines = [f'[FILE: {filename}] [SHEET: {sheet}] [ROWS: {span}]', header_line]
+        text = '\n'.join(lines + rows_to_text(frame).tolist())
+        source = {'file': filename, 'sheet': sheet, 'rows': span, 'types': self._detect_statement_type(text)}
+        return {'text': text, 'source': source, 'tables': [], 'row_numbers': list(row_numbers)}, frame
+
+    def _iter_sheet_records(self, filename: str, sheet: str, rows: Iterator[tuple]) -> Iterator[Dict]:
+        header: Optional[List[str]] = None
+        group, numbers = [], []
+        kept, kept_rows, total_rows = [], 0, 0
+        types = set()
+        pending: Optional[Dict] = None
+
+        def flush() -> Dict:
+            nonlocal kept_rows
+            with metrics.span('parse_page', mode='excel'):
+                record, frame = self._rows_record(filename, sheet, header, group, numbers)
+            metrics.incr('pages_parsed_total', mode='excel')
+            if kept_rows < EXCEL_TABLE_MAX_ROWS:
+                kept.append(frame.iloc[:EXCEL_TABLE_MAX_ROWS - kept_rows])
+                kept_rows += len(kept[-1])
+            types.update(record['source']['types'])
+            group.clear()
+            numbers.clear()
+            return record
+
+        for row_no, row in enumerate(rows, start=1):
+            if all(_is_empty(v) for v in row):
+                continue
+            if header is None:
+                header = [f'Unnamed: {i}' if _is_empty(v) else str(v) for i, v in enumerate(row)]
+                continue
+            group.append(row)
+            numbers.append(row_no)
+            total_rows += 1
+            if len(group) >= EXCEL_ROWS_PER_RECORD:
+                # Hold back one record so the sheet's table can ride on the last one.
+                if pending is not None:
+                    yield pending
+                pending = flush()
+        if header is None:
+            return
+        if group or pending is None:
+            if pending is not None:
+                yield pending
+            pending = flush()
+
+        table = pd.concat(kept, ignore_index=True)
+        table.attrs['source'] = {'file': filename, 'sheet': sheet, 'types': sorted(types)}
+        if total_rows > kept_rows:
+            table.attrs['truncated_rows'] = total_rows
+            st.warning(f'{filename} / {sheet}: only the first {kept_rows:,} of {total_rows:,} rows are kept as a table '
+                       f'(all rows are indexed for search).')
+        pending['tables'] = [table]
+        yield pending
+
+    def iter_excel_sheets(self, file_bytes: bytes, filename: str = '') -> Iterator[Dict]:
+        """Yield records of up to ``EXCEL_ROWS_PER_RECORD`` worksheet rows, streaming rows from the workbook.
+
+        A record's text is a ``[FILE] [SHEET] [ROWS a-b]`` line, the header
+        row and one ``" | "``-joined line per row; ``row_numbers`` gives each
+        line's worksheet row so chunks keep their row range. The sheet's
+        DataFrame (its first ``EXCEL_TABLE_MAX_ROWS`` rows) is attached to its
+        last record.
+        """
+        try:
+            for sheet, rows in _iter_sheet_rows(file_bytes, filename):
+                yield from self._iter_sheet_records(filename, sheet, rows)
         except Exception as e:
             st.error(f'Error parsing Excel: {e}')
-        return '\\n\\n'.join(texts), tables, sources
+
+    def iter_file_pages(self, file_bytes: bytes, filename: str = '') -> Iterator[Dict]:
+        """Yield page (PDF) or sheet (Excel) records based on the file extension."""
+        if filename.lower().endswith('.pdf'):
+            return self.iter_pdf_pages(file_bytes, filename=filename)
+        return self.iter_excel_sheets(file_bytes, filename=filename)
+
+    def iter_many(self, files: List[Tuple[bytes, str]]) -> List[Iterator[Dict]]:
+        """Page iterators for several ``(file_bytes, filename)`` pairs, in input order.
+
+        In parallel mode the pages of every PDF are submitted to the worker
+        pool up front, so files are extracted concurrently while the caller
+        consumes the iterators one after another. Call ``close()`` on every
+        iterator when done (or on an error), consumed or not, so the pending
+        extraction tasks and temp files of unread PDFs are released.
+        """
+        iterators = []
+        for b, name in files:
+            if not name.lower().endswith('.pdf'):
+                iterators.append(self.iter_excel_sheets(b, filename=name))
+                continue
+            submitted = self._submit_pdf(b)
+            pages = self.iter_pdf_pages(b, filename=name, submitted=submitted)
+            iterators.append(_SubmittedPages(pages, submitted) if submitted is not None else pages)
+        return iterators
+
+    @staticmethod
+    def join_pages(pages: Iterator[Dict]) -> Tuple[str, List[pd.DataFrame], List[Dict]]:
+        """Collapse page records into the classic ``(text, tables, sources)`` triple."""
+        texts, tables, sources = [], [], []
+        for page in pages:
+            texts.append(page['text'])
+            tables.extend(page['tables'])
+            sources.append(page['source'])
+        return '\n\n'.join(texts), tables, sources
+
+    def parse_pdf_bytes(self, file_bytes: bytes, filename: str = '') -> Tuple[str, List[pd.DataFrame], List[Dict]]:
+        return self.join_pages(self.iter_pdf_pages(file_bytes, filename=filename))
+
+    def parse_excel_bytes(self, file_bytes: bytes, filename: str = '') -> Tuple[str, List[pd.DataFrame], List[Dict]]:
+        return self.join_pages(self.iter_excel_sheets(file_bytes, filename=filename))
+
+    def parse_file_bytes(self, file_bytes: bytes, filename: str = '') -> Tuple[str, List[pd.DataFrame], List[Dict]]:
+        """Dispatch to the PDF or Excel parser based on the file extension."""
+        return self.join_pages(self.iter_file_pages(file_bytes, filename=filename))
+
+    def parse_many(self, files: List[Tuple[bytes, str]]) -> List[Tuple[str, List[pd.DataFrame], List[Dict]]]:
+        """Parse several ``(file_bytes, filename)`` pairs, returning one result per file in input order."""
+        iterators = self.iter_many(files)
+        try:
+            return [self.join_pages(pages) for pages in iterators]
+        finally:
+            for pages in iterators:
+                pages.close()
 
     def parse_files_with_sources(self, uploaded_files: List) -> Tuple[str, List[pd.DataFrame], List[Dict]]:
         all_texts = []
         all_tables = []
         all_sources = []
-        for f in uploaded_files:
-            name = f.name
-            b = f.read()
-            if name.lower().endswith('.pdf'):
-                t, tbls, srcs = self.parse_pdf_bytes(b, filename=name)
-            else:
-                t, tbls, srcs = self.parse_excel_bytes(b, filename=name)
+        for t, tbls, srcs in self.parse_many([(f.read(), f.name) for f in uploaded_files]):
             if t:
                 all_texts.append(t)
             all_tables.extend(tbls)
             all_sources.extend(srcs)
-        return '\\n\\n---\\n\\n'.join(all_texts), all_tables, all_sources
+        return '\n\n---\n\n'.join(all_texts), all_tables, all_sources
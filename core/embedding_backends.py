@@ -0,0 +1,206 @@
+"""embedding_backends.py
+Selectable CPU embedding backends and the encode loop used by EmbedderRetriever.
+
+Encoding chunks is the largest ingestion cost on CPU-only servers. This
+module loads the sentence-transformers model through one of several
+backends and encodes with:
+- deduplication: identical chunk texts (disclaimers and headers repeated on
+  every page) are encoded once;
+- length-sorted dynamic batching: texts are sorted by length and grouped so
+  each batch holds about ``max_batch_tokens`` tokens, so short chunks are not
+  padded to the length of long ones and long chunks don't make huge batches;
+- optional multi-process encoding (``processes``) for large inputs.
+
+Backends:
+- ``torch``: the plain PyTorch model (the baseline);
+- ``onnx``: ONNX Runtime export of the same model;
+- ``onnx_int8``: the dynamically int8-quantized ONNX file shipped with the
+  model (``onnx_int8_file``), typically 2-3x faster on CPU.
+The ONNX backends need ``sentence-transformers[onnx]`` (optimum +
+onnxruntime). ``accuracy_report`` compares a backend with the baseline.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+import streamlit as st
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBED_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+# Inputs smaller than this are encoded in-process even when processes > 1; pool overhead dominates.
+MIN_TEXTS_FOR_POOL = 2048
+
+
+@dataclass
+class EmbedConfig:
+    backend: str = "torch"
+    onnx_int8_file: str = "onnx/model_qint8_avx2.onnx"
+    max_batch_tokens: int = 8192  # padded tokens per encode batch
+    processes: int = 1  # encoding processes; 1 = in-process
+    dedupe: bool = True
+
+    @classmethod
+    def from_env(cls) -> "EmbedConfig":
+        return cls(
+            backend=os.getenv("EMBED_BACKEND", "torch"),
+            onnx_int8_file=os.getenv("EMBED_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx"),
+            max_batch_tokens=int(os.getenv("EMBED_MAX_BATCH_TOKENS", "8192")),
+            processes=int(os.getenv("EMBED_PROCESSES", "1")),
+            dedupe=os.getenv("EMBED_DEDUPE", "1") != "0",
+        )
+
+    @property
+    def model_key_suffix(self) -> str:
+        """Identifies the backend in model / cache keys (empty for the baseline)."""
+        if self.backend == "torch":
+            return ""
+        return f"@{self.backend}" + (f":{self.onnx_int8_file}" if self.backend == "onnx_int8" else "")
+
+
+# Loaded models, shared by every retriever in the process (one copy per model name and backend).
+_MODELS: Dict[str, "SentenceTransformer"] = {}
+_POOLS: Dict[str, Dict] = {}
+_MODELS_LOCK = threading.RLock()
+
+
+def _load(name: str, config: EmbedConfig) -> "SentenceTransformer":
+    from sentence_transformers import SentenceTransformer
+    if config.backend == "torch":
+        return SentenceTransformer(name)
+    if config.backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{config.backend}'. Expected one of {EMBED_BACKENDS}.")
+    kwargs = {"file_name": config.onnx_int8_file} if config.backend == "onnx_int8" else {}
+    return SentenceTransformer(name, backend="onnx", model_kwargs=kwargs)
+
+
+def load_embedding_model(name: str, config: Optional[EmbedConfig] = None) -> "SentenceTransformer":
+    """Load (once per process) and return the model ``name`` for ``config.backend``.
+
+    If an ONNX backend cannot be loaded (missing extras or model file), the
+    PyTorch model is used instead.
+    """
+    config = config or EmbedConfig()
+    key = name + config.model_key_suffix
+    model = _MODELS.get(key)
+    if model is None:
+        with _MODELS_LOCK:
+            model = _MODELS.get(key)
+            if model is None:
+                with metrics.span("model_load", backend=config.backend):
+                    try:
+                        model = _load(name, config)
+                    except Exception as e:
+                        if config.backend == "torch":
+                            raise
+                        st.warning(f"Embedding backend '{config.backend}' unavailable ({e}); using PyTorch.")
+                        model = load_embedding_model(name, EmbedConfig())
+                _MODELS[key] = model
+    return model
+
+
+def model_loaded(name: str, config: Optional[EmbedConfig] = None) -> bool:
+    return name + (config or EmbedConfig()).model_key_suffix in _MODELS
+
+
+def _pool(model: "SentenceTransformer", key: str, processes: int) -> Dict:
+    with _MODELS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = model.start_multi_process_pool(["cpu"] * processes)
+    return pool
+
+
+def length_batches(texts: Sequence[str], max_batch_tokens: int) -> List[np.ndarray]:
+    """Positions of ``texts`` grouped into length-sorted batches of about ``max_batch_tokens`` padded tokens."""
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    batches, current, longest = [], [], 0
+    for i in order:
+        tokens = len(texts[i]) // 4 + 2  # ~4 characters per word-piece, plus [CLS]/[SEP]
+        if current and max(longest, tokens) * (len(current) + 1) > max_batch_tokens:
+            batches.append(np.array(current))
+            current, longest = [], 0
+        current.append(i)
+        longest = max(longest, tokens)
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+def encode_texts(model: "SentenceTransformer", texts: Sequence[str], config: Optional[EmbedConfig] = None,
+                 model_key: str = "") -> np.ndarray:
+    """Encode ``texts`` into a float32 ``(len(texts), dim)`` array (not normalized)."""
+    config = config or EmbedConfig()
+    if config.dedupe:
+        position: Dict[str, int] = {}
+        inverse = np.array([position.setdefault(t, len(position)) for t in texts], dtype="int64")
+        unique = list(position)
+        metrics.incr("embed_duplicates_total", len(texts) - len(unique))
+    else:
+        inverse, unique = None, list(texts)
+
+    if config.processes > 1 and len(unique) >= MIN_TEXTS_FOR_POOL:
+        pool = _pool(model, model_key, config.processes)
+        if hasattr(model, "encode_multi_process"):
+            embs = model.encode_multi_process(unique, pool)
+        else:
+            embs = model.encode(unique, pool=pool)
+        embs = np.asarray(embs, dtype="float32")
+    else:
+        embs = None
+        for batch in length_batches(unique, config.max_batch_tokens):
+            out = model.encode([unique[i] for i in batch], batch_size=len(batch), convert_to_numpy=True,
+                               show_progress_bar=False)
+            if embs is None:
+                embs = np.empty((len(unique), out.shape[1]), dtype="float32")
+            embs[batch] = out
+        if embs is None:
+            embs = np.zeros((0, model.get_sentence_embedding_dimension()), dtype="float32")
+    return embs[inverse] if inverse is not None else embs
+
+
+def accuracy_report(name: str, texts: Sequence[str], config: EmbedConfig, k: int = 10) -> Dict[str, float]:
+    """Compare ``config``'s backend with the PyTorch baseline on ``texts``.
+
+    Reports the mean / minimum cosine similarity between the two embeddings
+    of each text, how many of each text's ``k`` nearest neighbours the
+    candidate keeps (recall@k, self excluded) and both encode times.
+    """
+    if not texts:
+        raise ValueError("No texts to compare.")
+    def normalized(cfg: EmbedConfig):
+        model = load_embedding_model(name, cfg)
+        t0 = time.perf_counter()
+        embs = encode_texts(model, texts, cfg, model_key=name + cfg.model_key_suffix)
+        seconds = time.perf_counter() - t0
+        return embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12), seconds
+
+    baseline, base_s = normalized(EmbedConfig(max_batch_tokens=config.max_batch_tokens, dedupe=config.dedupe))
+    candidate, cand_s = normalized(config)
+    cosine = np.sum(baseline * candidate, axis=1)
+    k = min(k, len(texts) - 1)
+    recall = float("nan")
+    if k > 0:
+        def neighbours(embs):
+            sims = embs @ embs.T
+            np.fill_diagonal(sims, -np.inf)
+            return np.argsort(-sims, axis=1)[:, :k]
+        truth, found = neighbours(baseline), neighbours(candidate)
+        recall = float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+    return {
+        "backend": config.backend,
+        "n_texts": len(texts),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "recall_at_k": recall,
+        "k": k,
+        "baseline_s": base_s,
+        "candidate_s": cand_s,
+    }
@@ -1,58 +1,478 @@
-from typing import List, Optional, Tuple, Dict
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Dict
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 import streamlit as st
 
-from .processing_utils import chunk_text, clean_text
+from . import metrics
+from .embedding_backends import EmbedConfig, encode_texts, load_embedding_model, model_loaded
+from .chunk_store import ChunkStore
+from .processing_utils import batched, stream_chunks
+from .lexical import BM25Index, NumberIndex, rrf_fuse
+from .query_cache import LRUCache, normalize_question
+from .index_backends import (
+    IndexConfig, apply_search_params, build_index, filtered_search_params, index_memory_bytes, recall_report,
+    resolve_kind, supports_remove, train_index,
+)
+from .statements import query_statement_types
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+
+RETRIEVAL_MODES = ("vector", "hybrid")
+# Candidates pulled from each ranked list before fusion, as a multiple of top_k.
+HYBRID_CANDIDATE_FACTOR = 4
+
+# "auto": search only the statement partition a question is clearly about; "off": always search everything.
+STATEMENT_FILTER = os.getenv("STATEMENT_FILTER", "auto")
+# A detected partition holding more than this share of the corpus isn't worth filtering on.
+MAX_PARTITION_SHARE = 0.9
+
+# Rebuild an index that cannot delete in place (HNSW) once this share of it is tombstoned.
+MAX_TOMBSTONE_RATIO = 0.25
+
+# Bump whenever the layout written by EmbedderRetriever.save changes.
+INDEX_FORMAT_VERSION = "2"
+
+# Rough per-chunk overhead of the lexical postings; the chunk store is measured exactly.
+CHUNK_OVERHEAD_BYTES = 300
 
 class EmbedderRetriever:
-    def __init__(self, embed_model_name: Optional[str] = None):
+    def __init__(self, embed_model_name: Optional[str] = None, index_config: Optional[IndexConfig] = None,
+                 embed_config: Optional[EmbedConfig] = None):
         self.embed_model_name = embed_model_name or "sentence-transformers/all-MiniLM-L6-v2"
-        self.embedder: SentenceTransformer = SentenceTransformer(self.embed_model_name)
-        self.dim = self.embedder.get_sentence_embedding_dimension()
-        self.index: Optional[faiss.IndexFlatIP] = None
-        self.chunks: List[Dict] = []  # each item: {"text":..., "source": {...}}
+        self.embed_config = embed_config or EmbedConfig.from_env()
+        # The model (and torch behind it) is loaded on first use or by warm_up(), not here, and is
+        # shared with every other retriever using the same model name and backend.
+        self._embedder: Optional["SentenceTransformer"] = None
+        self._dim: Optional[int] = None
+        self.index_config = index_config or IndexConfig.from_env()
+        self.index_kind: Optional[str] = None
+        self.index: Optional[faiss.Index] = None
+        self._deleted: Set[int] = set()  # ids removed from the mapping but still in an HNSW graph
+        # Indexed chunks by id; store[cid] -> {"id":..., "file_id":..., "text":..., "source": {...}}
+        self.chunks = ChunkStore()
+        self._scopes: Dict[Tuple, Tuple[Set[int], faiss.IDSelector]] = {}  # filter -> (ids, selector), per version
+        self._scopes_version = -1
+        self.file_versions: Dict[str, str] = {}  # file_id -> content fingerprint of the indexed version
+        self._next_id = 0
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid")
+        self.lexical = BM25Index()
+        self.numbers = NumberIndex()
+        self.query_cache = LRUCache(max_size=int(os.getenv("QUERY_CACHE_SIZE", "2048")))
+        self._uid = uuid.uuid4().hex[:8]
+        self._version = 0
+
+    @property
+    def embedder(self) -> "SentenceTransformer":
+        if self._embedder is None:
+            self._embedder = load_embedding_model(self.embed_model_name, self.embed_config)
+        return self._embedder
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._embedder is not None or model_loaded(self.embed_model_name, self.embed_config)
+
+    @property
+    def embedding_key(self) -> str:
+        """Model name plus non-default backend; embeddings are only reused (doc cache) under the same key."""
+        return self.embed_model_name + self.embed_config.model_key_suffix
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            self._dim = self.index.d if self.index is not None else self.embedder.get_sentence_embedding_dimension()
+        return self._dim
+
+    def warm_up(self):
+        """Load the embedding model and run one tiny encode so the first real query is fast."""
+        self.embedder.encode(["warm up"], convert_to_numpy=True, show_progress_bar=False)
+
+    def make_chunks(self, full_text: str, sources: List[Dict] = None, max_chunk_size: int = 800) -> List[Dict]:
+        """Split full text into chunks, without touching the index.
+
+        A single text can only be attributed to a single source, so metadata
+        is attached only when exactly one source is given; use
+        ``stream_chunks`` over page records for per-page provenance.
+        """
+        source = sources[0] if sources and len(sources) == 1 else {}
+        return list(stream_chunks([{"text": full_text, "source": source}], max_chunk_size=max_chunk_size))
 
     def chunk_texts(self, full_text: str, sources: List[Dict] = None, max_chunk_size: int = 800) -> List[Dict]:
-        """Split full text into chunks and store them with optional metadata."""
-        cleaned = clean_text(full_text)
-        raw_chunks = chunk_text(cleaned, max_chunk_size=max_chunk_size)
+        """Split full text into chunks with optional metadata (kept for callers of the old API; not indexed)."""
+        return self.make_chunks(full_text, sources=sources, max_chunk_size=max_chunk_size)
+
+    def embed_chunks(self, texts: List[Dict]) -> np.ndarray:
+        """Encode chunks into L2-normalized float32 embeddings."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+
+        docs = [t["text"] for t in texts]
+        embs = encode_texts(self.embedder, docs, self.embed_config, model_key=self.embedding_key)
+        embs = np.ascontiguousarray(embs, dtype="float32")
+        faiss.normalize_L2(embs)
+        return embs
+
+    def embed_stream(self, chunks: Iterable[Dict], batch_size: int = EMBED_BATCH_SIZE) -> Iterator[Tuple[List[Dict], np.ndarray]]:
+        """Consume chunks lazily and yield ``(batch, embeddings)`` in fixed-size batches.
+
+        Texts already encoded earlier in the stream (page headers, disclaimers)
+        are not encoded again.
+        """
+        seen = LRUCache(max_size=4 * batch_size) if self.embed_config.dedupe else None
+        for batch in batched(chunks, batch_size):
+            with metrics.span("embed_batch"):
+                if seen is None:
+                    embs = self.embed_chunks(batch)
+                else:
+                    cached = [seen.get(c["text"]) for c in batch]
+                    todo = [c for c, e in zip(batch, cached) if e is None]
+                    new = iter(self.embed_chunks(todo))
+                    embs = np.vstack([e if e is not None else next(new) for e in cached])
+                    for c, e in zip(batch, embs):
+                        seen.put(c["text"], e)
+                    metrics.incr("embed_duplicates_total", len(batch) - len(todo))
+            metrics.incr("chunks_embedded_total", len(batch))
+            yield batch, embs
+
+    def _new_index(self, embs: np.ndarray) -> faiss.Index:
+        """Create an index sized for ``embs``, training it on them if the backend needs it."""
+        self.index_kind = resolve_kind(self.index_config, embs.shape[0])
+        index = build_index(self.dim, self.index_kind, self.index_config, embs.shape[0])
+        train_index(index, embs)
+        apply_search_params(index, self.index_config)
+        return index
+
+    @property
+    def index_version(self) -> str:
+        """Changes whenever the indexed content changes; unique to this retriever."""
+        return f"{self._uid}:{self._version}"
+
+    def reset(self):
+        """Drop every indexed document."""
+        self._version += 1
+        self.index = None
+        self.index_kind = None
+        self._deleted = set()
+        self.lexical.clear()
+        self.numbers.clear()
+        self.chunks = ChunkStore()
+        self.file_versions = {}
+        self._next_id = 0
+
+    def add_chunks(self, file_id: str, texts: List[Dict], embs: Optional[np.ndarray] = None,
+                   version: Optional[str] = None) -> List[int]:
+        """Add one file's chunks to the index, embedding them only if ``embs`` is not given.
+
+        Returns the ids assigned to the new chunks.
+        """
+        if version is not None:
+            self.file_versions[file_id] = version
+        if not texts:
+            return []
+        if embs is None:
+            embs = self.embed_chunks(texts)
+        if len(texts) != embs.shape[0]:
+            raise ValueError("Number of chunks and embeddings do not match.")
+        embs = np.ascontiguousarray(embs, dtype="float32")
+        if self.index is None:
+            self.index = self._new_index(embs)
+
+        self._version += 1
+        ids = np.arange(self._next_id, self._next_id + len(texts), dtype="int64")
+        self._next_id += len(texts)
+        self.index.add_with_ids(embs, ids)
+
+        self.chunks.extend([dict(t, id=cid, file_id=file_id) for cid, t in zip(ids.tolist(), texts)])
+        for cid, t in zip(ids.tolist(), texts):
+            self._register(cid, t["text"])
+        return ids.tolist()
+
+    def _register(self, cid: int, text: str):
+        """Make an added or loaded chunk findable lexically."""
+        self.lexical.add(cid, text)
+        self.numbers.add(cid, text)
+
+    def remove_file(self, file_id: str) -> int:
+        """Remove every chunk belonging to ``file_id``; returns the number removed."""
+        ids = self.chunks.ids_of_file(file_id).tolist()
+        self.file_versions.pop(file_id, None)
+        if not ids:
+            return 0
+        self._version += 1
+        self.chunks.remove(ids)
+        for cid in ids:
+            self.lexical.remove(cid)
+            self.numbers.remove(cid)
+        if self.index is not None:
+            if supports_remove(self.index_kind):
+                self.index.remove_ids(np.asarray(ids, dtype="int64"))
+            else:
+                self._deleted.update(ids)
+                if len(self._deleted) > MAX_TOMBSTONE_RATIO * self.index.ntotal:
+                    self.rebuild_index()
+        return len(ids)
 
-        self.chunks = []
-        for i, c in enumerate(raw_chunks):
-            meta = sources[i] if sources and i < len(sources) else {}
-            self.chunks.append({"text": c, "source": meta})
+    def replace_file(self, file_id: str, texts: List[Dict], embs: Optional[np.ndarray] = None,
+                     version: Optional[str] = None) -> List[int]:
+        """Swap a changed file's chunks for new ones."""
+        self.remove_file(file_id)
+        return self.add_chunks(file_id, texts, embs=embs, version=version)
 
-        return self.chunks
+    def _live_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Reconstruct the stored vectors of all live chunks (lossy for quantized backends)."""
+        ids = np.array(self.chunks.ids(), dtype="int64")
+        if self.index is None or not len(ids):
+            return ids, np.zeros((0, self.dim), dtype="float32")
+        return ids, np.ascontiguousarray(self.index.reconstruct_batch(ids), dtype="float32")
+
+    def rebuild_index(self, kind: Optional[str] = None):
+        """Rebuild the index from its own stored vectors, optionally switching backend.
+
+        Drops HNSW tombstones and re-trains IVF quantizers; nothing is re-embedded.
+        """
+        ids, vectors = self._live_vectors()
+        if kind is not None:
+            self.index_config.kind = kind
+        self._deleted = set()
+        if not len(ids):
+            self.index = None
+            self.index_kind = None
+            return
+        self.index = self._new_index(vectors)
+        self.index.add_with_ids(vectors, ids)
+
+    def optimize_index(self):
+        """Rebuild with a different backend if the corpus has outgrown (or shrunk below) the current one.
+
+        Covers ``auto`` mode and an explicit IVF kind that started out flat
+        because the first batch was too small to train on.
+        """
+        if self.index is None:
+            return
+        if resolve_kind(self.index_config, len(self.chunks)) != self.index_kind:
+            self.rebuild_index()
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune the recall/latency knobs of the current index."""
+        if nprobe is not None:
+            self.index_config.nprobe = nprobe
+        if ef_search is not None:
+            self.index_config.ef_search = ef_search
+        if self.index is not None:
+            apply_search_params(self.index, self.index_config)
+
+    def recall_report(self, k: int = 10, n_queries: int = 200) -> Dict:
+        """Recall@k and latency of the configured backend vs. exact flat search on this corpus."""
+        _, vectors = self._live_vectors()
+        if not len(vectors):
+            raise ValueError("Index not built yet.")
+        return recall_report(vectors, self.index_config, k=k, n_queries=n_queries)
+
+    @property
+    def file_ids(self) -> List[str]:
+        return list(dict.fromkeys([*self.chunks.file_counts(), *self.file_versions]))
+
+    def file_chunk_count(self, file_id: str) -> int:
+        return len(self.chunks.ids_of_file(file_id))
+
+    def memory_bytes(self) -> int:
+        """Approximate RAM held by this retriever's index and chunks (the shared model is not counted)."""
+        index_bytes = index_memory_bytes(self.index) if self.index is not None else 0
+        return index_bytes + self.chunks.nbytes() + CHUNK_OVERHEAD_BYTES * len(self.chunks)
+
+    def save(self, path: str):
+        """Persist the index, chunks and file versions to the directory ``path`` (replaced atomically).
+
+        Layout: ``meta.json`` (model, backend, chunk counts, versions), the
+        columnar chunk store in ``chunks/`` and ``index.faiss``. The lexical
+        indexes are rebuilt on load.
+        """
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=target.parent, prefix=".tmp-index-"))
+        try:
+            meta = {
+                "format": INDEX_FORMAT_VERSION,
+                "embed_model_name": self.embed_model_name,
+                "dim": self.dim,
+                "index_kind": self.index_kind,
+                "index_config": asdict(self.index_config),
+                "next_id": self._next_id,
+                "deleted": sorted(self._deleted),
+                "chunks_per_file": self.chunks.file_counts(),
+                "file_versions": self.file_versions,
+            }
+            with open(tmp / "meta.json", "w", encoding="utf-8") as fh:
+                json.dump(meta, fh)
+            self.chunks.save(str(tmp / "chunks"))
+            if self.index is not None:
+                faiss.write_index(self.index, str(tmp / "index.faiss"))
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(tmp, target)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def load(self, path: str):
+        """Replace this retriever's contents with an index written by ``save``.
+
+        Does not load the embedding model; the chunk store is memory-mapped
+        rather than read. Raises ValueError if the index was built with a
+        different model or an incompatible format.
+        """
+        root = Path(path)
+        with open(root / "meta.json", "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("format") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format {meta.get('format')!r} in {path}.")
+        if meta["embed_model_name"] != self.embed_model_name:
+            raise ValueError(f"Index in {path} was built with {meta['embed_model_name']}, "
+                             f"not {self.embed_model_name}.")
+        chunks = ChunkStore.load(str(root / "chunks"))
+        index = faiss.read_index(str(root / "index.faiss")) if (root / "index.faiss").exists() else None
+
+        self.reset()
+        self._dim = meta["dim"]
+        # Keep the saved backend, but the current search-time knobs (nprobe / efSearch).
+        self.index_config = IndexConfig(**{**meta["index_config"], "nprobe": self.index_config.nprobe,
+                                           "ef_search": self.index_config.ef_search})
+        self.index_kind = meta["index_kind"]
+        self.index = index
+        if index is not None:
+            apply_search_params(index, self.index_config)
+        self._deleted = set(meta["deleted"])
+        self._next_id = meta["next_id"]
+        self.file_versions = meta["file_versions"]
+        self.chunks = chunks
+        for cid, text in chunks.iter_texts():
+            self._register(cid, text)
+
+    def build_index_from_embeddings(self, texts: List[Dict], embs: np.ndarray):
+        """Build a FAISS index from chunks and their precomputed, normalized embeddings.
+
+        Chunks are grouped into files by their ``source["file"]`` entry.
+        """
+        if not texts:
+            raise ValueError("No texts provided for index build.")
+        if len(texts) != embs.shape[0]:
+            raise ValueError("Number of chunks and embeddings do not match.")
+
+        self.reset()
+        rows_by_file: Dict[str, List[int]] = {}
+        for i, t in enumerate(texts):
+            rows_by_file.setdefault(t.get("source", {}).get("file", ""), []).append(i)
+        for file_id, rows in rows_by_file.items():
+            self.add_chunks(file_id, [texts[i] for i in rows], embs[rows])
 
     def build_index_from_texts(self, texts: List[Dict]):
         """Build a FAISS index from text chunks."""
         if not texts:
             raise ValueError("No texts provided for index build.")
 
-        docs = [t["text"] for t in texts]
-        embs = self.embedder.encode(docs, convert_to_numpy=True, show_progress_bar=False)
-        faiss.normalize_L2(embs)
+        self.build_index_from_embeddings(texts, self.embed_chunks(texts))
 
-        index = faiss.IndexFlatIP(embs.shape[1])
-        index.add(embs)
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalized (1, dim) query embedding, cached by normalized question text."""
+        key = normalize_question(query)
+        q_emb = self.query_cache.get(key)
+        metrics.incr("query_embedding_cache_total", result="miss" if q_emb is None else "hit")
+        if q_emb is None:
+            with metrics.span("embed_query"):
+                q_emb = np.ascontiguousarray(self.embedder.encode([query], convert_to_numpy=True), dtype="float32")
+                faiss.normalize_L2(q_emb)
+            self.query_cache.put(key, q_emb)
+        return q_emb
 
-        self.index = index
+    def _scope(self, statement_types: Sequence[str] = (), files: Sequence[str] = ()) -> Optional[Tuple[Set[int], faiss.IDSelector]]:
+        """Chunk ids (and a FAISS selector over them) of the given statement types within the given files.
 
-    def retrieve(self, query: str, top_k: int = 5) -> List[Tuple[float, Dict]]:
-        """Retrieve top-k similar chunks for a given query."""
-        if self.index is None:
+        None means no filter. Cached until the index changes.
+        """
+        if not statement_types and not files:
+            return None
+        if self._scopes_version != self._version:
+            self._scopes, self._scopes_version = {}, self._version
+        key = (tuple(sorted(statement_types)), tuple(sorted(files)))
+        scope = self._scopes.get(key)
+        if scope is None:
+            ids: Optional[Set[int]] = None
+            if statement_types:
+                ids = set(self.chunks.ids_of_types(statement_types).tolist())
+            if files:
+                in_files = set().union(*(self.chunks.ids_of_file(f).tolist() for f in files))
+                ids = in_files if ids is None else ids & in_files
+            selector = faiss.IDSelectorBatch(np.fromiter(ids, dtype="int64", count=len(ids)))
+            scope = self._scopes[key] = (ids, selector)
+        return scope
+
+    def _vector_search(self, query: str, top_k: int,
+                       scope: Optional[Tuple[Set[int], faiss.IDSelector]] = None) -> List[Tuple[int, float]]:
+        q_emb = self.embed_query(query)
+
+        with metrics.span("faiss_search", kind=self.index_kind):
+            if scope is None:
+                # Oversample past tombstoned ids, which are dropped by the chunk lookup.
+                D, I = self.index.search(q_emb, top_k + len(self._deleted))
+            else:
+                # The selector holds live ids only, so tombstones can't take up result slots.
+                params = filtered_search_params(self.index, self.index_config, scope[1])
+                D, I = self.index.search(q_emb, top_k, params=params)
+        live = self.chunks.contains(I[0])
+        hits = [(int(idx), float(score)) for score, idx, ok in zip(D[0], I[0], live) if ok]
+        return hits[:top_k]
+
+    def retrieve(self, query: str, top_k: int = 5, mode: Optional[str] = None,
+                 statement_types: Optional[Sequence[str]] = None,
+                 files: Optional[Sequence[str]] = None) -> List[Tuple[float, Dict]]:
+        """Retrieve top-k similar chunks for a given query.
+
+        ``mode="vector"`` is plain cosine search. ``mode="hybrid"`` (default)
+        fuses vector, BM25 and exact-number matches with reciprocal rank
+        fusion; scores are then RRF scores rather than cosine similarities.
+
+        Search is restricted to chunks tagged with ``statement_types`` and / or
+        belonging to ``files`` when given. Without ``statement_types`` the
+        statement is detected from the query (``STATEMENT_FILTER=auto``); the
+        whole index is searched when the query names no single statement or
+        its partition is too small (fewer than ``top_k`` chunks) or too large
+        to be worth filtering.
+        """
+        if self.index is None or self.index.ntotal == 0:
             raise ValueError("Index not built yet.")
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'. Expected one of {RETRIEVAL_MODES}.")
 
-        q_emb = self.embedder.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(q_emb)
+        detected = statement_types is None
+        if detected:
+            statement_types = query_statement_types(query) if STATEMENT_FILTER == "auto" else []
+        scope = self._scope(statement_types, files or ())
+        if detected and statement_types and scope is not None:
+            # The guess is only a hint: fall back to everything (or just the requested files) when unhelpful.
+            if not top_k <= len(scope[0]) <= MAX_PARTITION_SHARE * len(self.chunks):
+                statement_types = []
+                scope = self._scope((), files or ())
 
-        D, I = self.index.search(q_emb, top_k)
-        results = []
-        for score, idx in zip(D[0], I[0]):
-            if idx < len(self.chunks):
-                results.append((float(score), self.chunks[idx]))
+        with metrics.span("retrieve", mode=mode) as labels:
+            labels["scope"] = "+".join(statement_types) or ("files" if files else "all")
+            if mode == "vector":
+                return [(score, self.chunks[cid]) for cid, score in self._vector_search(query, top_k, scope)]
 
-        return results
+            n_candidates = top_k * HYBRID_CANDIDATE_FACTOR
+            allowed = scope[0] if scope is not None else None
+            vector_ids = [cid for cid, _ in self._vector_search(query, n_candidates, scope)]
+            with metrics.span("lexical_search"):
+                lexical_ids = [cid for cid, _ in self.lexical.search(query, n_candidates, allowed=allowed)]
+                number_ids = [cid for cid, _ in self.numbers.search(query, n_candidates, allowed=allowed)]
+            fused = rrf_fuse([r for r in (vector_ids, lexical_ids, number_ids) if r])
+            return [(score, self.chunks[cid]) for cid, score in fused[:top_k] if cid in self.chunks]
@@ -0,0 +1,234 @@
+"""index_backends.py
+Selectable FAISS index backends for EmbedderRetriever.
+
+Exact flat search is the right choice for a handful of filings but scales
+linearly in memory and query time. This module builds compressed and
+approximate alternatives (float16 / int8 scalar quantization, HNSW, IVF,
+IVF-PQ), picks one automatically from the corpus size, applies the recall
+knobs (``nprobe``, ``efSearch``) and measures recall vs. latency against the
+flat baseline.
+
+All backends use inner product on L2-normalized vectors (cosine similarity)
+and carry the retriever's int64 chunk ids:
+- flat / scalar-quantized / HNSW indexes are wrapped in ``IndexIDMap2``;
+- IVF indexes store ids natively and support ``remove_ids`` directly.
+HNSW graphs cannot delete vectors, so the retriever tombstones removed ids
+and rebuilds once enough have accumulated.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+INDEX_KINDS = ("flat", "flat_fp16", "flat_sq8", "hnsw", "hnsw_sq8", "ivf_flat", "ivf_sq8", "ivf_pq")
+
+# Corpus sizes (in chunks) at which "auto" moves to the next backend.
+AUTO_THRESHOLDS = (
+    (50_000, "flat"),
+    (500_000, "hnsw"),
+    (2_000_000, "ivf_sq8"),
+)
+AUTO_LARGEST = "ivf_pq"
+
+# IVF needs roughly this many training points per list for stable centroids.
+MIN_TRAIN_POINTS_PER_LIST = 39
+
+
+@dataclass
+class IndexConfig:
+    kind: str = "auto"
+    nlist: Optional[int] = None  # IVF lists; default ~4*sqrt(n)
+    nprobe: int = 16  # IVF lists visited per query (recall vs latency)
+    hnsw_m: int = 32  # HNSW graph degree
+    ef_construction: int = 80
+    ef_search: int = 64  # HNSW candidate list size per query (recall vs latency)
+    pq_m: Optional[int] = None  # PQ sub-quantizers; default: largest of 48/32/24/16/8 dividing dim
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        return cls(
+            kind=os.getenv("INDEX_KIND", "auto"),
+            nprobe=int(os.getenv("INDEX_NPROBE", "16")),
+            ef_search=int(os.getenv("INDEX_EF_SEARCH", "64")),
+        )
+
+
+def choose_kind(n_vectors: int) -> str:
+    """Pick a backend for a corpus of ``n_vectors`` chunks."""
+    for limit, kind in AUTO_THRESHOLDS:
+        if n_vectors < limit:
+            return kind
+    return AUTO_LARGEST
+
+
+def resolve_kind(config: IndexConfig, n_vectors: int) -> str:
+    kind = choose_kind(n_vectors) if config.kind == "auto" else config.kind
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}'. Expected one of {INDEX_KINDS} or 'auto'.")
+    if kind.startswith("ivf") and n_vectors < MIN_TRAIN_POINTS_PER_LIST * _nlist(config, n_vectors):
+        # Too few vectors to train the coarse quantizer; stay exact.
+        return "flat"
+    return kind
+
+
+def _nlist(config: IndexConfig, n_vectors: int) -> int:
+    return config.nlist or max(1, int(4 * np.sqrt(max(n_vectors, 1))))
+
+
+def _pq_m(config: IndexConfig, dim: int) -> int:
+    if config.pq_m:
+        return config.pq_m
+    for m in (48, 32, 24, 16, 8):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(dim: int, kind: str, config: IndexConfig, n_vectors: int = 0) -> faiss.Index:
+    """Create an empty (possibly untrained) index of the given kind."""
+    ip = faiss.METRIC_INNER_PRODUCT
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    if kind == "flat_fp16":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, ip))
+    if kind == "flat_sq8":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, ip))
+    if kind == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, config.hnsw_m, ip)
+        inner.hnsw.efConstruction = config.ef_construction
+        return faiss.IndexIDMap2(inner)
+    if kind == "hnsw_sq8":
+        inner = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, config.hnsw_m, ip)
+        inner.hnsw.efConstruction = config.ef_construction
+        return faiss.IndexIDMap2(inner)
+
+    nlist = _nlist(config, n_vectors)
+    quantizer = faiss.IndexFlatIP(dim)
+    if kind == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, ip)
+    elif kind == "ivf_sq8":
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, ip)
+    elif kind == "ivf_pq":
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(config, dim), 8, ip)
+    else:
+        raise ValueError(f"Unknown index kind '{kind}'.")
+    # Hashtable direct map so ids can be reconstructed and removed.
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+
+def supports_remove(kind: str) -> bool:
+    return not kind.startswith("hnsw")
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Approximate resident size of ``index``: encoded vectors, ids and HNSW links (without a copy)."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    storage = faiss.downcast_index(inner.storage) if hasattr(inner, "storage") else inner
+    try:
+        code_size = storage.sa_code_size()
+    except RuntimeError:
+        code_size = index.d * 4
+    per_vector = code_size + 16  # + id and id-map entry
+    if hasattr(inner, "hnsw"):
+        per_vector += inner.hnsw.nb_neighbors(0) * 4 + 16  # level-0 links, levels and offsets
+    total = index.ntotal * per_vector
+    try:
+        ivf = faiss.extract_index_ivf(inner)
+        total += ivf.nlist * ivf.d * 4  # coarse centroids
+    except RuntimeError:
+        pass
+    return int(total)
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray):
+    """Train the index on ingest if its backend needs it (IVF / quantizers)."""
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+
+def apply_search_params(index: faiss.Index, config: IndexConfig):
+    """Set ``nprobe`` / ``efSearch`` on whatever backend ``index`` wraps."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    try:
+        faiss.extract_index_ivf(inner).nprobe = config.nprobe
+    except RuntimeError:
+        pass
+    if hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = config.ef_search
+
+
+def filtered_search_params(index: faiss.Index, config: IndexConfig, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters restricting ``index`` to the ids accepted by ``selector``, with the recall knobs kept."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if hasattr(inner, "hnsw"):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = config.ef_search
+    else:
+        try:
+            faiss.extract_index_ivf(inner)
+            params = faiss.SearchParametersIVF()
+            params.nprobe = config.nprobe
+        except RuntimeError:
+            params = faiss.SearchParameters()
+    params.sel = selector
+    return params
+
+
+def recall_report(
+    vectors: np.ndarray,
+    config: IndexConfig,
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """Compare an index built with ``config`` against exact flat search.
+
+    Queries are sampled from ``vectors`` (normalized corpus embeddings).
+    Returns recall@k and per-query latency percentiles in milliseconds for
+    both the candidate and the flat baseline.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(n_queries, n), replace=False)]
+    ids = np.arange(n, dtype="int64")
+
+    flat = build_index(dim, "flat", config)
+    flat.add_with_ids(vectors, ids)
+
+    kind = resolve_kind(config, n)
+    candidate = build_index(dim, kind, config, n)
+    build_start = time.perf_counter()
+    train_index(candidate, vectors)
+    candidate.add_with_ids(vectors, ids)
+    build_s = time.perf_counter() - build_start
+    apply_search_params(candidate, config)
+
+    def timed_search(index):
+        lat, hits = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            _, I = index.search(q[None, :], k)
+            lat.append((time.perf_counter() - t0) * 1000)
+            hits.append(I[0])
+        return np.array(lat), np.array(hits)
+
+    flat_lat, truth = timed_search(flat)
+    cand_lat, found = timed_search(candidate)
+    recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+
+    return {
+        "kind": kind,
+        "n_vectors": n,
+        "k": k,
+        "recall_at_k": float(recall),
+        "p50_ms": float(np.percentile(cand_lat, 50)),
+        "p95_ms": float(np.percentile(cand_lat, 95)),
+        "flat_p50_ms": float(np.percentile(flat_lat, 50)),
+        "flat_p95_ms": float(np.percentile(flat_lat, 95)),
+        "build_s": build_s,
+    }
@@ -0,0 +1,245 @@
+"""index_registry.py
+Per-session / per-workspace indexes under a RAM budget.
+
+Each key (a Streamlit session, or a named workspace shared by several
+analysts) gets its own ``EmbedderRetriever`` and parsed corpus, so one
+user's "Process Documents" no longer overwrites another's index. All
+retrievers share the single loaded embedding model.
+
+Workspaces are kept in LRU order. When their estimated footprint exceeds the
+budget (``INDEX_MEMORY_BUDGET_MB``), the least recently used ones that are
+not checked out are written to ``INDEX_SPILL_DIR`` (only if they changed
+since they were last written) and dropped from memory; the next checkout
+reloads them from disk. Workspaces not checked out for
+``INDEX_IDLE_TTL_MINUTES`` (abandoned browser sessions, mostly) are released
+the same way, so the registry only holds recently active keys.
+
+A new key starts from the pre-built ``INDEX_DIR`` workspace when one is
+configured, else empty. The seed is loaded once and shared read-only by every
+key that has not written to its index; the first ``checkout(key, write=True)``
+gives that key a private copy. Spilled workspaces untouched for
+``INDEX_SPILL_TTL_HOURS`` are deleted when the registry starts.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from . import metrics
+from .embeddings_retrieval import EmbedderRetriever
+from .kpis import KPIStore
+from .table_store import TableStore
+from .workspace import load_kpis, load_workspace, save_workspace, workspace_exists
+
+
+@dataclass
+class Workspace:
+    key: str
+    retriever: EmbedderRetriever
+    tables: List[pd.DataFrame] = field(default_factory=list)
+    sources: List[Dict] = field(default_factory=list)
+    table_store: TableStore = field(default_factory=TableStore)
+    kpi_store: KPIStore = field(default_factory=KPIStore)  # updated by ingest_files(kpi_store=...)
+    # Held while the index is mutated; shared workspaces may be used from several sessions at once.
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    pins: int = 0
+    shared: bool = False  # the read-only seed, referenced by every key that has not written yet
+    last_used: float = field(default_factory=time.monotonic)
+    corpus_version: int = 0
+    saved_state: Optional[Tuple[str, int]] = None  # (index version, corpus version) last written to disk
+    _size: Optional[Tuple[Tuple[str, int], int]] = None
+
+    @property
+    def state(self) -> Tuple[str, int]:
+        return self.retriever.index_version, self.corpus_version
+
+    @property
+    def dirty(self) -> bool:
+        return self.state != self.saved_state
+
+    def set_corpus(self, tables: List[pd.DataFrame], sources: List[Dict]):
+        self.tables, self.sources = tables, sources
+        self.table_store = TableStore.from_tables(tables)
+        self.corpus_version += 1
+
+    def memory_bytes(self) -> int:
+        """Estimated RAM of the index, chunks, text and tables (cached until the workspace changes)."""
+        if self._size is None or self._size[0] != self.state:
+            tables = sum(int(t.memory_usage(deep=True).sum()) for t in self.tables)
+            self._size = (self.state, self.retriever.memory_bytes() + tables)
+        return self._size[1]
+
+
+class IndexRegistry:
+    def __init__(
+        self,
+        spill_dir: Optional[str] = None,
+        memory_budget_mb: Optional[float] = None,
+        embed_model_name: Optional[str] = None,
+        seed_dir: Optional[str] = None,
+        spill_ttl_hours: Optional[float] = None,
+        idle_ttl_minutes: Optional[float] = None,
+    ):
+        self.spill_dir = Path(spill_dir or os.getenv("INDEX_SPILL_DIR", ".index_spill"))
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.getenv("INDEX_MEMORY_BUDGET_MB", "1024"))
+        self.memory_budget = int(memory_budget_mb * 2**20)
+        self.embed_model_name = embed_model_name
+        self.seed_dir = seed_dir if seed_dir is not None else os.getenv("INDEX_DIR")
+        if spill_ttl_hours is None:
+            spill_ttl_hours = float(os.getenv("INDEX_SPILL_TTL_HOURS", "168"))
+        self.spill_ttl = spill_ttl_hours * 3600
+        if idle_ttl_minutes is None:
+            idle_ttl_minutes = float(os.getenv("INDEX_IDLE_TTL_MINUTES", "60"))
+        self.idle_ttl = idle_ttl_minutes * 60
+        self._entries: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._seed: Optional[Workspace] = None
+        self._seed_loaded = False
+        self.seed_copies = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.reloads = 0
+        self.purge_spilled()
+
+    def _spill_path(self, key: str) -> Path:
+        return self.spill_dir / hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def new_retriever(self) -> EmbedderRetriever:
+        return EmbedderRetriever(embed_model_name=self.embed_model_name)
+
+    def warm_up(self):
+        """Load the shared embedding model."""
+        self.new_retriever().warm_up()
+
+    def _load(self, key: str, path: str, source: str) -> Optional[Workspace]:
+        ws = Workspace(key, self.new_retriever())
+        try:
+            with metrics.span("workspace_load", source=source):
+                ws.set_corpus(*load_workspace(path, ws.retriever))
+                ws.kpi_store = load_kpis(path, ws.tables)
+        except Exception as e:
+            st.warning(f"Could not load workspace from {path}: {e}")
+            return None
+        # Unchanged since loaded: eviction needn't spill it, the next checkout reloads (or reseeds) it.
+        ws.saved_state = ws.state
+        return ws
+
+    def _shared_seed(self) -> Optional[Workspace]:
+        """The ``INDEX_DIR`` workspace, loaded on first use and shared by keys that have not written."""
+        if not self._seed_loaded:
+            self._seed_loaded = True
+            if workspace_exists(self.seed_dir):
+                self._seed = self._load("seed", self.seed_dir, "seed")
+                if self._seed is not None:
+                    self._seed.shared = True
+        return self._seed
+
+    def _open(self, key: str, write: bool = False) -> Workspace:
+        spilled = self._spill_path(key)
+        if workspace_exists(str(spilled)):
+            ws = self._load(key, str(spilled), "spill")
+            if ws is not None:
+                self.reloads += 1
+                os.utime(spilled)  # keep it clear of the TTL purge while in use
+                return ws
+        seed = self._shared_seed()
+        if seed is None:
+            return Workspace(key, self.new_retriever())
+        if not write:
+            return seed
+        # First write: this key gets its own copy; the shared seed stays untouched for everyone else.
+        ws = self._load(key, self.seed_dir, "seed_copy")
+        if ws is None:
+            return Workspace(key, self.new_retriever())
+        self.seed_copies += 1
+        return ws
+
+    @contextmanager
+    def checkout(self, key: str, write: bool = False) -> Iterator[Workspace]:
+        """Use the workspace for ``key`` (loading it if needed); it cannot be evicted while checked out.
+
+        Pass ``write=True`` before mutating the index or corpus: a key still on
+        the shared seed is switched to a private copy first.
+        """
+        with self._lock:
+            ws = self._entries.get(key)
+            if ws is None or (write and ws.shared):
+                ws = self._entries[key] = self._open(key, write=write)
+            self._entries.move_to_end(key)
+            ws.pins += 1
+            ws.last_used = time.monotonic()
+        try:
+            yield ws
+        finally:
+            with self._lock:
+                ws.pins -= 1
+                ws.last_used = time.monotonic()
+                self._enforce_budget()
+
+    def _evict(self, key: str):
+        ws = self._entries.pop(key)
+        if ws.dirty and not ws.shared:
+            with metrics.span("workspace_spill"):
+                save_workspace(str(self._spill_path(key)), ws.retriever, ws.tables, ws.sources,
+                               kpis=ws.kpi_store)
+        self.evictions += 1
+        metrics.incr("workspace_evictions_total")
+
+    def _enforce_budget(self):
+        now = time.monotonic()
+        for key, ws in list(self._entries.items()):
+            if ws.pins == 0 and now - ws.last_used > self.idle_ttl:
+                self._evict(key)
+        # Keys on the shared seed free nothing when evicted; the seed itself is counted once.
+        sizes = {key: ws.memory_bytes() for key, ws in self._entries.items() if not ws.shared}
+        total = sum(sizes.values()) + (self._seed.memory_bytes() if self._seed is not None else 0)
+        for key, size in sizes.items():
+            if total <= self.memory_budget:
+                break
+            if self._entries[key].pins == 0:
+                self._evict(key)
+                total -= size
+
+    def drop(self, key: str):
+        """Forget a workspace entirely, in memory and on disk."""
+        with self._lock:
+            self._entries.pop(key, None)
+            shutil.rmtree(self._spill_path(key), ignore_errors=True)
+
+    def purge_spilled(self):
+        """Delete spilled workspaces older than the TTL."""
+        if not self.spill_dir.exists():
+            return
+        cutoff = time.time() - self.spill_ttl
+        in_memory = {self._spill_path(key) for key in self._entries}
+        for path in self.spill_dir.iterdir():
+            if path.is_dir() and path not in in_memory and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            used = sum(ws.memory_bytes() for ws in self._entries.values() if not ws.shared)
+            if self._seed is not None:
+                used += self._seed.memory_bytes()
+            in_memory = len(self._entries)
+            on_seed = sum(ws.shared for ws in self._entries.values())
+        spilled = sum(1 for p in self.spill_dir.iterdir() if p.is_dir()) if self.spill_dir.exists() else 0
+        return {
+            "in_memory": in_memory,
+            "memory_mb": used / 2**20,
+            "budget_mb": self.memory_budget / 2**20,
+            "on_seed": on_seed,
+            "seed_copies": self.seed_copies,
+            "spilled": spilled,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,177 @@
+"""ingestion.py
+Parse -> chunk -> embed -> index pipeline for uploaded files, backed by the
+on-disk document cache so unchanged files are never re-parsed or re-encoded.
+
+The pipeline is generator-based: the parser yields one page (or sheet) at a
+time, ``stream_chunks`` cleans and chunks each page as it arrives, and the
+embedder consumes fixed-size batches, so parsing and encoding never hold more
+than a page plus an embedding batch. Page text is dropped once chunked; a
+file's chunks and embeddings are kept until the file is indexed (and cached)
+as a whole. Every chunk carries the file/page/sheet it came from. Catalog KPIs are extracted from
+each page in the same pass and cached with the document.
+"""
+import hashlib
+import io
+from contextlib import nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .doc_cache import CachedDocument, DocumentCache
+from .document_parser import DocumentParser
+from .embeddings_retrieval import EmbedderRetriever
+from .kpis import KPIStore, extract_kpis
+from .processing_utils import stream_chunks
+
+
+class NamedUpload(io.BytesIO):
+    """In-memory file with a ``name``, the shape ``ingest_files`` expects from uploads."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def process_pages(
+    pages: Iterator[Dict],
+    retriever: EmbedderRetriever,
+    max_chunk_size: int = 800,
+    embed: bool = True,
+) -> CachedDocument:
+    """Stream page records through chunking, KPI extraction and batched embedding into a CachedDocument."""
+    tables, sources, kpis = [], [], []
+
+    def chunk_pages(records: Iterator[Dict]) -> Iterator[Dict]:
+        for page in records:
+            tables.extend(page["tables"])
+            sources.append(page["source"])
+            with metrics.span("kpi_extract"):
+                kpis.extend(extract_kpis(page))
+            with metrics.span("chunk_page"):
+                page_chunks = list(stream_chunks([page], max_chunk_size=max_chunk_size))
+            metrics.incr("chunks_created_total", len(page_chunks))
+            yield from page_chunks
+
+    chunk_iter = chunk_pages(pages)
+    chunks, embs = [], []
+    if embed:
+        for batch, batch_embs in retriever.embed_stream(chunk_iter):
+            chunks.extend(batch)
+            embs.append(batch_embs)
+    else:
+        chunks = list(chunk_iter)
+
+    return CachedDocument(
+        tables=tables,
+        sources=sources,
+        chunks=chunks,
+        embeddings=np.vstack(embs) if embs else retriever.embed_chunks([]),
+        kpis=kpis,
+    )
+
+
+def load_or_process_files(
+    files: List[Tuple[bytes, str]],
+    parser: DocumentParser,
+    retriever: EmbedderRetriever,
+    cache: Optional[DocumentCache] = None,
+    max_chunk_size: int = 800,
+    skip_embedding: Optional[Set[int]] = None,
+) -> List[CachedDocument]:
+    """Return parsed text, tables, chunks and embeddings per ``(file_bytes, filename)``, using the cache if possible.
+
+    Cache misses are streamed page by page; their PDF pages are submitted to
+    the parser's worker pool up front (``DocumentParser.iter_many``) so files
+    are extracted concurrently. Files whose position is
+    in ``skip_embedding`` are parsed and chunked but not encoded (their
+    embeddings are left empty and they are not written to the cache).
+    """
+    skip_embedding = skip_embedding or set()
+    docs: List[Optional[CachedDocument]] = [None] * len(files)
+    keys: List[Optional[str]] = [None] * len(files)
+    misses = []
+    for i, (file_bytes, filename) in enumerate(files):
+        if cache is not None:
+            keys[i] = cache.make_key(file_bytes, filename, retriever.embedding_key, max_chunk_size)
+            docs[i] = cache.load(keys[i])
+        if docs[i] is None:
+            misses.append(i)
+
+    page_iters = parser.iter_many([files[i] for i in misses])
+    try:
+        for i, pages in zip(misses, page_iters):
+            skip = i in skip_embedding
+            doc = process_pages(pages, retriever, max_chunk_size=max_chunk_size, embed=not skip)
+            if cache is not None and not skip:
+                doc.versions = cache.versions(retriever.embedding_key, max_chunk_size)
+                cache.save(keys[i], doc)
+            docs[i] = doc
+    finally:
+        # Files after a failure were submitted but never read; release their workers and temp files.
+        for pages in page_iters:
+            pages.close()
+    return docs
+
+
+def file_fingerprint(file_bytes: bytes, max_chunk_size: int = 800) -> str:
+    """Identify the indexed version of a file's content."""
+    return f"{hashlib.sha256(file_bytes).hexdigest()}:{max_chunk_size}"
+
+
+def ingest_files(
+    uploaded_files: List,
+    parser: DocumentParser,
+    retriever: EmbedderRetriever,
+    cache: Optional[DocumentCache] = None,
+    max_chunk_size: int = 800,
+    remove_missing: bool = True,
+    index_lock: Optional[ContextManager] = None,
+    kpi_store: Optional[KPIStore] = None,
+) -> Tuple[List[pd.DataFrame], List[Dict]]:
+    """Process uploaded files and update the retriever's index incrementally.
+
+    Files are identified by name. New files are added, files whose content
+    changed are replaced, unchanged files keep their indexed chunks (nothing
+    is re-embedded) and, with ``remove_missing``, indexed files that are no
+    longer uploaded are removed. Returns the ``(tables, sources)`` of every
+    uploaded file, with one source per page / sheet record.
+
+    ``index_lock`` (e.g. a ``threading.Lock`` shared with readers) is held
+    only while the index is mutated, not while files are parsed and embedded.
+    ``kpi_store``, when given, is updated with the same files.
+    """
+    index_lock = index_lock or nullcontext()
+    files = [(f.read(), f.name) for f in uploaded_files]
+    fingerprints = [file_fingerprint(b, max_chunk_size) for b, _ in files]
+    unchanged = {i for i, ((_, name), fp) in enumerate(zip(files, fingerprints))
+                 if retriever.file_versions.get(name) == fp}
+
+    if remove_missing:
+        uploaded_names = {name for _, name in files}
+        with index_lock:
+            for file_id in retriever.file_ids:
+                if file_id not in uploaded_names:
+                    retriever.remove_file(file_id)
+            for file_id in (kpi_store.files if kpi_store is not None else ()):
+                if file_id not in uploaded_names:
+                    kpi_store.remove_file(file_id)
+
+    all_tables, all_sources = [], []
+    docs = load_or_process_files(files, parser, retriever, cache=cache, max_chunk_size=max_chunk_size,
+                                 skip_embedding=unchanged)
+    with index_lock:
+        for i, ((_, name), doc) in enumerate(zip(files, docs)):
+            all_tables.extend(doc.tables)
+            all_sources.extend(doc.sources)
+            if i not in unchanged:
+                retriever.replace_file(name, doc.chunks, embs=doc.embeddings, version=fingerprints[i])
+            if kpi_store is not None:
+                kpi_store.set_file(name, doc.kpis)
+        retriever.optimize_index()
+
+        if retriever.index is None or retriever.index.ntotal == 0:
+            raise ValueError("No text could be extracted from the uploaded files.")
+
+    return all_tables, all_sources
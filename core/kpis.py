@@ -0,0 +1,310 @@
+"""kpis.py
+Ingest-time extraction of a fixed catalog of financial KPIs, and a store that
+answers the everyday "what was net income in FY23?" questions from them.
+
+While a document streams through ingestion, every page (or sheet) record is
+scanned once (``extract_kpis``):
+- table rows whose line-item label is a catalog KPI ("Total revenue",
+  "Net cash from operating activities" ...), with periods taken from the
+  column headers;
+- statement lines in the page text ("Profit for the year  4,512.7  3,980.1")
+  whose values are lined up with the nearest year header above them.
+Each value keeps its provenance (file, page or sheet, label, column). Values
+are stored as reported, in the document's own units.
+
+``KPIStore`` keeps the records per file, picks one value per (KPI, file,
+period) - table cells over text lines, pages tagged with the KPI's statement
+first - and derives margins and year-on-year growth from them. Questions that
+name a catalog KPI and ask for a figure (not an explanation) are answered
+from the store without retrieval or the LLM.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .table_store import (
+    TableStore, needs_llm, normalize_label, parse_financial_values, periods_in_text, to_markdown,
+)
+
+
+@dataclass(frozen=True)
+class KPI:
+    label: str
+    statement: str  # statement type the KPI is reported in (see statements.py)
+    labels: str  # full-match regex over normalized line-item labels; "" for derived KPIs
+    query: str  # regex over lowercased questions
+    kind: str = "amount"  # "amount", or "percent" for derived ratios / growth rates
+
+
+KPI_CATALOG: Dict[str, KPI] = {
+    "revenue": KPI(
+        "Revenue", "income_statement",
+        r"(?:total |net )?(?:revenues?|sales|turnover)(?: from operations)?(?: net)?"
+        r"|total (?:operating )?income from operations|total net sales",
+        # Not "cost of sales", "sales and marketing", "sales tax" ...
+        r"(?<!cost of )(?<!costs of )(?<!marketing and )(?<!marketing & )\b(?:revenues?|sales|turnover)\b"
+        r"(?! (?:and|&) marketing\b| (?:tax|taxes|expenses?|costs?|returns?|commissions?|force|team)\b)"),
+    "gross_profit": KPI(
+        "Gross profit", "income_statement", r"gross profit", r"\bgross profit\b"),
+    "operating_income": KPI(
+        "Operating income", "income_statement",
+        r"(?:total )?operating (?:income|profit)|(?:income|profit) from operations|ebit",
+        r"\b(?:operating (?:income|profit)|ebit)\b"),
+    "net_income": KPI(
+        "Net income", "income_statement",
+        r"net (?:income|profit|earnings)(?: for the (?:year|period))?"
+        r"|(?:net )?profit (?:for the (?:year|period)|after tax(?:ation)?)|pat",
+        r"\b(?:net (?:income|profit|earnings)|profit after tax|pat|bottom line)\b"),
+    "total_assets": KPI(
+        "Total assets", "balance_sheet", r"total assets", r"\btotal assets\b"),
+    "total_liabilities": KPI(
+        "Total liabilities", "balance_sheet", r"total liabilities", r"\btotal liabilities\b"),
+    "total_equity": KPI(
+        "Total equity", "balance_sheet",
+        r"total (?:share ?holders |stock ?holders )?equity",
+        # Only the balance-sheet total: not bare "equity", "return on equity" or "debt to equity".
+        r"(?<!return on )(?<!to )\b(?:total (?:(?:share|stock) ?holders'? )?equity|(?:share|stock) ?holders'? equity"
+        r"|net worth)\b(?! ratio\b)"),
+    "operating_cash_flow": KPI(
+        "Operating cash flow", "cash_flow",
+        r"net cash (?:flows? )?(?:(?:generated|provided|used) )?(?:(?:from|by|in) )*(?:used in )?operating activities"
+        r"|cash (?:flows? )?(?:generated )?from operating activities|operating cash flows?",
+        r"\boperating cash flows?\b|\bcash (?:flows? )?(?:\w+ )*(?:from|by|in) operating activities\b|\bcfo\b"),
+    # Derived from the KPIs above (percentages).
+    "gross_margin": KPI("Gross margin", "income_statement", "", r"\bgross (?:profit )?margin\b", "percent"),
+    "operating_margin": KPI("Operating margin", "income_statement", "", r"\b(?:operating|ebit) margin\b", "percent"),
+    "net_margin": KPI("Net margin", "income_statement", "", r"\b(?:net (?:profit |income )?|profit )margin\b",
+                      "percent"),
+    "revenue_growth": KPI("Revenue growth", "income_statement", "",
+                          r"\b(?:revenues?|sales|turnover|top ?line) growth\b|\bgrowth (?:in|of) (?:revenues?|sales|turnover)\b"
+                          r"|\b(?:revenues?|sales) (?:grow|grew)\b",
+                          "percent"),
+    "net_income_growth": KPI("Net income growth", "income_statement", "",
+                             r"\b(?:net income|net profit|profit|earnings) growth\b"
+                             r"|\bgrowth (?:in|of) (?:net income|net profit|profit|earnings)\b",
+                             "percent"),
+}
+
+# numerator, denominator for ratios; base KPI for growth
+RATIOS = {"gross_margin": ("gross_profit", "revenue"), "operating_margin": ("operating_income", "revenue"),
+          "net_margin": ("net_income", "revenue")}
+GROWTH = {"revenue_growth": "revenue", "net_income_growth": "net_income"}
+
+# Derived and more specific KPIs are tried first, so "net margin" doesn't answer as "net income".
+QUERY_ORDER = [*RATIOS, *GROWTH, "operating_cash_flow", "gross_profit", "operating_income", "net_income",
+               "total_assets", "total_liabilities", "total_equity", "revenue"]
+
+_LABEL_RES = {name: re.compile(kpi.labels) for name, kpi in KPI_CATALOG.items() if kpi.labels}
+_QUERY_RES = {name: re.compile(kpi.query) for name, kpi in KPI_CATALOG.items()}
+
+# "<label> [note] <value> <value> ..." on one line of statement text.
+_LINE_RE = re.compile(r"^\s*(?P<label>[A-Za-z][A-Za-z &'/,.()-]*?)[\s.:]+"
+                      r"(?P<values>(?:\(?-?(?:₹|rs\.?|\$)?\s?\d[\d,]*(?:\.\d+)?\)?\s*){1,6})$", re.IGNORECASE)
+_VALUE_RE = re.compile(r"\(?-?(?:₹|rs\.?|\$)?\s?\d[\d,]*(?:\.\d+)?\)?", re.IGNORECASE)
+_PRIORITY = {"table": 0, "text": 1}
+
+
+def kpi_for_label(label: str) -> Optional[str]:
+    """Catalog KPI a normalized line-item label reports, or None."""
+    label = re.sub(r"\b(?:note|notes) \d+\b|\([a-z0-9]\)", " ", label)
+    label = re.sub(r"\s+", " ", label).strip()
+    for name, pattern in _LABEL_RES.items():
+        if pattern.fullmatch(label):
+            return name
+    return None
+
+
+def _table_kpis(table: pd.DataFrame, source: Dict) -> List[Dict]:
+    frame = TableStore.from_tables([table]).frame
+    frame = frame[frame["period"].notna() & ~frame["is_percent"]]
+    records = []
+    for label_norm in frame["label_norm"].unique():
+        name = kpi_for_label(label_norm)
+        if name is None:
+            continue
+        for row in frame[frame["label_norm"] == label_norm].itertuples(index=False):
+            records.append({"kpi": name, "period": int(row.period), "value": float(row.value),
+                            "label": row.row_label, "column": str(row.column), "method": "table",
+                            "source": dict(source)})
+    return records
+
+
+def _text_kpis(text: str, source: Dict) -> List[Dict]:
+    records, header = [], []
+    for line in text.splitlines():
+        m = _LINE_RE.match(line)
+        if m is None:
+            periods = periods_in_text(line)
+            if periods and len(_VALUE_RE.findall(line)) <= len(periods) * 2:  # a year header, not a data row
+                header = periods
+            continue
+        name = kpi_for_label(normalize_label(pd.Series([m.group("label")])).iloc[0])
+        if name is None or not header:
+            continue
+        raw = _VALUE_RE.findall(m.group("values"))
+        if len(raw) < len(header):
+            continue
+        # Extra leading values are note references.
+        values = parse_financial_values(pd.Series(raw[len(raw) - len(header):]))["value"].to_numpy()
+        for period, value in zip(header, values):
+            if not np.isnan(value):
+                records.append({"kpi": name, "period": period, "value": float(value),
+                                "label": m.group("label").strip(), "column": str(period), "method": "text",
+                                "source": dict(source)})
+    return records
+
+
+def extract_kpis(record: Dict) -> List[Dict]:
+    """Catalog KPI values found on one page / sheet record (``{"text", "tables", "source"}``)."""
+    source = {k: v for k, v in record.get("source", {}).items() if k in ("file", "page", "sheet", "rows", "types")}
+    records = _text_kpis(record.get("text") or "", source)
+    for table in record.get("tables") or ():
+        if table is not None and not table.empty and table.shape[1] >= 2:
+            records.extend(_table_kpis(table, {**source, **table.attrs.get("source", {})}))
+    return records
+
+
+def _provenance(record: Dict) -> str:
+    source = record.get("source", {})
+    where = source.get("file", "")
+    if source.get("sheet") is not None:
+        where += f" / {source['sheet']}" + (f" rows {source['rows']}" if source.get("rows") else "")
+    elif source.get("page") is not None:
+        where += f" p.{source['page']}"
+    if record["method"] == "derived":
+        return record["label"]
+    return f"{where}: {record['label']} [{record['column']}]"
+
+
+class KPIStore:
+    """KPI records per file, plus the selected and derived values as one frame."""
+
+    COLUMNS = ["kpi", "label", "file", "period", "value", "kind", "provenance"]
+
+    def __init__(self, records_by_file: Optional[Dict[str, List[Dict]]] = None):
+        self._by_file: Dict[str, List[Dict]] = dict(records_by_file or {})
+        self._frame: Optional[pd.DataFrame] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_tables(cls, tables: Iterable[pd.DataFrame]) -> "KPIStore":
+        """Table-only extraction, for corpora saved before KPIs were precomputed."""
+        by_file: Dict[str, List[Dict]] = {}
+        for table in tables:
+            source = table.attrs.get("source", {})
+            by_file.setdefault(source.get("file", ""), []).extend(extract_kpis({"tables": [table], "source": source}))
+        return cls(by_file)
+
+    def set_file(self, file_id: str, records: List[Dict]):
+        with self._lock:
+            self._by_file[file_id] = list(records)
+            self._frame = None
+
+    def remove_file(self, file_id: str):
+        with self._lock:
+            if self._by_file.pop(file_id, None) is not None:
+                self._frame = None
+
+    @property
+    def files(self) -> List[str]:
+        with self._lock:
+            return list(self._by_file)
+
+    def to_dict(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            return {file_id: list(records) for file_id, records in self._by_file.items()}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """One row per (KPI, file, period): the best reported value, then derived ratios and growth."""
+        with self._lock:
+            if self._frame is None:
+                self._frame = self._build()
+            return self._frame
+
+    def _build(self) -> pd.DataFrame:
+        best: Dict[Tuple[str, str, int], Tuple[Tuple, Dict]] = {}
+        for file_id, records in self._by_file.items():
+            for order, r in enumerate(records):
+                in_statement = KPI_CATALOG[r["kpi"]].statement in r.get("source", {}).get("types", ())
+                rank = (_PRIORITY[r["method"]], not in_statement, order)
+                key = (r["kpi"], file_id, r["period"])
+                if key not in best or rank < best[key][0]:
+                    best[key] = (rank, r)
+        values = {key: r["value"] for key, (_, r) in best.items()}
+        rows = [(kpi, KPI_CATALOG[kpi].label, file_id, period, r["value"], "amount", _provenance(r))
+                for (kpi, file_id, period), (_, r) in best.items()]
+
+        for (kpi, file_id, period), value in values.items():
+            for name, (num, den) in RATIOS.items():
+                if kpi == num and values.get((den, file_id, period)):
+                    ratio = value / values[(den, file_id, period)] * 100
+                    rows.append((name, KPI_CATALOG[name].label, file_id, period, ratio, "percent",
+                                 f"{KPI_CATALOG[num].label} / {KPI_CATALOG[den].label}, {period}"))
+            for name, base in GROWTH.items():
+                previous = values.get((base, file_id, period - 1))
+                if kpi == base and previous:
+                    growth = (value - previous) / abs(previous) * 100
+                    rows.append((name, KPI_CATALOG[name].label, file_id, period, growth, "percent",
+                                 f"{KPI_CATALOG[base].label} {period} vs {period - 1}"))
+        frame = pd.DataFrame(rows, columns=self.COLUMNS)
+        return frame.sort_values(["kpi", "file", "period"], ascending=[True, True, False], ignore_index=True)
+
+    @staticmethod
+    def match(question: str) -> Optional[str]:
+        """The catalog KPI a question asks for, or None."""
+        q = question.lower()
+        for name in QUERY_ORDER:
+            if _QUERY_RES[name].search(q):
+                return name
+        return None
+
+    def lookup(self, kpi: str, periods: Sequence[int] = (), files: Sequence[str] = ()) -> pd.DataFrame:
+        frame = self.frame
+        mask = frame["kpi"] == kpi
+        if periods:
+            mask &= frame["period"].isin(periods)
+        if files:
+            mask &= frame["file"].isin(files)
+        return frame[mask]
+
+    def answer(self, question: str, files: Sequence[str] = ()) -> Optional[str]:
+        """Answer a question about a catalog KPI from the precomputed values, or None if it isn't one."""
+        # Ingest jobs may add files concurrently; work from a snapshot of the names.
+        file_ids = self.files
+        if not file_ids or needs_llm(question):
+            return None
+        kpi = self.match(question)
+        if kpi is None:
+            return None
+        # A question naming one of the files (by name or stem) is answered for that file only.
+        q = question.lower()
+        named = [f for f in file_ids if f and (f.lower() in q or f.rsplit(".", 1)[0].lower() in q)]
+        rows = self.lookup(kpi, periods=periods_in_text(question), files=files or named)
+        if rows.empty:
+            return None
+        shown = rows.head(20).copy()
+        percent = shown["kind"] == "percent"
+        shown["value"] = np.where(percent, shown["value"].map("{:,.2f}%".format),
+                                  shown["value"].map("{:,.2f}".format))
+        shown = shown.rename(columns={"provenance": "source"})[["file", "period", "value", "source"]]
+        note = "" if KPI_CATALOG[kpi].kind == "percent" else ", as reported"
+        return f"**{KPI_CATALOG[kpi].label}** (precomputed from the documents{note}):\n\n" + to_markdown(shown, index=False)
+
+    def summary(self) -> pd.DataFrame:
+        """KPI x period table per file for display."""
+        frame = self.frame
+        if frame.empty:
+            return pd.DataFrame()
+        values = np.where(frame["kind"] == "percent", frame["value"].map("{:,.2f}%".format),
+                          frame["value"].map("{:,.2f}".format))
+        table = frame.assign(value=values).pivot_table(index=["file", "label"], columns="period", values="value",
+                                                       aggfunc="first", sort=False)
+        return table.reindex(columns=sorted(table.columns, reverse=True)).fillna("")
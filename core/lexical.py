@@ -0,0 +1,158 @@
+"""lexical.py
+In-memory lexical indexes that complement FAISS vector search:
+- BM25Index: inverted index with Okapi BM25 scoring over chunk text, so exact
+  tokens such as "FY2023" or "EBITDA" are matched literally;
+- NumberIndex: exact-value index over the numbers found by ``extract_numbers``,
+  so a query quoting "4,512.7" or "(1,200)" finds the chunk containing it;
+- rrf_fuse: reciprocal rank fusion of several ranked id lists.
+
+Numbers are normalized the same way ``clean_text`` treats chunk text
+(thousands separators and currency symbols dropped), and accounting-style
+parentheses are read as negatives.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .processing_utils import extract_numbers
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were what which with"
+    " how much many did does do".split()
+)
+
+
+def normalize_number(raw: str) -> str:
+    """Canonical form of a numeric token: no separators, '(x)' -> '-x', no trailing zeros after a decimal point."""
+    s = raw.strip().replace(",", "").replace("₹", "").replace("$", "")
+    negative = s.startswith("(") and s.endswith(")")
+    s = s.strip("()")
+    if s.startswith("-"):
+        negative, s = True, s[1:]
+    if not s or not any(ch.isdigit() for ch in s):
+        return ""
+    int_part, _, frac = s.partition(".")
+    s = (int_part.lstrip("0") or "0") + ("." + frac.rstrip("0") if frac.rstrip("0") else "")
+    return f"-{s}" if negative and s != "0" else s
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        if tok[0].isdigit():
+            tok = normalize_number(tok) or tok
+        tokens.append(tok)
+    return tokens
+
+
+def number_values(text: str) -> Set[str]:
+    values = set()
+    for raw in extract_numbers(text):
+        v = normalize_number(raw)
+        # Drop bare small integers (page numbers, list bullets) that match everywhere.
+        if v and (len(v.lstrip("-")) > 2 or "." in v):
+            values.add(v)
+    return values
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_terms: Dict[int, List[str]] = {}  # doc_id -> distinct terms, for removal
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: int, text: str):
+        tokens = tokenize(text)
+        tf = Counter(tokens)
+        for term, count in tf.items():
+            self.postings[term][doc_id] = count
+        self.doc_terms[doc_id] = list(tf)
+        self.doc_len[doc_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def remove(self, doc_id: int):
+        for term in self.doc_terms.pop(doc_id, []):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_len.clear()
+        self.total_len = 0
+
+    def search(self, query: str, top_k: int = 10, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """BM25-ranked doc ids, optionally only those in ``allowed`` (statistics stay corpus-wide)."""
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+        avg_len = self.total_len / n_docs
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+
+class NumberIndex:
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = defaultdict(set)  # normalized value -> doc ids
+        self.doc_values: Dict[int, Set[str]] = {}
+
+    def add(self, doc_id: int, text: str):
+        values = number_values(text)
+        for v in values:
+            self.postings[v].add(doc_id)
+        self.doc_values[doc_id] = values
+
+    def remove(self, doc_id: int):
+        for v in self.doc_values.pop(doc_id, set()):
+            ids = self.postings.get(v)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[v]
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_values.clear()
+
+    def search(self, query: str, top_k: int = 10, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Rank chunks by how many of the query's numbers they contain exactly."""
+        hits: Counter = Counter()
+        for v in number_values(query):
+            for doc_id in self.postings.get(v, ()):
+                if allowed is None or doc_id in allowed:
+                    hits[doc_id] += 1
+        return [(doc_id, float(n)) for doc_id, n in hits.most_common(top_k)]
+
+
+def rrf_fuse(rankings: Sequence[Iterable[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank of d)."""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,205 @@
+"""metrics.py
+Lightweight timing spans and counters for the ingest and question pipelines.
+
+Instrumented code calls the module-level helpers (``span``, ``observe``,
+``incr``), which forward to the process-wide sink returned by
+``get_metrics()``. The default sink, ``InMemoryMetrics``, keeps cumulative
+counts/sums plus a window of recent observations per series for percentiles,
+and exports them as JSON or Prometheus text. Swap in another sink with
+``set_metrics`` (e.g. to push to StatsD), or disable collection with
+``METRICS_ENABLED=0``.
+
+``trace()`` additionally collects every span recorded on the current thread
+while it is open, which is how the UI shows where one question spent its time.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+LabelKey = Tuple[Tuple[str, str], ...]
+PERCENTILES = (50, 90, 95, 99)
+
+_local = threading.local()
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Metrics(ABC):
+    """Sink interface. ``observe`` records a sample (seconds, tokens, ...); ``incr`` bumps a counter."""
+
+    @abstractmethod
+    def observe(self, name: str, value: float, **labels):
+        ...
+
+    @abstractmethod
+    def incr(self, name: str, value: float = 1.0, **labels):
+        ...
+
+    def snapshot(self) -> Dict:
+        return {"counters": {}, "summaries": {}}
+
+
+class NullMetrics(Metrics):
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    def incr(self, name: str, value: float = 1.0, **labels):
+        pass
+
+
+class InMemoryMetrics(Metrics):
+    """Thread-safe counters and windowed summaries kept in process memory."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        # (name, labels) -> [count, sum, recent values]
+        self._summaries: Dict[Tuple[str, LabelKey], list] = {}
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            entry = self._summaries.get(key)
+            if entry is None:
+                entry = self._summaries[key] = [0, 0.0, deque(maxlen=self.window)]
+            entry[0] += 1
+            entry[1] += value
+            entry[2].append(value)
+
+    def incr(self, name: str, value: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def _summary_rows(self) -> List[Tuple[str, LabelKey, int, float, Dict[int, float]]]:
+        with self._lock:
+            items = [(name, key, count, total, np.fromiter(recent, dtype=float, count=len(recent)))
+                     for (name, key), (count, total, recent) in self._summaries.items()]
+        rows = []
+        for name, key, count, total, recent in sorted(items, key=lambda r: (r[0], r[1])):
+            qs = np.percentile(recent, PERCENTILES) if len(recent) else [np.nan] * len(PERCENTILES)
+            rows.append((name, key, count, total, dict(zip(PERCENTILES, map(float, qs)))))
+        return rows
+
+    def snapshot(self) -> Dict:
+        """Plain-dict view: counters, and per-series count/sum/mean/recent percentiles."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+        out = {"counters": {}, "summaries": {}}
+        for (name, key), value in counters:
+            out["counters"].setdefault(name, []).append({"labels": dict(key), "value": value})
+        for name, key, count, total, qs in self._summary_rows():
+            out["summaries"].setdefault(name, []).append({
+                "labels": dict(key),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else 0.0,
+                **{f"p{q}": v for q, v in qs.items()},
+            })
+        return out
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix: str = "fdqa_") -> str:
+        """Prometheus text exposition format (counters and summaries over the recent window)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, key), value in counters:
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(key)} {value:g}")
+        for name, key, count, total, qs in self._summary_rows():
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} summary")
+                typed.add(metric)
+            for q, v in qs.items():
+                lines.append(f"{metric}{_format_labels(key, {'quantile': str(q / 100)})} {v:g}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{metric}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _default_metrics() -> Metrics:
+    if os.getenv("METRICS_ENABLED", "1").lower() in ("0", "false", "no"):
+        return NullMetrics()
+    return InMemoryMetrics(window=int(os.getenv("METRICS_WINDOW", "1024")))
+
+
+_metrics: Metrics = _default_metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def set_metrics(metrics: Metrics) -> Metrics:
+    """Install a different sink; returns the previous one."""
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    return previous
+
+
+def observe(name: str, value: float, **labels):
+    _metrics.observe(name, value, **labels)
+    spans: Optional[List] = getattr(_local, "trace", None)
+    if spans is not None:
+        spans.append((name, dict(labels), value))
+
+
+def incr(name: str, value: float = 1.0, **labels):
+    _metrics.incr(name, value, **labels)
+
+
+@contextmanager
+def span(name: str, **labels) -> Iterator[Dict]:
+    """Time the enclosed block as ``<name>_seconds``.
+
+    Yields the label dict, so the block can add labels it only learns while
+    running (e.g. ``labels['mode'] = 'ocr'``).
+    """
+    start = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def trace() -> Iterator[List[Tuple[str, Dict, float]]]:
+    """Collect ``(name, labels, value)`` for everything observed on this thread inside the block."""
+    previous = getattr(_local, "trace", None)
+    spans: List[Tuple[str, Dict, float]] = []
+    _local.trace = spans
+    try:
+        yield spans
+    finally:
+        _local.trace = previous
@@ -1,52 +1,273 @@
 import os
+import time
+import threading
 import requests
 import json
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+from requests.adapters import HTTPAdapter
 import streamlit as st
 
+from . import metrics
 from .processing_utils import clean_text
 
+# Status codes worth retrying: Ollama answers 503 while a model is (re)loading.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _RetryableStatus(Exception):
+    pass
+
+
+@dataclass
+class GenerationStats:
+    """Latency figures for a single generation request."""
+    time_to_first_token: Optional[float] = None  # seconds from request start to first token
+    total_time: Optional[float] = None
+    tokens: int = 0
+    prompt_tokens: Optional[int] = None  # as counted by Ollama (prompt_eval_count)
+    tokens_per_second: Optional[float] = None
+    cancelled: bool = False
+    error: Optional[str] = None
+
+
+class TokenStream:
+    """Iterator over tokens streamed from Ollama's ``/api/generate``.
+
+    Iterate it once to consume tokens; ``stats`` is filled in as tokens
+    arrive and finalized when the stream ends. ``cancel()`` may be called
+    from another thread (or from inside the loop) to stop generation and
+    close the HTTP connection.
+    """
+
+    def __init__(self, client: "OllamaClient", payload: dict):
+        self.client = client
+        self.payload = payload
+        self.stats = GenerationStats()
+        self._cancel = threading.Event()
+        self._resp: Optional[requests.Response] = None
+
+    def cancel(self):
+        self._cancel.set()
+        self.close()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def close(self):
+        resp, self._resp = self._resp, None
+        if resp is not None:
+            resp.close()
+
+    def __iter__(self) -> Iterator[str]:
+        start = time.perf_counter()
+        eval_count = eval_duration = None
+        slot_held = False
+        try:
+            self.client._slots.acquire()
+            slot_held = True
+            self._resp = self.client._post(self.payload, stream=True)
+            for line in self._resp.iter_lines(decode_unicode=True):
+                if self._cancel.is_set():
+                    self.stats.cancelled = True
+                    break
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    data = {"response": line}
+                token = data.get("response") or data.get("text") or data.get("content") or ""
+                if token:
+                    if self.stats.time_to_first_token is None:
+                        self.stats.time_to_first_token = time.perf_counter() - start
+                    self.stats.tokens += 1
+                    yield token
+                if data.get("done"):
+                    self.stats.prompt_tokens = data.get("prompt_eval_count")
+                    eval_count = data.get("eval_count")
+                    eval_duration = data.get("eval_duration")  # nanoseconds
+                    break
+        except Exception as e:
+            if not self._cancel.is_set():
+                self.stats.error = str(e)
+                st.error(f"Error calling Ollama: {e}")
+            else:
+                self.stats.cancelled = True
+        finally:
+            self.close()
+            if slot_held:
+                self.client._slots.release()
+            self.stats.total_time = time.perf_counter() - start
+            if eval_count and eval_duration:
+                self.stats.tokens_per_second = eval_count / (eval_duration / 1e9)
+            elif self.stats.tokens and self.stats.time_to_first_token is not None:
+                gen_time = self.stats.total_time - self.stats.time_to_first_token
+                if gen_time > 0:
+                    self.stats.tokens_per_second = self.stats.tokens / gen_time
+            self._record_metrics()
+
+    def _record_metrics(self):
+        s = self.stats
+        outcome = "error" if s.error else "cancelled" if s.cancelled else "ok"
+        metrics.incr("ollama_requests_total", mode="stream", outcome=outcome)
+        metrics.observe("ollama_request_seconds", s.total_time, mode="stream")
+        if s.time_to_first_token is not None:
+            metrics.observe("ollama_ttft_seconds", s.time_to_first_token)
+        if s.tokens_per_second:
+            metrics.observe("ollama_tokens_per_second", s.tokens_per_second)
+        if s.prompt_tokens:
+            metrics.observe("ollama_prompt_tokens", s.prompt_tokens)
+
 
 class OllamaClient:
-    def __init__(self, base_url: Optional[str] = None, model_name: Optional[str] = None):
+    """Client for Ollama's ``/api/generate`` over a pooled, persistent HTTP session.
+
+    At most ``max_in_flight`` requests run at once (further callers wait for
+    a slot), connection failures and transient 5xx/429 answers are retried
+    with exponential backoff, and every request asks Ollama to keep the model
+    loaded for ``keep_alive`` so it is not unloaded between questions.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model_name: Optional[str] = None,
+        max_in_flight: Optional[int] = None,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        keep_alive: Optional[str] = None,
+        timeout: float = 120,
+    ):
         self.base_url = base_url or os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
         self.model_name = model_name or os.getenv("OLLAMA_MODEL", "llama2:latest")
+        self.max_in_flight = max(1, max_in_flight or int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "4")))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.timeout = timeout
 
-    def generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.0) -> str:
-        """Send a prompt to the Ollama API and return the generated text."""
-        safe_prompt = clean_text(prompt)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
 
-        payload = {
+    def _payload(self, prompt: str, max_tokens: int, temperature: float, stream: bool) -> dict:
+        return {
             "model": self.model_name,
-            "prompt": safe_prompt,
+            "prompt": clean_text(prompt),
             "max_tokens": max_tokens,
             "temperature": temperature,
-            "stream": False,  # non-streaming mode
+            "stream": stream,
+            "keep_alive": self.keep_alive,
         }
 
-        try:
-            resp = requests.post(self.base_url, json=payload, timeout=120)
-            resp.raise_for_status()
+    def _post(self, payload: dict, stream: bool = False) -> requests.Response:
+        """POST with retry and exponential backoff on connection errors and transient statuses."""
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(self.base_url, json=payload, stream=stream, timeout=self.timeout)
+                if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    resp.close()
+                    raise _RetryableStatus(resp.status_code)
+                resp.raise_for_status()
+                return resp
+            except (requests.ConnectionError, requests.ConnectTimeout, _RetryableStatus) as e:
+                if attempt >= self.max_retries:
+                    raise
+                metrics.incr("ollama_retries_total", reason=str(e) if isinstance(e, _RetryableStatus) else "connection")
+                time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
 
-            # Ollama sometimes returns multiple JSON objects (one per line)
-            raw = resp.text.strip().splitlines()
+    def _generate(self, payload: dict) -> str:
+        with self._slots, metrics.span("ollama_request", mode="blocking"):
+            try:
+                resp = self._post(payload)
+            except Exception:
+                metrics.incr("ollama_requests_total", mode="blocking", outcome="error")
+                raise
+        metrics.incr("ollama_requests_total", mode="blocking", outcome="ok")
 
-            collected_text = []
-            for line in raw:
-                try:
-                    data = json.loads(line)
-                    if "response" in data:
-                        collected_text.append(data["response"])
-                    elif "text" in data:
-                        collected_text.append(data["text"])
-                    elif "content" in data:
-                        collected_text.append(data["content"])
-                except json.JSONDecodeError:
-                    # not valid JSON, just collect as raw text
-                    collected_text.append(line)
+        # Ollama sometimes returns multiple JSON objects (one per line)
+        raw = resp.text.strip().splitlines()
+
+        collected_text = []
+        for line in raw:
+            try:
+                data = json.loads(line)
+                if "response" in data:
+                    collected_text.append(data["response"])
+                elif "text" in data:
+                    collected_text.append(data["text"])
+                elif "content" in data:
+                    collected_text.append(data["content"])
+            except json.JSONDecodeError:
+                # not valid JSON, just collect as raw text
+                collected_text.append(line)
+
+        return " ".join(collected_text).strip()
+
+    def warm_up(self):
+        """Ask Ollama to load the model (a request without a prompt only loads it) and keep it resident."""
+        with self._slots, metrics.span("ollama_warm_up"):
+            self._post({"model": self.model_name, "keep_alive": self.keep_alive, "stream": False}).close()
 
-            return " ".join(collected_text).strip()
+    def stream(self, prompt: str, max_tokens: int = 512, temperature: float = 0.0) -> TokenStream:
+        """Start a streaming generation; iterate the returned TokenStream for tokens."""
+        return TokenStream(self, self._payload(prompt, max_tokens, temperature, stream=True))
 
+    def generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.0) -> str:
+        """Send a prompt to the Ollama API and return the generated text."""
+        payload = self._payload(prompt, max_tokens, temperature, stream=False)  # non-streaming mode
+
+        try:
+            return self._generate(payload)
         except Exception as e:
             st.error(f"Error calling Ollama: {e}")
             return f"Error calling Ollama: {e}"
+
+    def generate_many(
+        self,
+        prompts: List[str],
+        max_tokens: int = 512,
+        temperature: float = 0.0,
+        max_queue: Optional[int] = None,
+    ) -> List[str]:
+        """Generate answers for many prompts concurrently, returned in input order.
+
+        Up to ``max_in_flight`` requests hit Ollama at once; at most
+        ``max_queue`` further prompts are queued behind them, so huge batches
+        don't build an unbounded backlog of pending payloads. A failed prompt
+        yields an ``"Error calling Ollama: ..."`` string in its slot.
+        """
+        if not prompts:
+            return []
+        max_queue = self.max_in_flight if max_queue is None else max_queue
+        pending = threading.BoundedSemaphore(self.max_in_flight + max(0, max_queue))
+
+        def run(prompt: str) -> str:
+            try:
+                return self._generate(self._payload(prompt, max_tokens, temperature, stream=False))
+            except Exception as e:
+                return f"Error calling Ollama: {e}"
+            finally:
+                pending.release()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            for prompt in prompts:
+                pending.acquire()
+                futures.append(pool.submit(run, prompt))
+        results = [f.result() for f in futures]
+
+        failed = sum(r.startswith("Error calling Ollama:") for r in results)
+        if failed:
+            st.warning(f"{failed} of {len(results)} Ollama requests failed.")
+        return results
+
+    def close(self):
+        self.session.close()
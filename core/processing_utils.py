@@ -1,4 +1,5 @@
 import re
+from typing import Dict, Iterable, Iterator, List
 import pandas as pd
 
 """
@@ -7,6 +8,10 @@ Helper functions for cleaning and chunking extracted text,
 and extracting numeric/financial values.
 """
 
+# Bump whenever chunking output changes so cached chunks/embeddings are invalidated.
+CHUNKER_VERSION = "4"
+CELL_BREAK_RE = re.compile(r"\s*[\r\n]+\s*")
+
 def chunk_text(text, max_chunk_size=500):
     """Split text into smaller chunks for embeddings/search."""
     words = text.split()
@@ -27,19 +32,116 @@ def chunk_text(text, max_chunk_size=500):
     return chunks
 
 
+WORD_RE = re.compile(r"\S+")
+
+
+def stream_chunks(pages: Iterable[Dict], max_chunk_size: int = 800, overlap: int = 150) -> Iterator[Dict]:
+    """Clean and chunk page records lazily, one page at a time.
+
+    Each page record is ``{"text": ..., "source": {...}}`` as yielded by
+    ``DocumentParser.iter_file_pages``. Chunks never cross a page, so every
+    chunk carries its page's true file/page/sheet ``source``, plus
+    ``char_start`` / ``char_end`` offsets into the cleaned page text.
+    Consecutive chunks of a page overlap by roughly ``overlap`` characters,
+    at most a quarter of ``max_chunk_size`` so small chunk sizes still advance.
+
+    Worksheet records (with ``row_numbers``) are chunked by whole rows instead;
+    see ``row_chunks``.
+    """
+    overlap = min(overlap, max_chunk_size // 4)
+    for page in pages:
+        if "row_numbers" in page:
+            yield from row_chunks(page, max_chunk_size)
+            continue
+        text = clean_text(page["text"])
+        spans = [m.span() for m in WORD_RE.finditer(text)]
+        i = 0
+        while i < len(spans):
+            start = spans[i][0]
+            j = i + 1  # always take at least one word, even an overlong one
+            while j < len(spans) and spans[j][1] - start <= max_chunk_size:
+                j += 1
+            end = spans[j - 1][1]
+            yield {"text": text[start:end], "source": page["source"], "char_start": start, "char_end": end}
+            if j >= len(spans):
+                break
+            # Back up to the first word inside the overlap window, but always make progress.
+            k = j
+            while k - 1 > i and spans[k - 1][0] >= end - overlap:
+                k -= 1
+            i = k
+
+
+def row_chunks(record: Dict, max_chunk_size: int = 800) -> Iterator[Dict]:
+    """Chunk a worksheet record (title line, header line, one line per row) into groups of whole rows.
+
+    Each chunk is the header line followed by as many rows as fit in
+    ``max_chunk_size``, so every chunk can be read on its own. Its source
+    gains the chunk's worksheet ``rows`` range, and ``char_start`` /
+    ``char_end`` locate the rows (without the repeated header) in the
+    cleaned record text. Rows don't overlap between chunks.
+    """
+    lines = [clean_text(line) for line in record["text"].split("\n")]
+    text = "\n".join(lines)
+    header = lines[1] if len(lines) > 1 else ""
+    offset = len(lines[0]) + len(header) + 2
+    start = offset
+    group: List[int] = []
+    for line, row_no in zip(lines[2:], record["row_numbers"]):
+        if group and len(header) + offset + len(line) - start + 1 > max_chunk_size:
+            yield _row_chunk(record, text, header, group, start, offset - 1)
+            start, group = offset, []
+        group.append(row_no)
+        offset += len(line) + 1
+    if group:
+        yield _row_chunk(record, text, header, group, start, offset - 1)
+
+
+def _row_chunk(record: Dict, text: str, header: str, group: List[int], start: int, end: int) -> Dict:
+    source = dict(record["source"], rows=f"{group[0]}-{group[-1]}")
+    return {"text": header + "\n" + text[start:end], "source": source, "char_start": start, "char_end": end}
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most ``batch_size`` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token for English prose)."""
+    return max(1, len(text) // 4) if text else 0
+
+
 def extract_numbers(text):
     """Extract numeric values (currency, percentages, floats, ints) from text."""
     number_re = r"\(?-?[\d,]+(?:\.\d+)?\)?"
     return re.findall(number_re, text)
 
 
+def flatten_cell(value: str) -> str:
+    """A cell's text on one line: wrapped cells ("Rent\nJanuary") would otherwise read as extra rows."""
+    return CELL_BREAK_RE.sub(" ", value)
+
+
+def rows_to_text(df: pd.DataFrame) -> pd.Series:
+    """One ``"a | b | c"`` line per DataFrame row (missing cells empty, line breaks inside cells flattened)."""
+    if df.shape[1] == 0:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    cells = df.astype(object).where(df.notna(), "").astype(str)
+    cells = cells.apply(lambda col: col.str.replace(CELL_BREAK_RE, " ", regex=True))
+    return cells.iloc[:, 0].str.cat([cells.iloc[:, i] for i in range(1, cells.shape[1])], sep=" | ")
+
+
 def df_to_chunks(df: pd.DataFrame):
     """Convert DataFrame rows into text chunks."""
-    chunks = []
-    for _, row in df.iterrows():
-        row_text = " | ".join([str(v) for v in row.values])
-        chunks.append(row_text)
-    return chunks
+    return rows_to_text(df).tolist()
 
 
 def extract_metrics_from_text(text: str):
@@ -73,6 +175,6 @@ def clean_text(text: str) -> str:
     - Strips weird unicode characters
     """
     text = text.replace("₹", "")
-    text = text.replace(",", "")
+    text = re.sub(r"(?<=\d),(?=\d\d)", "", text)  # only digit-group separators, not list/field commas
     text = re.sub(r"[^\x00-\x7F]+", " ", text)  # keep ASCII only
     return text.strip()
\ No newline at end of file
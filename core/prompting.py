@@ -0,0 +1,234 @@
+"""prompting.py
+Token-budgeted prompt assembly for answering a question from retrieved
+chunks, shared by the Streamlit UI and the HTTP API.
+
+The prompt is packed to ``PROMPT_TOKEN_BUDGET`` tokens:
+- retrieved chunks are deduplicated first (overlapping windows of the same
+  page are merged back into one span, repeated text is dropped) and then
+  added in rank order while they fit;
+- the conversation gets ``PROMPT_HISTORY_SHARE`` of the budget: recent
+  turns verbatim, older turns folded into a rolling extractive summary
+  (``ConversationMemory``), in batches so the text stays stable for several
+  turns;
+- stable parts (instructions, summary, recent turns) come before the
+  per-question parts (context, question), so consecutive prompts share a
+  long prefix that Ollama can serve from its prompt cache.
+
+Token counts are estimated from characters; ``TokenCounter.calibrate``
+refines the ratio from the ``prompt_eval_count`` Ollama reports.
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SYSTEM_PROMPT = ("You are a helpful financial document assistant. Answer user questions using ONLY the provided context. "
+                 "If the answer is not present, say you could not find the information and suggest what to check in the document.")
+
+ANSWER_INSTRUCTION = ("Provide an accurate concise answer with references to which chunk/page the information "
+                      "came from when possible.")
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3072"))
+PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.25"))
+# Part of the history budget the rolling summary may use; the rest is for verbatim recent turns.
+SUMMARY_SHARE = 0.4
+SUMMARY_LINE_CHARS = 240
+
+
+class TokenCounter:
+    """Character-based token estimate whose chars-per-token ratio is calibrated from real counts."""
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1 if text else 0
+
+    def calibrate(self, text: str, actual_tokens: Optional[int]):
+        """Fold an observed ``(text, token count)`` pair into the ratio (exponential moving average)."""
+        if not text or not actual_tokens:
+            return
+        observed = len(text) / actual_tokens
+        if not 2.0 <= observed <= 8.0:
+            # Far fewer tokens than characters suggest: Ollama served part of the prompt from its cache
+            # and only counted the rest.
+            return
+        with self._lock:
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * observed
+
+
+token_counter = TokenCounter()
+
+
+def _source_label(src: Dict) -> str:
+    where = f"sheet={src['sheet']} rows={src.get('rows', '')}" if "sheet" in src else f"page={src.get('page', '')}"
+    return f"[file={src.get('file', 'unknown')} {where} types={src.get('types', [])}]"
+
+
+def dedupe_results(results: Sequence[Tuple[float, Dict]]) -> List[Tuple[float, Dict]]:
+    """Merge overlapping chunks of the same page/sheet and drop repeated text, keeping rank order.
+
+    Chunks produced by ``stream_chunks`` carry ``char_start`` / ``char_end``
+    offsets into their page, so two overlapping windows are stitched back
+    into one span (at the better-ranked chunk's position).
+    """
+    merged: List[Tuple[float, Dict]] = []
+    seen_text = set()
+    for score, item in results:
+        src = item.get("source", {})
+        start, end = item.get("char_start"), item.get("char_end")
+        if start is not None and end is not None:
+            page_key = (src.get("file"), src.get("page"), src.get("sheet"), src.get("rows"))
+            for i, (kept_score, kept) in enumerate(merged):
+                k_src = kept.get("source", {})
+                if (k_src.get("file"), k_src.get("page"), k_src.get("sheet"), k_src.get("rows")) != page_key:
+                    continue
+                k_start, k_end = kept.get("char_start"), kept.get("char_end")
+                if k_start is None or start > k_end or end < k_start:
+                    continue
+                first, second = (kept, item) if k_start <= start else (item, kept)
+                text = first["text"] + second["text"][max(0, first["char_end"] - second["char_start"]):]
+                merged[i] = (kept_score, dict(kept, text=text, char_start=min(start, k_start),
+                                              char_end=max(end, k_end)))
+                break
+            else:
+                start = None  # no overlap: fall through and keep it as its own piece
+            if start is not None:
+                continue
+        key = re.sub(r"\s+", " ", item.get("text", "")).strip().lower()
+        if key in seen_text:
+            continue
+        seen_text.add(key)
+        merged.append((score, item))
+    return merged
+
+
+def summarize_turn(question: str, answer: str) -> str:
+    """One line per folded turn: the question and the first sentence of the answer."""
+    first = re.split(r"(?<=[.!?])\s", answer.strip(), maxsplit=1)[0] if answer else ""
+    line = f"- Q: {question.strip()} A: {first}"
+    return line if len(line) <= SUMMARY_LINE_CHARS else line[:SUMMARY_LINE_CHARS - 3] + "..."
+
+
+def to_turns(history: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Pair ``(role, text)`` messages into ``(question, answer)`` turns."""
+    turns: List[Tuple[str, str]] = []
+    for role, text in history:
+        if role == "user":
+            turns.append((text, ""))
+        elif turns and not turns[-1][1]:
+            turns[-1] = (turns[-1][0], text)
+        else:
+            turns.append(("", text))
+    return turns
+
+
+def format_turns(turns: Sequence[Tuple[str, str]]) -> str:
+    lines = []
+    for question, answer in turns:
+        if question:
+            lines.append(f"User: {question}")
+        if answer:
+            lines.append(f"Assistant: {answer}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Rolling summary of older turns plus the verbatim recent ones, kept within a token budget.
+
+    State (how many turns are folded and their summary lines) persists
+    between questions, so each turn is summarized once and the summary only
+    changes when another batch of turns is folded.
+    """
+
+    def __init__(self):
+        self.folded = 0
+        self.summary: List[str] = []
+
+    def compact(self, history: Sequence[Tuple[str, str]], budget: int,
+                counter: TokenCounter = token_counter) -> Tuple[str, List[Tuple[str, str]]]:
+        """Return ``(summary text, recent turns)`` for ``history`` within ``budget`` tokens."""
+        turns = to_turns(history)
+        if self.folded > len(turns):  # history was cleared
+            self.folded, self.summary = 0, []
+        recent_budget = int(budget * (1 - SUMMARY_SHARE))
+        recent = turns[self.folded:]
+        if counter.count(format_turns(recent)) > recent_budget:
+            # Fold down to half the budget so the next few turns append without re-folding.
+            while len(recent) > 1 and counter.count(format_turns(recent)) > recent_budget // 2:
+                self.summary.append(summarize_turn(*recent[0]))
+                recent = recent[1:]
+                self.folded += 1
+        summary_budget = budget - counter.count(format_turns(recent))
+        while self.summary and counter.count("\n".join(self.summary)) > summary_budget:
+            self.summary.pop(0)  # the oldest summarized turns go first
+        return "\n".join(self.summary), recent
+
+
+@dataclass
+class PromptPlan:
+    prompt: str
+    tokens: int
+    budget: int
+    context: List[Tuple[float, Dict]] = field(default_factory=list)  # chunks that made it in
+    dropped_chunks: int = 0
+    merged_chunks: int = 0
+    summarized_turns: int = 0
+    recent_turns: int = 0
+
+
+def plan_prompt(
+    query: str,
+    results: Sequence[Tuple[float, Dict]],
+    history: Sequence[Tuple[str, str]] = (),
+    memory: Optional[ConversationMemory] = None,
+    budget: Optional[int] = None,
+    counter: TokenCounter = token_counter,
+) -> PromptPlan:
+    """Assemble the prompt within ``budget`` tokens. ``history`` excludes the current question."""
+    budget = budget or PROMPT_TOKEN_BUDGET
+    memory = memory or ConversationMemory()
+
+    summary, recent = memory.compact(history, int(budget * PROMPT_HISTORY_SHARE), counter)
+    head = f"SYSTEM:\n{SYSTEM_PROMPT}\n\n"
+    if summary:
+        head += f"EARLIER CONVERSATION (summary):\n{summary}\n\n"
+    if recent:
+        head += f"CONVERSATION:\n{format_turns(recent)}\n\n"
+    tail = f"USER QUESTION:\n{query}\n\n{ANSWER_INSTRUCTION}"
+    remaining = budget - counter.count(head) - counter.count(tail) - counter.count("CONTEXT:\n\n\n")
+
+    unique = dedupe_results(results)
+    pieces, used = [], []
+    for score, item in unique:
+        piece = _source_label(item.get("source", {})) + "\n" + item.get("text", "")
+        cost = counter.count(piece) + 2
+        if cost > remaining:
+            if pieces or remaining < 64:
+                continue
+            # Nothing fits yet: keep the head of the best chunk rather than no context at all.
+            piece = piece[:int((remaining - 2) * counter.chars_per_token)]
+            cost = remaining
+        pieces.append(piece)
+        used.append((score, item))
+        remaining -= cost
+
+    prompt = head + "CONTEXT:\n" + "\n\n---\n\n".join(pieces) + "\n\n" + tail
+    return PromptPlan(
+        prompt=prompt,
+        tokens=counter.count(prompt),
+        budget=budget,
+        context=used,
+        dropped_chunks=len(unique) - len(used),
+        merged_chunks=len(results) - len(unique),
+        summarized_turns=memory.folded,
+        recent_turns=len(recent),
+    )
+
+
+def build_prompt(query: str, results: Sequence[Tuple[float, Dict]], history: Sequence[Tuple[str, str]] = (),
+                 memory: Optional[ConversationMemory] = None, budget: Optional[int] = None) -> str:
+    """Full prompt: instructions, conversation so far, retrieved context and the question."""
+    return plan_prompt(query, results, history, memory=memory, budget=budget).prompt
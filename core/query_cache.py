@@ -0,0 +1,167 @@
+"""query_cache.py
+In-memory caches for repeated questions:
+- LRUCache: thread-safe LRU with optional TTL and hit/miss counters;
+- AnswerCache: final answers keyed on normalized question, index version,
+  model, temperature and the retrieved chunk ids, with optional semantic
+  matching of near-duplicate questions by query-embedding similarity.
+
+Index-versioned keys give invalidation for free: any add/remove bumps the
+retriever's ``index_version`` (unique per retriever instance) so stale
+entries simply stop matching and age out of the LRU.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MISSING = object()
+# Scopes are per (index version, model, temperature, retrieved chunks, numbers); each holds few questions.
+MAX_SEMANTIC_SCOPES = 4096
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(question: str) -> str:
+    """Case/whitespace/punctuation-insensitive form of a question."""
+    q = re.sub(r"[^\w\s.%-]", " ", question.lower())
+    return re.sub(r"\s+", " ", q).strip(" .")
+
+
+def question_numbers(question: str) -> frozenset:
+    """Numbers and years in a question ("2022", "fy23" -> "23", "4,512.7" -> "4512.7")."""
+    return frozenset(NUMBER_RE.findall(question.replace(",", "")))
+
+
+class LRUCache:
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                stored_at, value = item
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class AnswerCache:
+    """Final-answer cache.
+
+    Exact lookups use ``(normalized question, index version, model,
+    temperature, retrieved chunk ids)``. With ``semantic_threshold`` set,
+    a miss falls back to the most similar earlier question whose query
+    embedding has cosine similarity >= the threshold, among questions asked
+    against the same index version / model / temperature that retrieved the
+    same chunks and quote the same numbers and years. Embeddings barely
+    separate "revenue in 2022" from "revenue in 2023", so the numbers must
+    match exactly.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: Optional[float] = None, semantic_threshold: Optional[float] = None):
+        self.entries = LRUCache(max_size=max_size, ttl=ttl)
+        self.semantic_threshold = semantic_threshold
+        # _scope(key) -> list of (normalized question, embedding, exact key)
+        self._semantic: "OrderedDict[Tuple, List[Tuple[str, np.ndarray, Tuple]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        ttl = os.getenv("ANSWER_CACHE_TTL")
+        threshold = os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD")
+        return cls(
+            max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl=float(ttl) if ttl else None,
+            semantic_threshold=float(threshold) if threshold else None,
+        )
+
+    @staticmethod
+    def make_key(question: str, index_version: str, model: str, temperature: float,
+                 chunk_ids: Sequence[int] = ()) -> Tuple:
+        return (normalize_question(question), index_version, model, round(float(temperature), 3), tuple(chunk_ids))
+
+    @staticmethod
+    def _scope(key: Tuple) -> Tuple:
+        return (*key[1:5], question_numbers(key[0]))
+
+    def get(self, key: Tuple, query_embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        answer = self.entries.get(key)
+        if answer is not None or self.semantic_threshold is None or query_embedding is None:
+            return answer
+
+        scope = self._scope(key)
+        with self._lock:
+            candidates = list(self._semantic.get(scope, []))
+        best_key, best_sim = None, self.semantic_threshold
+        q = np.asarray(query_embedding, dtype="float32").ravel()
+        for _, emb, exact_key in candidates:
+            sim = float(np.dot(q, emb))
+            if sim >= best_sim:
+                best_key, best_sim = exact_key, sim
+        if best_key is None:
+            return None
+        answer = self.entries.get(best_key)
+        if answer is not None:
+            self.semantic_hits += 1
+        return answer
+
+    def put(self, key: Tuple, answer: str, query_embedding: Optional[np.ndarray] = None):
+        self.entries.put(key, answer)
+        if self.semantic_threshold is None or query_embedding is None:
+            return
+        scope = self._scope(key)
+        with self._lock:
+            bucket = self._semantic.setdefault(scope, [])
+            self._semantic.move_to_end(scope)
+            bucket.append((key[0], np.asarray(query_embedding, dtype="float32").ravel(), key))
+            del bucket[:-self.entries.max_size]
+            # Old scopes (superseded index versions, rare questions) rarely match again; keep only recent ones.
+            while len(self._semantic) > MAX_SEMANTIC_SCOPES:
+                self._semantic.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._semantic.clear()
+
+    def stats(self) -> Dict[str, float]:
+        stats = self.entries.stats()
+        stats["semantic_hits"] = self.semantic_hits
+        return stats
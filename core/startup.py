@@ -0,0 +1,94 @@
+"""startup.py
+Startup time report and background warm-up.
+
+``StartupReport`` records how long each startup phase took (imports, index
+load, model warm-up ...). Phases that would block the first page render run
+in daemon threads via ``background``; their status is ``running`` until they
+finish, so the UI can show the page immediately and report progress. Every
+finished phase is also recorded as ``startup_phase_seconds{phase=...}``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from . import metrics
+
+
+class StartupReport:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        # phase -> {"status": running|done|failed, "seconds": float|None, "background": bool, "error": str|None}
+        self.phases: Dict[str, Dict] = {}
+        self._threads: List[threading.Thread] = []
+
+    def _finish(self, name: str, start: float, error: Optional[BaseException] = None):
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.phases[name].update(status="failed" if error else "done", seconds=seconds,
+                                     error=str(error) if error else None)
+        metrics.observe("startup_phase_seconds", seconds, phase=name)
+
+    def record(self, name: str, seconds: float):
+        """Record a phase that was timed elsewhere (e.g. module imports)."""
+        with self._lock:
+            self.phases[name] = {"status": "running", "seconds": None, "background": False, "error": None}
+        self._finish(name, time.perf_counter() - seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a blocking startup phase; exceptions propagate and mark it failed."""
+        with self._lock:
+            self.phases[name] = {"status": "running", "seconds": None, "background": False, "error": None}
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(name, start, e)
+            raise
+        self._finish(name, start)
+
+    def background(self, name: str, fn: Callable[[], object]) -> threading.Thread:
+        """Run ``fn`` in a daemon thread as a timed phase. Failures are recorded, not raised."""
+        with self._lock:
+            self.phases[name] = {"status": "running", "seconds": None, "background": True, "error": None}
+
+        def run():
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self._finish(name, start, e)
+            else:
+                self._finish(name, start)
+
+        thread = threading.Thread(target=run, name=f"warmup-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until background phases finish (used by the CLI and tests)."""
+        for thread in list(self._threads):
+            thread.join(timeout)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(p["status"] != "running" for p in self.phases.values())
+
+    def rows(self) -> List[Dict]:
+        with self._lock:
+            return [{"phase": name, **info} for name, info in self.phases.items()]
+
+    def summary(self) -> str:
+        """One line: blocking time so far and the state of background phases."""
+        rows = self.rows()
+        blocking = sum(r["seconds"] or 0.0 for r in rows if not r["background"])
+        parts = [f"startup {blocking:.2f}s"]
+        for r in rows:
+            if r["background"]:
+                state = f"{r['seconds']:.1f}s" if r["status"] == "done" else r["status"]
+                parts.append(f"{r['phase']} {state}")
+        return ", ".join(parts)
@@ -0,0 +1,56 @@
+"""statements.py
+Financial statement tagging for pages and queries.
+
+Pages are tagged with every statement type whose keywords they contain
+(``detect_statement_types``); the retriever keeps one id partition per type
+and searches only the partition a query is clearly about
+(``query_statement_types``). Both use a single compiled alternation per
+keyword table instead of testing keywords one by one.
+"""
+import re
+from typing import Dict, List
+
+STATEMENT_TYPES = ("income_statement", "balance_sheet", "cash_flow")
+
+STATEMENT_KEYWORDS = {
+    'income_statement': ['income statement', 'statement of profit', 'profit and loss', 'revenue', 'net income'],
+    'balance_sheet': ['balance sheet', 'assets', 'liabilities', 'equity', 'total assets'],
+    'cash_flow': ['cash flow', 'statement of cash flows', 'operating activities', 'investing activities']
+}
+
+# Query terms that point at one statement. Only unambiguous line items: "cash" or "total" alone don't.
+QUERY_KEYWORDS = {
+    'income_statement': ['income statement', 'statement of profit', 'profit and loss', 'p&l', 'revenue', 'revenues',
+                         'sales', 'turnover', 'net income', 'net profit', 'gross profit', 'gross margin',
+                         'operating income', 'operating profit', 'ebitda', 'ebit', 'eps', 'earnings per share',
+                         'expenses', 'cost of goods sold', 'cogs'],
+    'balance_sheet': ['balance sheet', 'assets', 'liabilities', 'equity', 'net worth', 'inventory', 'inventories',
+                      'receivables', 'payables', 'borrowings', 'retained earnings', 'share capital', 'reserves'],
+    'cash_flow': ['cash flow', 'cash flows', 'operating activities', 'investing activities', 'financing activities',
+                  'capex', 'capital expenditure', 'free cash flow', 'dividends paid'],
+}
+
+
+def _matcher(table: Dict[str, List[str]], whole_words: bool):
+    lookup = {kw: kind for kind, kws in table.items() for kw in kws}
+    # Longest first so "statement of cash flows" wins over "cash flow" at the same position.
+    pattern = "|".join(re.escape(kw) for kw in sorted(lookup, key=len, reverse=True))
+    if whole_words:
+        pattern = rf"(?<![a-z0-9])(?:{pattern})(?![a-z0-9])"
+    return re.compile(pattern), lookup
+
+
+# Pages match keywords anywhere (as substrings); queries are short, so "eps" must not match "steps".
+_PAGE_RE, _PAGE_LOOKUP = _matcher(STATEMENT_KEYWORDS, whole_words=False)
+_QUERY_RE, _QUERY_LOOKUP = _matcher(QUERY_KEYWORDS, whole_words=True)
+
+
+def detect_statement_types(text: str) -> List[str]:
+    """Statement types whose keywords occur in ``text``, sorted."""
+    return sorted({_PAGE_LOOKUP[m.group(0)] for m in _PAGE_RE.finditer(text.lower())})
+
+
+def query_statement_types(query: str) -> List[str]:
+    """The statement a question is about, as a one-element list, or [] when it names none or several."""
+    found = {_QUERY_LOOKUP[m.group(0)] for m in _QUERY_RE.finditer(query.lower())}
+    return list(found) if len(found) == 1 else []
@@ -0,0 +1,285 @@
+"""table_store.py
+Columnar numeric store built from extracted tables, with a small query API
+(line-item lookup, period comparison, aggregation) that answers numeric
+questions directly instead of going through retrieval + the LLM.
+
+Every table is melted into one long frame with a row per (line item, column)
+cell; cell strings are parsed to floats in a single vectorized pass that
+understands common financial formats:
+- accounting negatives ``(1,234)`` and leading minus,
+- Western and Indian digit grouping (``1,234,567`` / ``12,34,567``),
+- currency prefixes (``₹``, ``Rs.``, ``INR``, ``$``, ``USD``),
+- unit suffixes (lakh, crore/cr, mn/million, bn/billion),
+- percentages (kept as percentage points, flagged in ``is_percent``).
+Column headers are mapped to fiscal years (``2023``, ``FY23``,
+``FY 2022-23``, ``31-03-2023`` ...) so periods can be compared.
+"""
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CURRENCY_PREFIX_RE = r"^(?:₹|rs\.?|inr|\$|usd|us\$)\s*"
+UNIT_SCALES = {
+    "lakhs": 1e5, "lakh": 1e5, "lacs": 1e5, "lac": 1e5,
+    "crores": 1e7, "crore": 1e7, "cr.": 1e7, "cr": 1e7,
+    "million": 1e6, "mn": 1e6,
+    "billion": 1e9, "bn": 1e9,
+}
+UNIT_ALTERNATION = "|".join(re.escape(u) for u in sorted(UNIT_SCALES, key=len, reverse=True))
+
+YEAR_RANGE_RE = re.compile(r"((?:19|20)\d{2})\s*[-/–]\s*(\d{2,4})\b")
+YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+FY_SHORT_RE = re.compile(r"\bfy\s*'?(\d{2})\b", re.IGNORECASE)
+
+# Labels made only of these words ("Total", "Net") are too generic to route a question on.
+GENERIC_LABEL_WORDS = frozenset("total sub subtotal net gross other others particulars amount".split())
+
+QUERY_STOPWORDS = frozenset(
+    "a an and are as at be by compare compared comparison for from in is of on the to vs versus was were what "
+    "which how much many did does do show give me tell between change growth fy year years period".split()
+)
+
+# Questions asking for reasoning or a definition rather than a figure go to retrieval + the LLM.
+EXPLANATORY_RE = re.compile(r"\b(?:why|explain|explanation|reasons?|drive[ns]?|drivers?|driving|drove|because|"
+                            r"caus(?:e|es|ed|ing)|impact|affect|outlook|guidance|risks?|describe|"
+                            r"discuss|summari[sz]e|commentary|meaning|define[ds]?|definition|"
+                            r"(?:does|do|did)\b.*\bmean)\b")
+# "How did X change?" asks for an explanation unless it names the periods to compare ("from 2022 to 2023").
+CHANGE_RE = re.compile(r"\bchange[ds]?\b")
+# Questions about a line item's accounting, a part of it or a breakdown of it are not asking for the reported figure.
+QUALIFIER_RE = re.compile(r"\b(?:recogni[sz](?:e[ds]?|ing|ation)|polic(?:y|ies)|deferred|unearned|segment\w*|"
+                          r"attributable|breakdown|(?:percentage|percent|proportion|share) of|"
+                          r"(?:by|per) (?!share\b|operations\b|(?:operating|investing|financing) activities\b)[a-z])"
+                          r"|%\s*of\b")
+# "average" / "mean" as a noun ("mean of", "the mean"); "what does X mean" is not an aggregation.
+AVERAGE_RE = re.compile(r"\b(?:average|avg)\b|\b(?:the|a) mean\b|\bmean (?:of|value|values)\b")
+
+
+def parse_financial_values(values: pd.Series) -> pd.DataFrame:
+    """Vectorized parse of financial cell strings.
+
+    Returns a frame aligned with ``values`` with a float ``value`` column
+    (NaN where the cell is not a number) and a boolean ``is_percent`` column.
+    """
+    s = values.astype("string").str.strip().str.lower().fillna("")
+    is_percent = s.str.endswith("%")
+    negative = (s.str.match(r"^\(.*\)$") | s.str.match(r"^-\s*\S")).to_numpy(dtype=bool)
+
+    s = s.str.replace(r"^\(|\)$", "", regex=True).str.replace(r"^-\s*", "", regex=True)
+    s = s.str.replace(CURRENCY_PREFIX_RE, "", regex=True).str.rstrip("%").str.strip()
+
+    unit = s.str.extract(rf"({UNIT_ALTERNATION})$", expand=False)
+    scale = unit.map(UNIT_SCALES).fillna(1.0).astype(float)
+    s = s.str.replace(rf"\s*(?:{UNIT_ALTERNATION})$", "", regex=True)
+    # Grouping commas (Western or Indian) and stray spaces carry no meaning once parsed.
+    s = s.str.replace(r"[,\s]", "", regex=True)
+
+    value = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float, na_value=np.nan) * scale.to_numpy()
+    value = np.where(negative, -value, value)
+    return pd.DataFrame({"value": value, "is_percent": is_percent.to_numpy(dtype=bool)}, index=values.index)
+
+
+def period_from_header(header) -> Optional[int]:
+    """Map a column header to a fiscal year (the year a period ends in), or None."""
+    h = str(header)
+    m = YEAR_RANGE_RE.search(h)
+    if m:
+        end = m.group(2)
+        return int(end) if len(end) == 4 else int(m.group(1)[:2] + end)
+    m = YEAR_RE.search(h)
+    if m:
+        return int(m.group(1))
+    m = FY_SHORT_RE.search(h)
+    if m:
+        return 2000 + int(m.group(1))
+    return None
+
+
+def periods_in_text(text: str) -> List[int]:
+    found = []
+    for m in YEAR_RANGE_RE.finditer(text):
+        end = m.group(2)
+        found.append(int(end) if len(end) == 4 else int(m.group(1)[:2] + end))
+    text = YEAR_RANGE_RE.sub(" ", text)
+    found += [int(y) for y in YEAR_RE.findall(text)]
+    found += [2000 + int(y) for y in FY_SHORT_RE.findall(text)]
+    return list(dict.fromkeys(found))
+
+
+def needs_llm(question: str) -> bool:
+    """Whether a question asks for an explanation or a qualified figure, so the stores should not answer it."""
+    q = question.lower()
+    return bool(EXPLANATORY_RE.search(q) or QUALIFIER_RE.search(q)
+                or (CHANGE_RE.search(q) and len(periods_in_text(q)) < 2))
+
+
+def normalize_label(label: pd.Series) -> pd.Series:
+    return (label.astype("string").str.lower()
+            .str.replace(r"[^a-z0-9&% ]+", " ", regex=True)
+            .str.replace(r"\s+", " ", regex=True).str.strip())
+
+
+def _unique_columns(columns) -> List[str]:
+    seen: Dict[str, int] = {}
+    out = []
+    for i, c in enumerate(columns):
+        name = str(c) if c is not None and str(c).strip() and str(c) != "nan" else f"col{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        out.append(name)
+    return out
+
+
+def to_markdown(df: pd.DataFrame, index: bool = True) -> str:
+    """Render a small frame as a GitHub-style markdown table (no tabulate dependency)."""
+    if index:
+        df = df.reset_index()
+
+    def fmt(v):
+        if isinstance(v, (float, np.floating)):
+            return "" if np.isnan(v) else f"{v:,.2f}"
+        return str(v)
+
+    header = "| " + " | ".join(str(c) for c in df.columns) + " |"
+    sep = "| " + " | ".join("---" for _ in df.columns) + " |"
+    rows = ["| " + " | ".join(fmt(v) for v in row) + " |" for row in df.itertuples(index=False)]
+    return "\n".join([header, sep, *rows])
+
+
+class TableStore:
+    """Long-format numeric store: one row per parsed table cell."""
+
+    COLUMNS = ["table_id", "file", "row_label", "label_norm", "column", "period", "value", "is_percent"]
+
+    def __init__(self, frame: Optional[pd.DataFrame] = None):
+        self.frame = frame if frame is not None else pd.DataFrame(columns=self.COLUMNS)
+
+    @classmethod
+    def from_tables(cls, tables: List[pd.DataFrame]) -> "TableStore":
+        long_frames = []
+        for table_id, table in enumerate(tables):
+            if table is None or table.empty or table.shape[1] < 2:
+                continue
+            df = table.copy()
+            df.columns = _unique_columns(df.columns)
+            label_col = cls._label_column(df)
+            if label_col is None:
+                continue
+            value_cols = [c for c in df.columns if c != label_col]
+            long = df.melt(id_vars=[label_col], value_vars=value_cols, var_name="column", value_name="raw")
+            long = long.rename(columns={label_col: "row_label"})
+            long["table_id"] = table_id
+            long["file"] = table.attrs.get("source", {}).get("file", "")
+            long_frames.append(long)
+
+        if not long_frames:
+            return cls()
+
+        frame = pd.concat(long_frames, ignore_index=True)
+        frame = frame.join(parse_financial_values(frame["raw"]))
+        frame = frame[frame["value"].notna() & frame["row_label"].notna()].drop(columns=["raw"])
+        frame["row_label"] = frame["row_label"].astype(str).str.strip()
+        frame["label_norm"] = normalize_label(frame["row_label"])
+        periods = {c: period_from_header(c) for c in frame["column"].unique()}
+        frame["period"] = frame["column"].map(periods).astype("Int64")
+        frame["file"] = frame["file"].astype("category")
+        frame["column"] = frame["column"].astype("category")
+        return cls(frame[cls.COLUMNS].reset_index(drop=True))
+
+    @staticmethod
+    def _label_column(df: pd.DataFrame) -> Optional[str]:
+        """First column that is mostly non-numeric text: the line-item labels."""
+        for c in df.columns:
+            col = df[c].dropna()
+            if col.empty:
+                continue
+            numeric_share = parse_financial_values(col)["value"].notna().mean()
+            if numeric_share < 0.5:
+                return c
+        return None
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def line_items(self) -> List[str]:
+        return sorted(self.frame["label_norm"].unique().tolist())
+
+    def _item_mask(self, item: str) -> pd.Series:
+        norm = normalize_label(pd.Series([item])).iloc[0]
+        exact = self.frame["label_norm"] == norm
+        if exact.any():
+            return exact
+        mask = pd.Series(True, index=self.frame.index)
+        for word in norm.split():
+            mask &= self.frame["label_norm"].str.contains(rf"\b{re.escape(word)}\b", regex=True)
+        return mask
+
+    def lookup(self, item: str, period: Optional[int] = None) -> pd.DataFrame:
+        """All values of a line item (exact label first, else every label containing its words)."""
+        mask = self._item_mask(item)
+        if period is not None:
+            mask &= self.frame["period"].eq(period).fillna(False).astype(bool)
+        return self.frame[mask]
+
+    def compare(self, item: str, periods: List[int]) -> pd.DataFrame:
+        """Pivot a line item across periods; with two periods adds absolute and % change."""
+        rows = self.lookup(item)
+        rows = rows[rows["period"].isin(periods).fillna(False).astype(bool)]
+        if rows.empty:
+            return pd.DataFrame()
+        pivot = rows.pivot_table(index="row_label", columns="period", values="value", aggfunc="first")
+        pivot = pivot.reindex(columns=[p for p in periods if p in pivot.columns])
+        if pivot.shape[1] == 2:
+            first, last = pivot.columns[0], pivot.columns[1]
+            pivot["change"] = pivot[last] - pivot[first]
+            pivot["change_%"] = np.where(pivot[first] != 0, pivot["change"] / pivot[first].abs() * 100, np.nan)
+        return pivot
+
+    def aggregate(self, item: Optional[str] = None, agg: str = "sum", by: str = "period") -> pd.Series:
+        """Aggregate values (sum / mean / min / max ...) of an item, or of everything, grouped by ``by``."""
+        rows = self.frame if item is None else self.lookup(item)
+        return rows.groupby(by, observed=True)["value"].agg(agg)
+
+    def match_item(self, question: str) -> Optional[str]:
+        """Longest line item whose every word appears in the question."""
+        q_words = set(re.findall(r"[a-z0-9&%]+", question.lower())) - QUERY_STOPWORDS
+        best = None
+        for label in self.line_items:
+            words = label.split()
+            if not set(words) - GENERIC_LABEL_WORDS:
+                continue
+            if all(w in q_words for w in words) and (best is None or len(words) > len(best.split())):
+                best = label
+        return best
+
+    def answer(self, question: str) -> Optional[str]:
+        """Answer a numeric line-item question from the tables, or None if it isn't one."""
+        if self.frame.empty or needs_llm(question):
+            return None
+        item = self.match_item(question)
+        if item is None:
+            return None
+        periods = periods_in_text(question)
+        q = question.lower()
+
+        if AVERAGE_RE.search(q):
+            result = self.aggregate(item, agg="mean")
+            return f"Average of **{item}** by period (from extracted tables):\n\n" + to_markdown(result.to_frame("average"))
+        if re.search(r"\b(sum|total of|aggregate)\b", q):
+            result = self.aggregate(item, agg="sum")
+            return f"Sum of **{item}** by period (from extracted tables):\n\n" + to_markdown(result.to_frame("sum"))
+        if len(periods) >= 2:
+            table = self.compare(item, periods)
+            if not table.empty:
+                return f"**{item}** across {', '.join(map(str, periods))} (from extracted tables):\n\n" + to_markdown(table)
+        rows = self.lookup(item, period=periods[0] if len(periods) == 1 else None)
+        if rows.empty:
+            return None
+        shown = rows[["row_label", "column", "value", "file"]].head(20)
+        return f"**{item}** (from extracted tables):\n\n" + to_markdown(shown, index=False)
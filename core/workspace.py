@@ -0,0 +1,61 @@
+"""workspace.py
+A pre-built, on-disk workspace: the retriever's index plus the parsed corpus
+(tables, page/sheet sources) that the app needs to answer questions,
+so a deployment can open filings ingested offline (``python -m core.cli``)
+without parsing or embedding anything at startup.
+
+Layout of ``<path>/``:
+- ``index/``       written by ``EmbedderRetriever.save``
+- ``corpus.json``  page/sheet sources
+- ``tables.pkl``   extracted tables (list of DataFrames)
+- ``kpis.json``    precomputed KPI values per file (``KPIStore``)
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .embeddings_retrieval import EmbedderRetriever
+from .kpis import KPIStore
+
+
+def workspace_exists(path: Optional[str]) -> bool:
+    return bool(path) and (Path(path) / "corpus.json").exists() and (Path(path) / "index" / "meta.json").exists()
+
+
+def save_workspace(path: str, retriever: EmbedderRetriever, tables: List[pd.DataFrame], sources: List[Dict],
+                   kpis: Optional[KPIStore] = None):
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    retriever.save(str(root / "index"))
+    pd.to_pickle(tables, root / "tables.pkl.tmp")
+    os.replace(root / "tables.pkl.tmp", root / "tables.pkl")
+    if kpis is not None:
+        with open(root / "kpis.json.tmp", "w", encoding="utf-8") as fh:
+            json.dump(kpis.to_dict(), fh, default=str)
+        os.replace(root / "kpis.json.tmp", root / "kpis.json")
+    # corpus.json is written last: its presence marks a complete workspace.
+    with open(root / "corpus.json.tmp", "w", encoding="utf-8") as fh:
+        json.dump({"sources": sources}, fh)
+    os.replace(root / "corpus.json.tmp", root / "corpus.json")
+
+
+def load_workspace(path: str, retriever: EmbedderRetriever) -> Tuple[List[pd.DataFrame], List[Dict]]:
+    """Load the index into ``retriever`` and return the ``(tables, sources)`` pair."""
+    root = Path(path)
+    retriever.load(str(root / "index"))
+    tables = pd.read_pickle(root / "tables.pkl")
+    with open(root / "corpus.json", "r", encoding="utf-8") as fh:
+        corpus = json.load(fh)
+    return tables, corpus["sources"]
+
+
+def load_kpis(path: str, tables: List[pd.DataFrame]) -> KPIStore:
+    """The workspace's KPI store; workspaces saved without one get a table-only extraction from ``tables``."""
+    kpi_path = Path(path) / "kpis.json"
+    if not kpi_path.exists():
+        return KPIStore.from_tables(tables)
+    with open(kpi_path, "r", encoding="utf-8") as fh:
+        return KPIStore(json.load(fh))
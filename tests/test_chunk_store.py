@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from core.chunk_store import ChunkStore
+
+
+def chunk(cid: int, file_id: str = "annual.pdf", text: str = None, **source) -> dict:
+    return {"id": cid, "file_id": file_id, "text": text or f"Chunk {cid}: revenue was {cid * 100}.",
+            "source": {"file": file_id, **source}}
+
+
+CHUNKS = [
+    chunk(0, page=1, types=["balance_sheet", "income_statement"]),
+    chunk(1, page=2, ocr=True),
+    dict(chunk(2, "q1.xlsx", text="Umsatz € 1.234 — Q1", sheet="P&L", rows="1-40"), char_start=0, char_end=19),
+    chunk(3, "q1.xlsx", sheet="P&L", rows="41-80", types=["income_statement", "cash_flow"], note="kept"),
+    dict(chunk(4, page=3), table_id=7),
+]
+
+
+@pytest.fixture
+def store() -> ChunkStore:
+    s = ChunkStore()
+    s.extend(CHUNKS)
+    return s
+
+
+def test_chunks_round_trip(store):
+    assert len(store) == len(CHUNKS)
+    assert [store[c["id"]] for c in CHUNKS] == CHUNKS
+    assert list(store) == CHUNKS
+    assert list(store.iter_texts()) == [(c["id"], c["text"]) for c in CHUNKS]
+
+
+def test_lookups(store):
+    assert 2 in store and 9 not in store and store.get(9) is None
+    with pytest.raises(KeyError):
+        store[9]
+    assert store.contains(np.array([4, 5, -1, 0])).tolist() == [True, False, False, True]
+    assert store.file_counts() == {"annual.pdf": 3, "q1.xlsx": 2}
+    assert store.ids_of_file("q1.xlsx").tolist() == [2, 3] and store.ids_of_file("missing.pdf").size == 0
+    assert store.ids_of_types(["cash_flow"]).tolist() == [3]
+    assert store.ids_of_types(["income_statement", "unknown"]).tolist() == [0, 3]
+
+
+def test_ids_must_increase(store):
+    with pytest.raises(ValueError):
+        store.extend([chunk(4)])
+    with pytest.raises(ValueError):
+        ChunkStore().extend([chunk(2), chunk(1)])
+
+
+def test_remove_tombstones_then_compacts(store):
+    assert store.remove([1, 42]) == 1
+    assert len(store) == 4 and 1 not in store and store._dead == 1
+    assert store.remove([1]) == 0
+    assert store.remove([0]) == 1  # 2 of 5 rows dead: over a quarter, so the store compacts
+    assert store._dead == 0 and store._n == 3
+    assert list(store) == [CHUNKS[2], CHUNKS[3], CHUNKS[4]]
+    assert store.file_counts() == {"annual.pdf": 1, "q1.xlsx": 2}
+
+
+def test_save_and_load(store, tmp_path):
+    store.remove([1])
+    store.save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    assert isinstance(loaded._cols["id"], np.memmap) and not loaded._writable
+    assert list(loaded) == [c for c in CHUNKS if c["id"] != 1]
+    assert loaded.file_counts() == {"annual.pdf": 2, "q1.xlsx": 2}
+    assert loaded.ids_of_types(["balance_sheet"]).tolist() == [0]
+
+
+def test_extend_and_remove_after_load(store, tmp_path):
+    store.save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    loaded.extend([chunk(10, "q2.pdf", page=1)])
+    assert loaded._writable and not isinstance(loaded._cols["id"], np.memmap)
+    assert loaded.remove([0]) == 1
+    assert loaded.ids().tolist() == [1, 2, 3, 4, 10]
+    assert loaded[10] == chunk(10, "q2.pdf", page=1)
+    # The files on disk are untouched.
+    assert list(ChunkStore.load(str(tmp_path))) == CHUNKS
+
+
+def test_empty_store_saves_and_loads(tmp_path):
+    ChunkStore().save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    assert len(loaded) == 0 and list(loaded) == [] and loaded.file_counts() == {}
+    assert loaded.contains(np.array([0])).tolist() == [False]
@@ -0,0 +1,59 @@
+import io
+import tempfile
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from benchmarks.synthetic import make_pdf
+from core.document_parser import DocumentParser
+from core.processing_utils import rows_to_text, stream_chunks
+
+
+def workbook(rows) -> bytes:
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def test_rows_to_text_flattens_line_breaks_in_cells():
+    frame = pd.DataFrame([["Rent\nJanuary", "1,200"], ["Fees\r\n  (net)", None]])
+    assert rows_to_text(frame).tolist() == ["Rent January | 1,200", "Fees (net) | "]
+
+
+def test_wrapped_cells_keep_every_row_in_the_index():
+    rows = [["Item", "Amount\n(USD)"], ["Rent\nJanuary", 1200]] + [[f"Item {i}", i * 100] for i in range(1, 5)]
+    records = list(DocumentParser(max_workers=1).iter_excel_sheets(workbook(rows), "ledger.xlsx"))
+    assert len(records) == 1
+    chunks = list(stream_chunks(records))
+    assert [c["source"]["rows"] for c in chunks] == ["2-6"]
+    text = chunks[0]["text"]
+    assert text.splitlines() == ["Item | Amount (USD)", "Rent January | 1200", "Item 1 | 100", "Item 2 | 200",
+                                 "Item 3 | 300", "Item 4 | 400"]
+
+
+@pytest.fixture
+def parallel_parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))  # the parser's temp PDFs land here
+    parser = DocumentParser(max_workers=2)
+    yield parser
+    parser.close()
+
+
+def test_closing_iterators_releases_unread_pdfs(parallel_parser, tmp_path):
+    files = [(make_pdf(12, seed=i), f"report_{i}.pdf") for i in range(3)]
+    iterators = parallel_parser.iter_many(files)
+    assert len(list(tmp_path.glob("*.pdf"))) == 3
+    assert next(iterators[0])["source"]["page"] == 1
+    for pages in iterators:  # e.g. embedding report_0 failed: report_1 and report_2 were never started
+        pages.close()
+    assert list(tmp_path.glob("*.pdf")) == []
+
+
+def test_parse_many_reads_every_page(parallel_parser, tmp_path):
+    results = parallel_parser.parse_many([(make_pdf(12, seed=i), f"report_{i}.pdf") for i in range(2)])
+    assert [len(sources) for _, _, sources in results] == [12, 12]
+    assert list(tmp_path.glob("*.pdf")) == []
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.embeddings_retrieval import EmbedderRetriever
+from core.index_registry import IndexRegistry
+from core.workspace import save_workspace
+
+DIM = 8
+
+
+def add_file(retriever: EmbedderRetriever, file_id: str, texts):
+    retriever._dim = DIM  # no embedding model here; the vectors are given
+    embs = np.random.default_rng(len(texts)).random((len(texts), DIM), dtype="float32")
+    retriever.add_chunks(file_id, [{"text": t} for t in texts], embs=embs)
+
+
+@pytest.fixture
+def seed_dir(tmp_path):
+    retriever = EmbedderRetriever()
+    add_file(retriever, "annual.pdf", ["Revenue was 4,512 in 2023.", "Net income was 610 in 2023."])
+    table = pd.DataFrame({"Metric": ["Revenue"], "2023": [4512]})
+    save_workspace(str(tmp_path / "seed"), retriever, [table], [{"file": "annual.pdf", "page": 1}])
+    return str(tmp_path / "seed")
+
+
+def make_registry(tmp_path, seed_dir, **kwargs) -> IndexRegistry:
+    return IndexRegistry(spill_dir=str(tmp_path / "spill"), memory_budget_mb=100, seed_dir=seed_dir, **kwargs)
+
+
+def test_sessions_share_one_read_only_seed(tmp_path, seed_dir):
+    registry = make_registry(tmp_path, seed_dir)
+    with registry.checkout("session-a") as a, registry.checkout("session-b") as b:
+        assert a is b and a.shared
+        assert a.retriever.file_ids == ["annual.pdf"] and len(a.tables) == 1
+    stats = registry.stats()
+    assert stats["in_memory"] == 2 and stats["on_seed"] == 2 and stats["seed_copies"] == 0
+    assert stats["memory_mb"] * 2**20 == pytest.approx(a.memory_bytes())
+
+
+def test_first_write_copies_the_seed(tmp_path, seed_dir):
+    registry = make_registry(tmp_path, seed_dir)
+    with registry.checkout("session-a") as seed:
+        pass
+    with registry.checkout("session-a", write=True) as private:
+        assert private is not seed and not private.shared
+        add_file(private.retriever, "q1.pdf", ["Revenue was 1,200 in Q1."])
+    with registry.checkout("session-a") as again, registry.checkout("session-b") as other:
+        assert again is private and other is seed
+        assert sorted(again.retriever.file_ids) == ["annual.pdf", "q1.pdf"]
+        assert other.retriever.file_ids == ["annual.pdf"]
+    assert registry.stats()["seed_copies"] == 1
+
+
+def test_idle_workspaces_are_released_and_changes_reload(tmp_path, seed_dir):
+    registry = make_registry(tmp_path, seed_dir, idle_ttl_minutes=0.01 / 60)
+    with registry.checkout("session-a", write=True) as ws:
+        add_file(ws.retriever, "q1.pdf", ["Revenue was 1,200 in Q1."])
+    time.sleep(0.02)
+    with registry.checkout("session-b"):
+        pass
+    assert registry.stats()["in_memory"] == 1 and registry.stats()["spilled"] == 1
+    with registry.checkout("session-a") as ws:
+        assert not ws.shared and sorted(ws.retriever.file_ids) == ["annual.pdf", "q1.pdf"]
+    assert registry.reloads == 1
+
+
+def test_without_a_seed_each_key_starts_empty(tmp_path):
+    registry = make_registry(tmp_path, "")
+    with registry.checkout("session-a") as a, registry.checkout("session-b") as b:
+        assert a is not b and not a.shared and a.retriever.file_ids == []
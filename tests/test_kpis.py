@@ -0,0 +1,125 @@
+import pandas as pd
+import pytest
+
+from core.kpis import KPIStore, extract_kpis, kpi_for_label
+
+STATEMENT = """Consolidated Statement of Profit and Loss
+(Rs. in crores)
+Particulars Note FY 2022-23 FY 2021-22
+Revenue from operations 21 12,345.6 10,987.0
+Other income 22 120.5 98.1
+Total income 12,466.1 11,085.1
+Gross profit 5,000 4,400
+Operating profit 2,000 1,800
+Profit for the year 1,234.5 (110.2)
+"""
+
+
+def balance_sheet() -> pd.DataFrame:
+    table = pd.DataFrame([["Total assets", "50,000", "45,000"], ["Total equity", "20,000", "17,000"],
+                          ["Net cash from operating activities", "3,000", "2,500"]],
+                         columns=["Particulars", "31-03-2023", "31-03-2022"])
+    table.attrs["source"] = {"file": "a.pdf", "page": 5, "types": ["balance_sheet"]}
+    return table
+
+
+@pytest.fixture
+def store() -> KPIStore:
+    records = extract_kpis({"text": STATEMENT, "tables": [],
+                            "source": {"file": "a.pdf", "page": 3, "types": ["income_statement"]}})
+    records += extract_kpis({"text": "", "tables": [balance_sheet()], "source": {"file": "a.pdf", "page": 5}})
+    kpis = KPIStore()
+    kpis.set_file("a.pdf", records)
+    return kpis
+
+
+def value(store: KPIStore, kpi: str, period: int) -> float:
+    return float(store.lookup(kpi, periods=[period])["value"].iloc[0])
+
+
+def test_extracts_text_lines_and_table_rows(store):
+    assert value(store, "revenue", 2023) == 12345.6
+    assert value(store, "net_income", 2022) == -110.2
+    assert value(store, "total_assets", 2022) == 45000.0
+    assert value(store, "operating_cash_flow", 2023) == 3000.0
+    assert store.lookup("revenue", periods=[2023]).iloc[0]["provenance"] == "a.pdf p.3: Revenue from operations [2023]"
+    # "Total income" is not revenue.
+    assert len(store.lookup("revenue")) == 2
+
+
+def test_derived_margins_and_growth(store):
+    assert value(store, "net_margin", 2023) == pytest.approx(1234.5 / 12345.6 * 100)
+    assert value(store, "revenue_growth", 2023) == pytest.approx((12345.6 - 10987.0) / 10987.0 * 100)
+    # Growth over a negative base is measured against its magnitude.
+    assert value(store, "net_income_growth", 2023) == pytest.approx((1234.5 + 110.2) / 110.2 * 100)
+
+
+@pytest.mark.parametrize("label, kpi", [
+    ("net cash generated from operating activities", "operating_cash_flow"),
+    ("revenue from operations", "revenue"),
+    ("profit after tax", "net_income"),
+    ("total income", None),
+    ("profit before tax", None),
+])
+def test_kpi_for_label(label, kpi):
+    assert kpi_for_label(label) == kpi
+
+
+@pytest.mark.parametrize("question, kpi", [
+    ("What was net income in FY23?", "net_income"),
+    ("revenue 2023 vs 2022", "revenue"),
+    ("net sales 2022", "revenue"),
+    ("What is the net profit margin?", "net_margin"),
+    ("revenue growth in 2023", "revenue_growth"),
+    ("cash from operating activities 2022", "operating_cash_flow"),
+    ("total shareholders' equity", "total_equity"),
+    ("How did revenue change from 2022 to 2023?", "revenue"),
+    ("What was the change in revenue between 2022 and 2023?", "revenue"),
+    ("net cash provided by operating activities in 2023", "operating_cash_flow"),
+])
+def test_answers_kpi_questions(store, question, kpi):
+    assert KPIStore.match(question) == kpi
+    assert store.answer(question) is not None
+
+
+def test_answer_keeps_to_asked_periods(store):
+    answer = store.answer("What was net income in FY23?")
+    assert "1,234.50" in answer and "-110.20" not in answer
+
+
+@pytest.mark.parametrize("question", [
+    "What was cost of sales in 2023?",
+    "What were sales and marketing expenses?",
+    "What was return on equity?",
+    "What is the debt to equity ratio?",
+    "What was equity in 2023?",
+    "What drove net income?",
+    "Why did revenue fall in 2023?",
+    "What caused the change in total assets?",
+    "How did revenue change?",
+    "What is the CEO's name?",
+    "What is the revenue recognition policy?",
+    "How is revenue recognized?",
+    "How much deferred revenue is there?",
+    "Which segment had the highest revenue?",
+    "What was revenue by geography in 2023?",
+    "revenue per employee",
+    "What was net income attributable to minority interest?",
+    "What percentage of revenue was net income?",
+])
+def test_leaves_other_questions_to_the_llm(store, question):
+    assert store.answer(question) is None
+
+
+def test_unknown_period_and_removed_file_fall_through(store):
+    assert store.answer("What was revenue in 2019?") is None
+    store.remove_file("a.pdf")
+    assert store.answer("What was revenue in 2023?") is None
+    assert store.summary().empty
+
+
+def test_from_tables_reads_table_rows_only():
+    kpis = KPIStore.from_tables([balance_sheet()])
+    assert kpis.files == ["a.pdf"]
+    assert value(kpis, "total_equity", 2023) == 20000.0
+    assert kpis.lookup("revenue").empty
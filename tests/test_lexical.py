@@ -0,0 +1,53 @@
+import pytest
+
+from core.lexical import BM25Index, NumberIndex, normalize_number, rrf_fuse, tokenize
+
+
+def test_rrf_scores_are_summed_reciprocal_ranks():
+    fused = dict(rrf_fuse([[1, 2, 3], [3, 1]], k=60))
+    assert fused[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2] == pytest.approx(1 / 62)
+    assert fused[3] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_rewards_agreement_between_lists():
+    # 7 is never first but near the top of both lists, so it beats either list's winner.
+    ranked = [doc_id for doc_id, _ in rrf_fuse([[1, 7, 2], [3, 7, 4]])]
+    assert ranked[0] == 7
+    assert set(ranked) == {1, 2, 3, 4, 7}
+
+
+def test_rrf_edge_cases():
+    assert rrf_fuse([]) == [] and rrf_fuse([[], []]) == []
+    assert [d for d, _ in rrf_fuse([[5, 6, 7]])] == [5, 6, 7]
+    # Any iterables are accepted; tied scores keep the order ids were first seen in.
+    assert [d for d, _ in rrf_fuse([iter([2, 1]), (1, 2)])] == [2, 1]
+
+
+def test_numbers_are_normalized():
+    assert normalize_number("4,512.70") == "4512.7"
+    assert normalize_number("(1,200)") == "-1200"
+    assert normalize_number("$0.50") == "0.5"
+    assert normalize_number("n/a") == ""
+    assert tokenize("Revenue of $4,512.0 in FY2023") == ["revenue", "4512", "fy2023"]
+
+
+def test_bm25_matches_exact_tokens_and_supports_removal():
+    index = BM25Index()
+    index.add(0, "EBITDA rose to 1,200 in FY2023")
+    index.add(1, "Revenue rose in FY2022")
+    index.add(2, "Dividends were paid")
+    assert [d for d, _ in index.search("EBITDA FY2023")] == [0]  # "fy2022" is a different token
+    assert [d for d, _ in index.search("rose")] == [1, 0]  # the shorter chunk ranks first
+    assert [d for d, _ in index.search("FY2023 EBITDA", allowed={1, 2})] == []
+    index.remove(0)
+    assert index.search("EBITDA") == [] and len(index) == 2
+
+
+def test_number_index_finds_quoted_values():
+    index = NumberIndex()
+    index.add(0, "Net loss of (1,200) on revenue of 4,512.7")
+    index.add(1, "Revenue of 4512.70 in 2023, page 12")
+    assert [d for d, _ in index.search("what was the 4,512.7 figure")] == [0, 1]
+    assert index.search("loss of -1200") == [(0, 1.0)]
+    assert index.search("page 12") == []  # small integers are not indexed
@@ -0,0 +1,30 @@
+import pytest
+
+from core.processing_utils import clean_text, stream_chunks
+
+WORDS = " ".join(f"word{i:04d}" for i in range(2000))
+
+
+def chunks(size: int, overlap: int = 150):
+    return list(stream_chunks([{"text": WORDS, "source": {"file": "a.pdf", "page": 1}}], max_chunk_size=size,
+                              overlap=overlap))
+
+
+@pytest.mark.parametrize("size", [50, 100, 800])
+def test_chunks_cover_the_page_and_advance(size):
+    out = chunks(size)
+    assert out[0]["char_start"] == 0 and out[-1]["char_end"] == len(WORDS)
+    assert all(len(c["text"]) <= size for c in out)
+    assert all(b["char_start"] > a["char_start"] for a, b in zip(out, out[1:]))
+    # Overlap is capped at a quarter of the chunk, so a small chunk size can't degrade to one word per step.
+    assert len(out) <= len(WORDS) / (size * 0.75 - 9) + 1
+
+
+def test_chunks_carry_source_and_offsets():
+    for c in chunks(200):
+        assert c["source"] == {"file": "a.pdf", "page": 1}
+        assert WORDS[c["char_start"]:c["char_end"]] == c["text"]
+
+
+def test_clean_text_strips_digit_grouping_only():
+    assert clean_text("₹ 50,00,000, and 1,234") == "5000000, and 1234"
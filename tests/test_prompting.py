@@ -0,0 +1,85 @@
+from core.prompting import (ConversationMemory, TokenCounter, dedupe_results, plan_prompt, summarize_turn,
+                            to_turns)
+
+
+def hit(text: str, page: int, score: float = 1.0, char_start=None, file: str = "annual.pdf"):
+    item = {"text": text, "source": {"file": file, "page": page}}
+    if char_start is not None:
+        item.update(char_start=char_start, char_end=char_start + len(text))
+    return score, item
+
+
+def history(n_turns: int, words: int = 40):
+    messages = []
+    for i in range(n_turns):
+        messages.append(("user", f"Question {i} about revenue?"))
+        messages.append(("assistant", f"Answer {i}. " + "detail " * words))
+    return messages
+
+
+def test_overlapping_windows_are_merged_and_repeats_dropped():
+    page = "Revenue grew 12% to 4,512. Net income was 610. Dividends of 1.20 per share were paid."
+    results = [hit(page[20:60], 3, 0.9, char_start=20), hit(page[0:30], 3, 0.8, char_start=0),
+               hit(page[70:], 4, 0.7, char_start=70), hit("  Net income was 610.", 5, 0.6),
+               hit("net income   was 610.", 6, 0.5)]
+    merged = dedupe_results(results)
+    assert [item["text"] for _, item in merged] == [page[0:60], page[70:], "  Net income was 610."]
+    assert merged[0][0] == 0.9 and (merged[0][1]["char_start"], merged[0][1]["char_end"]) == (0, 60)
+
+
+def test_context_is_packed_in_rank_order_within_budget():
+    counter = TokenCounter()
+    results = [hit(f"Chunk {i}: " + "revenue " * 60, page=i, score=1 - i / 10) for i in range(8)]
+    plan = plan_prompt("What was revenue?", results, budget=600, counter=counter)
+    assert plan.tokens <= plan.budget == 600
+    kept = [item["source"]["page"] for _, item in plan.context]
+    assert kept == list(range(len(kept))) and 0 < len(kept) < 8
+    assert plan.dropped_chunks == 8 - len(kept) and plan.merged_chunks == 0
+    assert plan.prompt.index("CONTEXT:") < plan.prompt.index("USER QUESTION:\nWhat was revenue?")
+
+
+def test_smaller_chunks_fill_the_space_a_large_one_leaves():
+    results = [hit("small " * 20, 1, 0.9), hit("large " * 400, 2, 0.8), hit("tail " * 20, 3, 0.7)]
+    plan = plan_prompt("q", results, budget=400, counter=TokenCounter())
+    assert [item["source"]["page"] for _, item in plan.context] == [1, 3] and plan.dropped_chunks == 1
+    assert plan.tokens <= 400
+
+
+def test_oversized_best_chunk_is_truncated_not_dropped():
+    plan = plan_prompt("q", [hit("revenue " * 2000, 1)], budget=500, counter=TokenCounter())
+    assert len(plan.context) == 1 and plan.dropped_chunks == 0
+    assert plan.tokens <= 500
+
+
+def test_old_turns_are_summarized_and_recent_ones_kept():
+    counter, memory = TokenCounter(), ConversationMemory()
+    plan = plan_prompt("And in 2023?", [], history(12), memory=memory, budget=2000, counter=counter)
+    assert plan.summarized_turns > 0 and plan.recent_turns > 0
+    assert plan.summarized_turns + plan.recent_turns == 12
+    assert "EARLIER CONVERSATION (summary):\n- Q: Question 0 about revenue? A: Answer 0." in plan.prompt
+    assert "User: Question 11 about revenue?" in plan.prompt
+    assert plan.tokens <= 2000
+
+    # The summary is kept between questions and only grows by whole batches.
+    again = plan_prompt("And in 2024?", [], history(13), memory=memory, budget=2000, counter=counter)
+    assert again.summarized_turns == plan.summarized_turns
+    assert again.prompt.split("CONVERSATION:\n")[0] == plan.prompt.split("CONVERSATION:\n")[0]
+
+
+def test_short_history_is_verbatim():
+    plan = plan_prompt("q", [], history(2, words=3), budget=2000, counter=TokenCounter())
+    assert plan.summarized_turns == 0 and plan.recent_turns == 2 and "EARLIER CONVERSATION" not in plan.prompt
+
+
+def test_turn_helpers():
+    assert to_turns([("user", "a"), ("assistant", "b"), ("user", "c")]) == [("a", "b"), ("c", "")]
+    assert summarize_turn("What was revenue?", "It was 4,512. It grew 12%.") == "- Q: What was revenue? A: It was 4,512."
+    assert len(summarize_turn("q", "x" * 1000)) == 240
+
+
+def test_token_counter_calibration_ignores_cache_hits():
+    counter = TokenCounter(chars_per_token=4.0)
+    counter.calibrate("x" * 300, 100)
+    assert counter.chars_per_token == 0.8 * 4.0 + 0.2 * 3.0
+    counter.calibrate("x" * 3000, 10)  # most of the prompt came from Ollama's cache
+    assert counter.chars_per_token == 0.8 * 4.0 + 0.2 * 3.0
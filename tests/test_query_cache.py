@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+
+from core.query_cache import AnswerCache, LRUCache, normalize_question
+
+
+def unit(*values) -> np.ndarray:
+    v = np.asarray(values, dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+def test_lru_evicts_least_recently_used_and_counts_hits():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None and len(cache) == 0
+
+
+def test_exact_key_ignores_case_and_punctuation():
+    cache = AnswerCache()
+    cache.put(AnswerCache.make_key("What was revenue?", "v1", "llama2", 0.0, [1, 2]), "42")
+    assert normalize_question("  WHAT was revenue ") == "what was revenue"
+    assert cache.get(AnswerCache.make_key("what was  REVENUE", "v1", "llama2", 0.0, [1, 2])) == "42"
+    assert cache.get(AnswerCache.make_key("what was revenue", "v2", "llama2", 0.0, [1, 2])) is None
+
+
+@pytest.fixture
+def semantic() -> AnswerCache:
+    cache = AnswerCache(semantic_threshold=0.9)
+    key = AnswerCache.make_key("What was revenue in 2022?", "v1", "llama2", 0.0, [1, 2])
+    cache.put(key, "2022 answer", query_embedding=unit(1, 0.01))
+    return cache
+
+
+def test_semantic_hit_for_a_rephrased_question(semantic):
+    key = AnswerCache.make_key("Revenue for 2022, please", "v1", "llama2", 0.0, [1, 2])
+    assert semantic.get(key, query_embedding=unit(1, 0.02)) == "2022 answer"
+    assert semantic.stats()["semantic_hits"] == 1
+
+
+@pytest.mark.parametrize("question, chunk_ids", [
+    ("What was revenue in 2023?", [1, 2]),  # different year
+    ("What was revenue in 2022?", [1, 3]),  # different retrieved chunks
+])
+def test_semantic_match_requires_same_numbers_and_chunks(semantic, question, chunk_ids):
+    key = AnswerCache.make_key(question, "v1", "llama2", 0.0, chunk_ids)
+    assert semantic.get(key, query_embedding=unit(1, 0.01)) is None
+
+
+def test_semantic_matching_is_off_without_threshold():
+    cache = AnswerCache()
+    cache.put(AnswerCache.make_key("revenue 2022", "v1", "m", 0.0), "x", query_embedding=unit(1, 0))
+    assert cache.get(AnswerCache.make_key("2022 revenue", "v1", "m", 0.0), query_embedding=unit(1, 0)) is None
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.table_store import TableStore, parse_financial_values, period_from_header
+
+
+@pytest.fixture
+def store() -> TableStore:
+    table = pd.DataFrame([["Revenue", "1,100", "900"], ["Total income", "1,200", "1,000"],
+                          ["Employee costs", "(300)", "250"]],
+                         columns=["Particulars", "FY 2022-23", "FY 2021-22"])
+    table.attrs["source"] = {"file": "a.pdf", "page": 2}
+    return TableStore.from_tables([table])
+
+
+def test_parses_financial_formats():
+    parsed = parse_financial_values(pd.Series(["(1,234)", "12,34,567", "₹ 2.5 crore", "12%", "n/a"]))
+    assert parsed["value"].tolist()[:4] == [-1234.0, 1234567.0, 2.5e7, 12.0]
+    assert np.isnan(parsed["value"].iloc[4])
+    assert parsed["is_percent"].tolist() == [False, False, False, True, False]
+
+
+@pytest.mark.parametrize("header, year", [("FY 2022-23", 2023), ("31-03-2022", 2022), ("FY23", 2023), ("Note", None)])
+def test_period_from_header(header, year):
+    assert period_from_header(header) == year
+
+
+def test_answers_lookups_comparisons_and_averages(store):
+    assert "1,200.00" in store.answer("total income 2023")
+    assert "change" in store.compare("total income", [2022, 2023]).columns
+    assert store.answer("average employee costs").startswith("Average of **employee costs**")
+
+
+@pytest.mark.parametrize("question", [
+    "How did total income change from 2022 to 2023?",
+    "What was the change in total income between FY22 and FY23?",
+])
+def test_period_changes_are_compared(store, question):
+    assert store.answer(question).startswith("**total income** across 2022, 2023")
+
+
+@pytest.mark.parametrize("question", [
+    "What does total income mean?",
+    "Why did employee costs rise?",
+    "What drove total income in 2023?",
+    "Explain employee costs",
+    "How did employee costs change?",
+    "What is the revenue recognition policy?",
+    "How much deferred revenue is there?",
+    "What was revenue by segment in 2023?",
+    "employee costs per employee",
+    "What percentage of total income was employee costs?",
+])
+def test_leaves_definitions_and_explanations_to_the_llm(store, question):
+    assert store.answer(question) is None
+
+
+def test_mean_as_a_verb_is_not_an_aggregation(store):
+    assert not store.answer("Is total income in 2023 meaningful?").startswith("Average")
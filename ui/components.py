@@ -2,15 +2,22 @@ import streamlit as st
 from typing import Dict
 import pandas as pd
 
+from core.metrics import InMemoryMetrics, get_metrics, observe, span, trace
+from core.prompting import ConversationMemory, plan_prompt, token_counter
+
 def render_sidebar() -> Dict:
     st.sidebar.title("Upload & Settings")
     uploaded_files = st.sidebar.file_uploader("Upload PDF or Excel files", type=['pdf','xls','xlsx'], accept_multiple_files=True)
     process_docs_btn = st.sidebar.button("Process Documents")
+    workspace = st.sidebar.text_input("Workspace (optional)", value="",
+                                      help="Everyone who enters the same name shares its documents and index. "
+                                           "Leave empty to keep them private to this session.").strip()
     st.sidebar.markdown("---")
     st.sidebar.subheader("Retrieval & Model")
     top_k = st.sidebar.number_input("Top-k retrieval", min_value=1, max_value=20, value=5, step=1)
     temperature = st.sidebar.slider("Model temperature", min_value=0.0, max_value=1.0, value=0.0, step=0.05)
     model_name = st.sidebar.text_input("Ollama model name", value=st.session_state.get('ollama_model', 'llama2'))
+    show_diagnostics = st.sidebar.checkbox("Show diagnostics", value=False)
 
     # store certain settings to session_state for cross-component access
     st.session_state['top_k'] = top_k
@@ -20,16 +27,107 @@ def render_sidebar() -> Dict:
     return {
         'uploaded_files': uploaded_files,
         'process_docs_btn': process_docs_btn,
+        'workspace': workspace,
         'top_k': top_k,
         'temperature': temperature,
-        'model_name': model_name
+        'model_name': model_name,
+        'show_diagnostics': show_diagnostics
     }
 
 def _download_button_df(df: pd.DataFrame, filename: str, label: str):
     csv = df.to_csv(index=False).encode('utf-8')
     st.download_button(label, data=csv, file_name=filename, mime='text/csv')
 
-def render_chat_and_results(embedder_retriever, ollama_client):
+def _stream_answer(ollama_client, prompt: str, temperature: float) -> str:
+    """Render tokens as they arrive from Ollama and return the full answer.
+
+    Pressing Stop reruns the script, which interrupts this loop; the
+    ``finally`` closes the stream so Ollama stops generating.
+    """
+    placeholder = st.empty()
+    stop_slot = st.empty()
+    stop_slot.button('Stop generating', key='stop_generation')
+    placeholder.markdown('_Waiting for the first token..._')
+    stream = ollama_client.stream(prompt, temperature=temperature)
+    parts = []
+    completed = False
+    try:
+        for token in stream:
+            parts.append(token)
+            placeholder.markdown(f"**Assistant:** {''.join(parts)}▌")
+        completed = True
+    finally:
+        stream.close()
+        if not completed:
+            # Interrupted by Stop / rerun: keep what was generated so far.
+            stream.stats.cancelled = True
+            st.session_state['chat_history'].append(('assistant', ''.join(parts).strip() + ' _(stopped)_'))
+        st.session_state['last_generation_stats'] = stream.stats
+        token_counter.calibrate(prompt, stream.stats.prompt_tokens)
+        placeholder.empty()
+        stop_slot.empty()
+    answer = ''.join(parts).strip()
+    if not answer and stream.stats.error:
+        answer = f'Error calling Ollama: {stream.stats.error}'
+    return answer
+
+def _answer_question(query: str, embedder_retriever, ollama_client, answer_cache=None) -> str:
+    with trace() as spans, span('question') as labels:
+        try:
+            return _answer_question_traced(query, embedder_retriever, ollama_client, answer_cache, labels)
+        finally:
+            st.session_state['last_trace'] = spans
+
+def _answer_question_traced(query: str, embedder_retriever, ollama_client, answer_cache, labels: Dict) -> str:
+    # standard KPI questions are answered from the values precomputed at ingest
+    kpi_store = st.session_state.get('kpi_store')
+    kpi_answer = kpi_store.answer(query) if kpi_store is not None else None
+    if kpi_answer:
+        labels['path'] = 'kpi_store'
+        return kpi_answer
+
+    # numeric line-item questions are answered straight from the extracted tables
+    table_store = st.session_state.get('table_store')
+    table_answer = table_store.answer(query) if table_store is not None else None
+    if table_answer:
+        labels['path'] = 'table_store'
+        return table_answer
+
+    # retrieval
+    top_k = st.session_state.get('top_k', 5)
+    try:
+        results = embedder_retriever.retrieve(query, top_k=top_k)
+    except Exception as e:
+        st.error(f'Retrieval failed: {e}')
+        results = []
+    # the current question was already appended to the history; it goes in its own prompt section
+    history = [m for m in st.session_state['chat_history'] if isinstance(m, tuple)][:-1]
+    if 'conversation_memory' not in st.session_state:
+        st.session_state['conversation_memory'] = ConversationMemory()
+    plan = plan_prompt(query, results, history, memory=st.session_state['conversation_memory'])
+    st.session_state['last_prompt_plan'] = plan
+    prompt = plan.prompt
+    observe('prompt_tokens', plan.tokens)
+    # call Ollama, unless the same question was already answered against the same index/model/chunks
+    temperature = st.session_state.get('temperature', 0.0)
+    ollama_client.model_name = st.session_state.get('ollama_model', ollama_client.model_name)
+    cache_key = q_emb = None
+    if answer_cache is not None:
+        cache_key = answer_cache.make_key(query, embedder_retriever.index_version, ollama_client.model_name,
+                                          temperature, [item.get('id') for _, item in results])
+        q_emb = embedder_retriever.embed_query(query) if embedder_retriever.index is not None else None
+        cached = answer_cache.get(cache_key, query_embedding=q_emb)
+        if cached is not None:
+            labels['path'] = 'answer_cache'
+            return cached
+    labels['path'] = 'llm'
+    answer = _stream_answer(ollama_client, prompt, temperature)
+    stats = st.session_state.get('last_generation_stats')
+    if answer_cache is not None and stats is not None and not stats.error and not stats.cancelled and answer:
+        answer_cache.put(cache_key, answer, query_embedding=q_emb)
+    return answer
+
+def render_chat_and_results(embedder_retriever, ollama_client, answer_cache=None):
     st.header("📊 Financial Document Q&A Assistant")
     cols = st.columns([1,2])
     with cols[0]:
@@ -43,15 +141,14 @@ def render_chat_and_results(embedder_retriever, ollama_client):
         else:
             st.info("No tables to preview.")
         st.markdown('---')
-        st.subheader('Document Metrics (naive extraction)')
-        docs_text = st.session_state.get('docs_text', '')
-        if docs_text:
-            from core.processing_utils import extract_metrics_from_text
-            metrics = extract_metrics_from_text(docs_text)
-            if metrics:
-                st.table(pd.DataFrame(list(metrics.items()), columns=['Metric','Value']))
+        st.subheader('Key Metrics (precomputed at ingest)')
+        kpi_store = st.session_state.get('kpi_store')
+        if st.session_state.get('file_sources'):
+            summary = kpi_store.summary() if kpi_store is not None else pd.DataFrame()
+            if not summary.empty:
+                st.dataframe(summary)
             else:
-                st.info('No obvious metrics found via heuristics.')
+                st.info('No standard metrics found in the documents.')
         else:
             st.info('No document processed yet.')
 
@@ -61,39 +158,74 @@ def render_chat_and_results(embedder_retriever, ollama_client):
             st.session_state['chat_history'] = []
         query = st.text_input('Ask a question about the uploaded documents', key='user_query')
         if st.button('Ask'):
-            if not st.session_state.get('docs_text'):
+            if not st.session_state.get('file_sources'):
                 st.warning('Upload and process documents first.')
             elif not query:
                 st.warning('Enter a question.')
             else:
                 st.session_state['chat_history'].append(('user', query))
-                # retrieval
-                top_k = st.session_state.get('top_k', 5)
-                try:
-                    results = embedder_retriever.retrieve(query, top_k=top_k)
-                except Exception as e:
-                    st.error(f'Retrieval failed: {e}')
-                    results = []
-                context_pieces = []
-                for score, item in results:
-                    src = item.get('source', {})
-                    src_str = f"[file={src.get('file', 'unknown')} page={src.get('page', '')} types={src.get('types', [])}]"
-                    context_pieces.append(src_str + "\\n" + item.get('text',''))
-                context = "\\n\\n---\\n\\n".join(context_pieces)
-                system_prompt = ("You are a helpful financial document assistant. Answer user questions using ONLY the provided context. " 
-                                 "If the answer is not present, say you could not find the information and suggest what to check in the document.")
-                conversation = "\\n".join([f"User: {m[1]}" if m[0]=='user' else f"Assistant: {m[1]}" for m in st.session_state['chat_history'] if isinstance(m, tuple)])
-                prompt = f"SYSTEM:\\n{system_prompt}\\n\\nCONTEXT:\\n{context}\\n\\nCONVERSATION:\\n{conversation}\\n\\nUSER QUESTION:\\n{query}\\n\\nProvide an accurate concise answer with references to which chunk/page the information came from when possible."
-                # call Ollama
-                temperature = st.session_state.get('temperature', 0.0)
-                ollama_client.model_name = st.session_state.get('ollama_model', ollama_client.model_name)
-                with st.spinner('Generating answer with local Ollama model...'):
-                    answer = ollama_client.generate(prompt, temperature=temperature)
+                answer = _answer_question(query, embedder_retriever, ollama_client, answer_cache=answer_cache)
                 st.session_state['chat_history'].append(('assistant', answer))
 
+        stats = st.session_state.get('last_generation_stats')
+        if stats is not None and stats.time_to_first_token is not None:
+            tps = f"{stats.tokens_per_second:.1f} tok/s" if stats.tokens_per_second else "n/a tok/s"
+            st.caption(f"Last answer: first token in {stats.time_to_first_token:.2f}s, "
+                       f"{stats.tokens} tokens in {stats.total_time:.1f}s ({tps})"
+                       + (" - stopped" if stats.cancelled else ""))
+        plan = st.session_state.get('last_prompt_plan')
+        if plan is not None:
+            st.caption(f"Prompt: ~{plan.tokens}/{plan.budget} tokens, {len(plan.context)} chunks "
+                       f"({plan.merged_chunks} merged, {plan.dropped_chunks} over budget), "
+                       f"{plan.recent_turns} recent turns, {plan.summarized_turns} summarized")
+
+        if answer_cache is not None:
+            a, q = answer_cache.stats(), embedder_retriever.query_cache.stats()
+            st.caption(f"Cache hit rate: answers {a['hit_rate']:.0%} ({a['hits']}/{a['hits'] + a['misses']}, "
+                       f"{a['semantic_hits']} near-duplicate), query embeddings {q['hit_rate']:.0%}")
+
         # show chat history with simple styling
         for role, text in st.session_state.get('chat_history', []):
             if role == 'user':
                 st.markdown(f"**You:** {text}")
             else:
                 st.markdown(f"**Assistant:** {text}")
+
+def render_diagnostics(startup_report=None, registry=None):
+    """Startup phases, index registry usage, recent per-stage latency percentiles, counters and the last question's time breakdown."""
+    sink = get_metrics()
+    with st.expander('Diagnostics', expanded=True):
+        if startup_report is not None:
+            st.markdown('**Startup**')
+            st.table(pd.DataFrame(startup_report.rows()))
+        if registry is not None:
+            r = registry.stats()
+            st.caption(f"Index registry: {r['in_memory']} workspaces in memory, {r['memory_mb']:.1f} / "
+                       f"{r['budget_mb']:.0f} MB ({r['on_seed']} on the shared seed), {r['spilled']} on disk, {r['evictions']} evictions, "
+                       f"{r['reloads']} reloads")
+        spans = st.session_state.get('last_trace')
+        if spans:
+            st.markdown('**Last question**')
+            st.table(pd.DataFrame(
+                [(name, ', '.join(f'{k}={v}' for k, v in labels.items()), value) for name, labels, value in spans],
+                columns=['Metric', 'Labels', 'Value']))
+        snapshot = sink.snapshot()
+        rows = [{'metric': name, **{k: v for k, v in s['labels'].items()},
+                 'count': s['count'], 'mean': s['mean'], 'p50': s['p50'], 'p95': s['p95'], 'p99': s['p99']}
+                for name, series in snapshot['summaries'].items() for s in series]
+        if rows:
+            st.markdown('**Recent percentiles** (`*_seconds` in seconds)')
+            st.dataframe(pd.DataFrame(rows))
+        counters = [{'counter': name, 'labels': ', '.join(f'{k}={v}' for k, v in c['labels'].items()), 'value': c['value']}
+                    for name, series in snapshot['counters'].items() for c in series]
+        if counters:
+            st.markdown('**Counters**')
+            st.dataframe(pd.DataFrame(counters))
+        if not rows and not counters:
+            st.info('No metrics recorded yet (or METRICS_ENABLED=0).')
+        if isinstance(sink, InMemoryMetrics):
+            c1, c2 = st.columns(2)
+            c1.download_button('Download JSON', data=sink.to_json(indent=2), file_name='metrics.json',
+                               mime='application/json')
+            c2.download_button('Download Prometheus text', data=sink.to_prometheus(), file_name='metrics.prom',
+                               mime='text/plain')